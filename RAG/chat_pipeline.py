@@ -0,0 +1,530 @@
+import asyncio
+import os
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from .llm_client import LlmClient
+from .metrics import mark_request, metrics, timed, track_request
+from .response_synthesis import ResponseSynthesizer
+from .result_set import dumps_json
+from .row_normalizer import default_row_normalizer
+from .service import DatabaseChatbotService
+from .session_store import (FollowUpAnswer, FollowUpResolver, SessionStore, SessionTurn, refers_to_previous,
+                            render_conversation_context)
+from .text_utils import normalize_question
+
+
+class ChatPipeline:
+    """
+    Toàn bộ luồng xử lý một tin nhắn /chat: process_query (LLM lần 1 + DB),
+    LLM lần 2 tạo câu trả lời thân thiện (hoặc template nếu kết quả đơn giản, xem ResponseSynthesizer),
+    và chuẩn hóa dữ liệu cho frontend.
+    Dùng chung cho Flask (đồng bộ) và ASGI (async).
+
+    Khi có session_id, các lượt gần đây được lưu trong SessionStore: câu hỏi nối tiếp về kết quả trước
+    được FollowUpResolver trả lời tại chỗ (không gọi DB/LLM); câu hỏi khác trỏ về lượt trước chạy pipeline với
+    ngữ cảnh hội thoại, còn câu hỏi tự đủ nghĩa chạy như không có session (giữ IntentRouter và cache SQL).
+    """
+
+    max_session_id_length = 128
+
+    def __init__(self, service: DatabaseChatbotService, llm_client: Optional[LlmClient]):
+        self.service = service
+        self.llm_client = llm_client
+        self.synthesizer = ResponseSynthesizer.from_env()
+        self.batch_max_items = int(os.getenv("BATCH_MAX_ITEMS", "50"))
+        self.batch_max_workers = max(int(os.getenv("BATCH_MAX_WORKERS", "8")), 1)
+        self.sessions = SessionStore.from_env()
+        self.follow_ups = FollowUpResolver()
+
+    @staticmethod
+    def build_friendly_prompt(user_message: str, sql_cleaned: str, formatted_results_table_string: str) -> str:
+        return f"""
+              You are a helpful assistant synthesizing information from a database query result for a user.
+              Based on the user's original question, the SQL query executed, and the results obtained from the database,
+              create a **concise**, friendly, and easy-to-understand natural language response in Vietnamese
+              that directly answers the user's original question.
+
+              --- Instructions for Friendly Response ---
+              - The response must be in Vietnamese.
+              - Be **concise** and to the point. Avoid unnecessary details.
+              - If the database results list multiple items (e.g., a list of events), **summarize them briefly**.
+              - **When listing multiple events**, focus on key identifying information like the **event name** and **location**. Avoid including full descriptions, exact start/end dates and times, or detailed quantity numbers for each item within the text response, as the user's frontend will handle displaying the detailed data separately.
+              - If the database results are empty, clearly state that no results were found for their query based on the available information.
+              - Do NOT include the SQL query or the raw table results in your final answer.
+
+              User's original question: {user_message}
+              Executed SQL query: ```sql
+              {sql_cleaned}
+              ```
+              Database Results:
+              ```
+              {formatted_results_table_string}
+              ```
+
+              Friendly natural language response:
+              """
+
+    def handle(self, user_message: str, request_id: Optional[str] = None,
+               session_id: Optional[str] = None) -> Tuple[Dict[str, Any], int]:
+        """
+        Xử lý đồng bộ một tin nhắn. Trả về (payload JSON, HTTP status).
+        session_id (tùy chọn) được trả lại trong payload.
+        """
+        session_id = self._session_key(session_id)
+        with track_request(request_id, endpoint='chat'):
+            payload, status = self._handle(user_message, session_id)
+        return self._with_session(payload, session_id), status
+
+    async def ahandle(self, user_message: str, request_id: Optional[str] = None,
+                      session_id: Optional[str] = None) -> Tuple[Dict[str, Any], int]:
+        """
+        Phiên bản async của handle: không chiếm thread trong lúc chờ hai lần gọi Gemini.
+        """
+        session_id = self._session_key(session_id)
+        with track_request(request_id, endpoint='chat'):
+            payload, status = await self._ahandle(user_message, session_id)
+        return self._with_session(payload, session_id), status
+
+    def stream(self, user_message: str, request_id: Optional[str] = None,
+               session_id: Optional[str] = None) -> Iterator[str]:
+        """
+        Xử lý một tin nhắn và trả về các sự kiện Server-Sent Events:
+        `results` (query_results_data, gửi ngay sau khi thực thi SQL), nhiều `token`
+        (từng đoạn câu trả lời tiếng Việt), rồi `done` (câu trả lời đầy đủ) hoặc `error`.
+        """
+        with track_request(request_id, endpoint='chat_stream'):
+            yield from self._stream(user_message, self._session_key(session_id))
+
+    async def astream(self, user_message: str, request_id: Optional[str] = None,
+                      session_id: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Phiên bản async của stream.
+        """
+        with track_request(request_id, endpoint='chat_stream'):
+            async for event in self._astream(user_message, self._session_key(session_id)):
+                yield event
+
+    def handle_batch(self, messages: Any, request_id: Optional[str] = None) -> Tuple[Dict[str, Any], int]:
+        """
+        Xử lý nhiều tin nhắn trong một request. Các câu hỏi trùng nhau (sau normalize_question)
+        chỉ được xử lý một lần; các câu hỏi khác nhau chạy song song trên tối đa BATCH_MAX_WORKERS thread.
+        Trả về ({'results': [...]} theo đúng thứ tự đầu vào, HTTP status).
+        """
+        rejected = self._reject_batch(messages)
+        if rejected is not None:
+            return rejected
+
+        batch_id = request_id or uuid.uuid4().hex
+        unique_messages, slots = self._plan_batch(messages)
+        print(f"Received batch of {len(messages)} messages ({len(unique_messages)} unique)")
+
+        def run(position: int) -> Tuple[Dict[str, Any], int]:
+            try:
+                return self.handle(unique_messages[position], request_id=f"{batch_id}-{position}")
+            except Exception as e:
+                return self._batch_item_failed(e)
+
+        workers = min(self.batch_max_workers, len(unique_messages)) or 1
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='chat-batch') as executor:
+            outcomes = list(executor.map(run, range(len(unique_messages))))
+
+        return self._batch_payload(messages, slots, outcomes, len(unique_messages)), 200
+
+    async def ahandle_batch(self, messages: Any, request_id: Optional[str] = None) -> Tuple[Dict[str, Any], int]:
+        """
+        Phiên bản async của handle_batch: các câu hỏi khác nhau chạy đồng thời bằng ahandle,
+        giới hạn bởi một semaphore BATCH_MAX_WORKERS.
+        """
+        rejected = self._reject_batch(messages)
+        if rejected is not None:
+            return rejected
+
+        batch_id = request_id or uuid.uuid4().hex
+        unique_messages, slots = self._plan_batch(messages)
+        print(f"Received batch of {len(messages)} messages ({len(unique_messages)} unique, async)")
+
+        semaphore = asyncio.Semaphore(self.batch_max_workers)
+
+        async def run(position: int) -> Tuple[Dict[str, Any], int]:
+            async with semaphore:
+                try:
+                    return await self.ahandle(unique_messages[position], request_id=f"{batch_id}-{position}")
+                except Exception as e:
+                    return self._batch_item_failed(e)
+
+        outcomes = await asyncio.gather(*(run(position) for position in range(len(unique_messages))))
+
+        return self._batch_payload(messages, slots, outcomes, len(unique_messages)), 200
+
+    def _reject_batch(self, messages: Any) -> Optional[Tuple[Dict[str, Any], int]]:
+        if not isinstance(messages, list) or not messages:
+            return {'response_text': 'No messages provided', 'results': []}, 400
+        if len(messages) > self.batch_max_items:
+            return {'response_text': f'Too many messages (max {self.batch_max_items})', 'results': []}, 400
+        return None
+
+    @staticmethod
+    def _plan_batch(messages: List[Any]) -> Tuple[List[str], List[Optional[int]]]:
+        """
+        Gom các câu hỏi trùng nhau. Trả về (danh sách câu hỏi cần xử lý, vị trí trong danh sách đó
+        cho từng tin nhắn đầu vào; None nếu tin nhắn rỗng/không phải chuỗi).
+        """
+        unique_messages: List[str] = []
+        positions: Dict[str, int] = {}
+        slots: List[Optional[int]] = []
+        for message in messages:
+            if not isinstance(message, str) or not message.strip():
+                slots.append(None)
+                continue
+            key = normalize_question(message)
+            if key not in positions:
+                positions[key] = len(unique_messages)
+                unique_messages.append(message)
+            slots.append(positions[key])
+        return unique_messages, slots
+
+    @staticmethod
+    def _batch_item_failed(e: Exception) -> Tuple[Dict[str, Any], int]:
+        print(f"Unhandled error in batch item: {e}")
+        traceback.print_exc()
+        return {'response_text': "Xin lỗi, hệ thống xử lý phản hồi gặp sự cố nội bộ.", 'query_results_data': []}, 500
+
+    @staticmethod
+    def _batch_payload(messages: List[Any], slots: List[Optional[int]],
+                       outcomes: List[Tuple[Dict[str, Any], int]], unique_count: int) -> Dict[str, Any]:
+        results = []
+        for index, (message, slot) in enumerate(zip(messages, slots)):
+            if slot is None:
+                item, status = {'response_text': 'No message provided', 'query_results_data': []}, 400
+            else:
+                item, status = outcomes[slot]
+            results.append(dict(item, index=index, message=message, status=status))
+        return {'results': results, 'unique_count': unique_count}
+
+    def _handle(self, user_message: str, session_id: Optional[str] = None) -> Tuple[Dict[str, Any], int]:
+        if not user_message:
+            mark_request('bad_request')
+            return {'response_text': 'No message provided', 'query_results_data': []}, 400
+
+        print(f"Received message: '{user_message}'")
+
+        turns = self._session_turns(session_id)
+        follow_up = self._resolve_follow_up(user_message, session_id, turns)
+        if follow_up is not None:
+            return self._follow_up_payload(follow_up), 200
+
+        context = self._conversation_context(user_message, turns)
+        process_result = self.service.process_query(user_message, context)
+
+        if len(process_result) == 1:
+            return self._step_one_failed(process_result[0])
+
+        sql_cleaned, raw_results_list, formatted_results_table_string, result_info = process_result
+        self._remember(session_id, user_message, sql_cleaned, raw_results_list, result_info)
+
+        template_response_text = self.synthesizer.synthesize(raw_results_list, result_info, user_message)
+        if template_response_text is not None:
+            print(f"Processing step 1 successful. Answered from template: {template_response_text}")
+            return self._build_payload(template_response_text, raw_results_list, result_info), 200
+
+        print("Processing step 1 successful. Calling LLM for friendly response...")
+
+        if self.llm_client is None:
+            return self._llm_unavailable()
+
+        prompt_friendly_response = self.build_friendly_prompt(user_message, sql_cleaned,
+                                                              formatted_results_table_string)
+        metrics.observe('answer_prompt_chars', len(prompt_friendly_response))
+        try:
+
+            with timed('llm_answer'):
+                final_response_text = self.llm_client.generate_text(prompt_friendly_response)
+            print(f"Final friendly response from LLM: {final_response_text}")
+
+            return self._build_payload(final_response_text, raw_results_list, result_info), 200
+
+        except Exception as e:
+            return self._step_two_failed(e)
+
+    async def _ahandle(self, user_message: str, session_id: Optional[str] = None) -> Tuple[Dict[str, Any], int]:
+        if not user_message:
+            mark_request('bad_request')
+            return {'response_text': 'No message provided', 'query_results_data': []}, 400
+
+        print(f"Received message: '{user_message}'")
+
+        turns = self._session_turns(session_id)
+        follow_up = self._resolve_follow_up(user_message, session_id, turns)
+        if follow_up is not None:
+            return await asyncio.to_thread(self._follow_up_payload, follow_up), 200
+
+        context = self._conversation_context(user_message, turns)
+        process_result = await self.service.aprocess_query(user_message, context)
+
+        if len(process_result) == 1:
+            return self._step_one_failed(process_result[0])
+
+        sql_cleaned, raw_results_list, formatted_results_table_string, result_info = process_result
+        self._remember(session_id, user_message, sql_cleaned, raw_results_list, result_info)
+
+        template_response_text = self.synthesizer.synthesize(raw_results_list, result_info, user_message)
+        if template_response_text is not None:
+            print(f"Processing step 1 successful. Answered from template: {template_response_text}")
+            payload = await asyncio.to_thread(self._build_payload, template_response_text, raw_results_list,
+                                              result_info)
+            return payload, 200
+
+        print("Processing step 1 successful. Calling LLM for friendly response (async)...")
+
+        if self.llm_client is None:
+            return self._llm_unavailable()
+
+        prompt_friendly_response = self.build_friendly_prompt(user_message, sql_cleaned,
+                                                              formatted_results_table_string)
+        metrics.observe('answer_prompt_chars', len(prompt_friendly_response))
+        try:
+
+            with timed('llm_answer'):
+                final_response_text = await self.llm_client.agenerate_text(prompt_friendly_response)
+            print(f"Final friendly response from LLM: {final_response_text}")
+
+            payload = await asyncio.to_thread(self._build_payload, final_response_text, raw_results_list,
+                                              result_info)
+            return payload, 200
+
+        except Exception as e:
+            return self._step_two_failed(e)
+
+    def _stream(self, user_message: str, session_id: Optional[str] = None) -> Iterator[str]:
+        if not user_message:
+            mark_request('bad_request')
+            yield format_sse('error', {'response_text': 'No message provided'})
+            return
+
+        print(f"Received message (stream): '{user_message}'")
+
+        turns = self._session_turns(session_id)
+        follow_up = self._resolve_follow_up(user_message, session_id, turns)
+        if follow_up is not None:
+            yield from self._follow_up_events(self._follow_up_payload(follow_up))
+            return
+
+        context = self._conversation_context(user_message, turns)
+        process_result = self.service.process_query(user_message, context)
+
+        if len(process_result) == 1:
+            payload, _ = self._step_one_failed(process_result[0])
+            yield format_sse('results', {'query_results_data': []})
+            yield format_sse('done', payload)
+            return
+
+        sql_cleaned, raw_results_list, formatted_results_table_string, result_info = process_result
+        self._remember(session_id, user_message, sql_cleaned, raw_results_list, result_info)
+
+        with timed('standardize'):
+            query_results_data = standardize_results(raw_results_list)
+        yield format_sse('results', dict(result_info, query_results_data=query_results_data))
+
+        template_response_text = self.synthesizer.synthesize(raw_results_list, result_info, user_message)
+        if template_response_text is not None:
+            yield format_sse('token', {'text': template_response_text})
+            yield format_sse('done', {'response_text': template_response_text})
+            return
+
+        if self.llm_client is None:
+            payload, _ = self._llm_unavailable()
+            yield format_sse('error', payload)
+            return
+
+        prompt_friendly_response = self.build_friendly_prompt(user_message, sql_cleaned,
+                                                              formatted_results_table_string)
+        metrics.observe('answer_prompt_chars', len(prompt_friendly_response))
+        chunks = []
+        try:
+            with timed('llm_answer'):
+                for chunk in self.llm_client.stream_text(prompt_friendly_response):
+                    chunks.append(chunk)
+                    yield format_sse('token', {'text': chunk})
+        except Exception as e:
+            payload, _ = self._step_two_failed(e)
+            yield format_sse('error', payload)
+            return
+
+        final_response_text = "".join(chunks).strip()
+        print(f"Final friendly response from LLM (stream): {final_response_text}")
+        yield format_sse('done', {'response_text': final_response_text})
+
+    async def _astream(self, user_message: str, session_id: Optional[str] = None) -> AsyncIterator[str]:
+        if not user_message:
+            mark_request('bad_request')
+            yield format_sse('error', {'response_text': 'No message provided'})
+            return
+
+        print(f"Received message (stream): '{user_message}'")
+
+        turns = self._session_turns(session_id)
+        follow_up = self._resolve_follow_up(user_message, session_id, turns)
+        if follow_up is not None:
+            payload = await asyncio.to_thread(self._follow_up_payload, follow_up)
+            for event in self._follow_up_events(payload):
+                yield event
+            return
+
+        context = self._conversation_context(user_message, turns)
+        process_result = await self.service.aprocess_query(user_message, context)
+
+        if len(process_result) == 1:
+            payload, _ = self._step_one_failed(process_result[0])
+            yield format_sse('results', {'query_results_data': []})
+            yield format_sse('done', payload)
+            return
+
+        sql_cleaned, raw_results_list, formatted_results_table_string, result_info = process_result
+        self._remember(session_id, user_message, sql_cleaned, raw_results_list, result_info)
+
+        with timed('standardize'):
+            query_results_data = await asyncio.to_thread(standardize_results, raw_results_list)
+        yield format_sse('results', dict(result_info, query_results_data=query_results_data))
+
+        template_response_text = self.synthesizer.synthesize(raw_results_list, result_info, user_message)
+        if template_response_text is not None:
+            yield format_sse('token', {'text': template_response_text})
+            yield format_sse('done', {'response_text': template_response_text})
+            return
+
+        if self.llm_client is None:
+            payload, _ = self._llm_unavailable()
+            yield format_sse('error', payload)
+            return
+
+        prompt_friendly_response = self.build_friendly_prompt(user_message, sql_cleaned,
+                                                              formatted_results_table_string)
+        metrics.observe('answer_prompt_chars', len(prompt_friendly_response))
+        chunks = []
+        try:
+            with timed('llm_answer'):
+                async for chunk in self.llm_client.astream_text(prompt_friendly_response):
+                    chunks.append(chunk)
+                    yield format_sse('token', {'text': chunk})
+        except Exception as e:
+            payload, _ = self._step_two_failed(e)
+            yield format_sse('error', payload)
+            return
+
+        final_response_text = "".join(chunks).strip()
+        print(f"Final friendly response from LLM (stream): {final_response_text}")
+        yield format_sse('done', {'response_text': final_response_text})
+
+    def _session_key(self, session_id: Any) -> Optional[str]:
+        if self.sessions is None or not isinstance(session_id, str):
+            return None
+        session_id = session_id.strip()
+        if not session_id or len(session_id) > self.max_session_id_length:
+            return None
+        return session_id
+
+    @staticmethod
+    def _with_session(payload: Dict[str, Any], session_id: Optional[str]) -> Dict[str, Any]:
+        return dict(payload, session_id=session_id) if session_id else payload
+
+    def _session_turns(self, session_id: Optional[str]) -> List[SessionTurn]:
+        if session_id is None:
+            return []
+        return self.sessions.get(session_id)
+
+    @staticmethod
+    def _conversation_context(user_message: str, turns: List[SessionTurn]) -> str:
+        if not turns or not refers_to_previous(user_message):
+            return ""
+        return render_conversation_context(turns)
+
+    def _resolve_follow_up(self, user_message: str, session_id: Optional[str],
+                           turns: List[SessionTurn]) -> Optional[FollowUpAnswer]:
+        """
+        Trả lời từ kết quả của lượt trước nếu câu hỏi là câu nối tiếp về kết quả đó.
+        Kết quả lọc/sắp xếp trở thành lượt mới (để "cái thứ hai" sau đó chỉ vào danh sách đã lọc).
+        """
+        if not turns:
+            return None
+        with timed('follow_up'):
+            answer = self.follow_ups.resolve(user_message, turns[-1])
+        metrics.inc('session_follow_ups_total', labels={'resolution': answer.kind if answer else 'pipeline'})
+        if answer is None:
+            return None
+
+        print(f"Follow-up '{answer.kind}' answered from session results: {answer.response_text}")
+        if answer.kind in ('filter', 'sort'):
+            self.sessions.record(session_id, user_message, turns[-1].sql, answer.rows, True)
+        return answer
+
+    def _remember(self, session_id: Optional[str], user_message: str, sql_cleaned: str,
+                  raw_results_list: List[Dict[str, Any]], result_info: Dict[str, Any]) -> None:
+        if session_id is None:
+            return
+        complete = (result_info.get('total_count_exact', True)
+                    and result_info.get('total_count', len(raw_results_list)) == len(raw_results_list))
+        self.sessions.record(session_id, user_message, sql_cleaned, raw_results_list, complete)
+
+    def _follow_up_payload(self, answer: FollowUpAnswer) -> Dict[str, Any]:
+        return self._build_payload(answer.response_text, answer.rows,
+                                   {'total_count': len(answer.rows), 'total_count_exact': True})
+
+    @staticmethod
+    def _follow_up_events(payload: Dict[str, Any]) -> Iterator[str]:
+        yield format_sse('results', {key: value for key, value in payload.items() if key != 'response_text'})
+        yield format_sse('token', {'text': payload['response_text']})
+        yield format_sse('done', {'response_text': payload['response_text']})
+
+    @staticmethod
+    def _step_one_failed(error_message: str) -> Tuple[Dict[str, Any], int]:
+        print(f"Processing failed in step 1: {error_message}")
+        mark_request('step1_error')
+        return {'response_text': error_message, 'query_results_data': []}, 200
+
+    @staticmethod
+    def _llm_unavailable() -> Tuple[Dict[str, Any], int]:
+        print("Error: LLM Client not initialized for friendly response generation.")
+        mark_request('llm_unavailable')
+        return {'response_text': "Xin lỗi, hệ thống xử lý phản hồi gặp sự cố nội bộ.", 'query_results_data': []}, 200
+
+    @staticmethod
+    def _step_two_failed(e: Exception) -> Tuple[Dict[str, Any], int]:
+        print(f"Error calling LLM (Friendly Response Generation) or processing results for data: {e}")
+        traceback.print_exc()
+        mark_request('llm_error')
+        metrics.inc('llm_errors_total', labels={'stage': 'llm_answer'})
+
+        return {'response_text': "Xin lỗi, tôi gặp sự cố khi tạo phản hồi hoặc xử lý kết quả.",
+                'query_results_data': []}, 200
+
+    def _build_payload(self, final_response_text: str, raw_results_list: List[Dict[str, Any]],
+                       result_info: Dict[str, Any]) -> Dict[str, Any]:
+        with timed('standardize'):
+            query_results_data = standardize_results(raw_results_list)
+        if query_results_data:
+            print(f"Data for frontend (query_results_data): {query_results_data}")
+
+        return {
+            'response_text': final_response_text,
+            'query_results_data': query_results_data,
+            'total_count': result_info.get('total_count', len(raw_results_list)),
+            'total_count_exact': result_info.get('total_count_exact', True),
+        }
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """
+    Định dạng một sự kiện Server-Sent Events với dữ liệu JSON.
+    """
+    return f"event: {event}\ndata: {dumps_json(data)}\n\n"
+
+
+def standardize_results(raw_results_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Chuẩn hóa các hàng kết quả từ DB thành cấu trúc cố định mà frontend hiển thị.
+    Ánh xạ cột được biên dịch một lần cho mỗi bộ cột (xem RowNormalizer).
+    """
+    return default_row_normalizer.normalize(raw_results_list)
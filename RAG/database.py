@@ -1,19 +1,51 @@
-from typing import List, Dict, Any
+from typing import Dict, Any, Iterator, Optional, Tuple
 import os
-from sqlalchemy import create_engine, text, inspect
+import threading
+import time
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event, text, inspect
 import traceback
 
 from .constants import ALLOWED_TABLES, BLACKLISTED_COLUMNS
+from .replica import LocalReplica
+from .result_cache import ResultCache
+from .result_set import ResultSet
+from .metrics import metrics
 
 from dotenv import load_dotenv
 
 
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() in ("1", "true", "yes")
+
+
 class DatabaseConnector:
-    def __init__(self):
+    def __init__(self, db_url: Optional[str] = None):
+        """
+        Khởi tạo engine SQLAlchemy. Cấu hình pool đọc từ biến môi trường:
+        DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING
+        và DB_STATEMENT_TIMEOUT_MS (MAX_EXECUTION_TIME cho mỗi câu SELECT trên MySQL, 0 = tắt).
+        DB_REPLICA_ENABLED bật bản sao cục bộ của các view (xem LocalReplica).
+
+        Đọc kết quả qua server-side cursor chỉ có tác dụng với driver hỗ trợ (vd. mysql+pymysql, mysql+mysqldb);
+        driver mặc định mysql+mysqlconnector luôn nạp toàn bộ kết quả về client, khi đó giới hạn bộ nhớ
+        là LIMIT MAX_QUERY_ROWS mà apply_row_limit gắn vào mọi câu SQL.
+        """
 
         load_dotenv()
 
-        db_url = os.getenv("DATABASE_URL")
+        self._stats_lock = threading.Lock()
+        self._pool_stats = {'connects': 0, 'checkouts': 0, 'checkins': 0, 'invalidations': 0,
+                            'timed_checkouts': 0, 'wait_ms_total': 0.0, 'wait_ms_max': 0.0}
+
+        self.result_cache = None
+        if os.getenv("RESULT_CACHE_ENABLED", "false").lower() in ("1", "true", "yes"):
+            self.result_cache = ResultCache.from_env()
+            print("Result cache enabled for validated SQL.")
+        self.replica = None
+        self.server_side_cursors = False
+
+        db_url = db_url or os.getenv("DATABASE_URL")
 
         if not db_url:
 
@@ -39,9 +71,17 @@ class DatabaseConnector:
 
         try:
 
-            self.engine = create_engine(db_url)
+            self.engine = create_engine(db_url, **self._engine_options(db_url))
+            self._register_pool_events()
+            self.server_side_cursors = bool(self.engine.dialect.supports_server_side_cursors)
+            if not self.server_side_cursors:
+                print(f"Driver '{self.engine.dialect.driver}' has no server-side cursors: "
+                      f"results are buffered client-side, bounded by the SQL row limit.")
             self.allowed_tables = ALLOWED_TABLES
             self.blacklisted_columns = BLACKLISTED_COLUMNS
+            self.replica = LocalReplica.from_env(self.engine, on_change=self.invalidate_results_for_view)
+            if self.replica is not None:
+                print("Local replica enabled for allowed views.")
             print("DatabaseConnector initialized. Connection successful.")
 
         except Exception as e:
@@ -52,24 +92,288 @@ class DatabaseConnector:
             self.blacklisted_columns = BLACKLISTED_COLUMNS
             print("DatabaseConnector initialized with connection error.")
 
-    def execute_query(self, query: str) -> List[Dict[str, Any]]:
+    @staticmethod
+    def _engine_options(db_url: str) -> Dict[str, Any]:
+        options: Dict[str, Any] = {
+            'pool_pre_ping': _env_flag("DB_POOL_PRE_PING", "true"),
+            'pool_recycle': int(os.getenv("DB_POOL_RECYCLE", "1800")),
+        }
+
+        if not db_url.startswith('sqlite'):
+            options['pool_size'] = int(os.getenv("DB_POOL_SIZE", "5"))
+            options['max_overflow'] = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+            options['pool_timeout'] = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+        print(f"Database pool options: {options}")
+        return options
+
+    def _register_pool_events(self) -> None:
+        statement_timeout_ms = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+        is_mysql = self.engine.dialect.name in ('mysql', 'mariadb')
+
+        @event.listens_for(self.engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            self._bump_stat('connects')
+            if statement_timeout_ms > 0 and is_mysql:
+                cursor = dbapi_connection.cursor()
+                try:
+                    cursor.execute(f"SET SESSION MAX_EXECUTION_TIME = {statement_timeout_ms}")
+                finally:
+                    cursor.close()
+
+        @event.listens_for(self.engine, "checkout")
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            self._bump_stat('checkouts')
+
+        @event.listens_for(self.engine, "checkin")
+        def on_checkin(dbapi_connection, connection_record):
+            self._bump_stat('checkins')
+
+        @event.listens_for(self.engine, "invalidate")
+        def on_invalidate(dbapi_connection, connection_record, exception):
+            self._bump_stat('invalidations')
+
+    def _bump_stat(self, name: str, amount: float = 1) -> None:
+        with self._stats_lock:
+            self._pool_stats[name] += amount
+
+    @contextmanager
+    def _connect(self):
+        """
+        Lấy kết nối từ pool và ghi lại thời gian chờ checkout.
         """
-        Thực thi câu lệnh SQL SELECT đã được xác thực.
+        started = time.perf_counter()
+        connection = self.engine.connect()
+        wait_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            self._pool_stats['timed_checkouts'] += 1
+            self._pool_stats['wait_ms_total'] += wait_ms
+            self._pool_stats['wait_ms_max'] = max(self._pool_stats['wait_ms_max'], wait_ms)
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def dispose(self) -> None:
+        """
+        Đóng mọi kết nối trong pool (gọi trong master trước khi fork để worker không thừa hưởng socket đang mở).
+        """
+        if self.engine is not None:
+            self.engine.dispose()
+
+    def dispose_after_fork(self) -> None:
+        """
+        Gọi trong process con ngay sau fork: bỏ các kết nối pool thừa hưởng từ process cha (không đóng
+        socket của cha) để mỗi worker tự mở kết nối riêng.
+        """
+        if self.engine is not None:
+            self.engine.dispose(close=False)
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """
+        Thống kê pool: trạng thái hiện tại (size, checked in/out, overflow) và số lần checkout, thời gian chờ.
+        """
+        if self.engine is None:
+            return {'status': 'not_initialized'}
+
+        with self._stats_lock:
+            stats = dict(self._pool_stats)
+
+        pool = self.engine.pool
+        for name in ('size', 'checkedin', 'checkedout', 'overflow'):
+            method = getattr(pool, name, None)
+            if callable(method):
+                stats[name] = method()
+        stats['wait_ms_avg'] = (stats['wait_ms_total'] / stats['timed_checkouts']) if stats['timed_checkouts'] else 0.0
+        stats['status'] = pool.status()
+        stats['server_side_cursors'] = self.server_side_cursors
+        return stats
+
+    def warm_up(self) -> bool:
+        """
+        Mở sẵn các kết nối của pool và chạy một truy vấn nhẹ trên từng view trong ALLOWED_TABLES,
+        để request đầu tiên không phải trả chi phí TCP/TLS/xác thực.
+        """
+        if self.engine is None:
+            print("Error: Database engine is not initialized, skipping warm-up.")
+            return False
+
+        pool_size_method = getattr(self.engine.pool, 'size', None)
+        pool_size = pool_size_method() if callable(pool_size_method) else 1
+        started = time.perf_counter()
+        connections = []
+        try:
+            for _ in range(max(pool_size, 1)):
+                connection = self.engine.connect()
+                connections.append(connection)
+                connection.execute(text("SELECT 1"))
+
+            for view_name in sorted(self.allowed_tables):
+                try:
+                    connections[0].execute(text(f"SELECT 1 FROM {view_name} LIMIT 1")).fetchall()
+                except Exception as e:
+                    print(f"Warning: Warm-up query failed for '{view_name}': {e}")
+
+            print(f"Database warm-up finished: {len(connections)} connection(s) opened in "
+                  f"{(time.perf_counter() - started) * 1000:.1f} ms.")
+            return True
+        except Exception as e:
+            print(f"Error during database warm-up: {e}")
+            traceback.print_exc()
+            return False
+        finally:
+            for connection in connections:
+                connection.close()
+
+    def _execute_on_replica(self, query: str) -> Optional[ResultSet]:
+        """
+        Chạy trên bản sao cục bộ nếu có; None nghĩa là phải chạy trên MySQL.
+        """
+        if self.replica is None:
+            return None
+        return self.replica.execute(query)
+
+    def execute_query(self, query: str) -> ResultSet:
+        """
+        Thực thi câu lệnh SQL SELECT đã được xác thực. Kết quả là ResultSet (header + tuple),
+        đọc được như list-of-dict.
         """
         if self.engine is None:
             print("Error: Database engine is not initialized due to connection failure.")
-            return []
+            return ResultSet(())
+
+        if self.result_cache is not None:
+            cached = self.result_cache.get(query)
+            metrics.inc('result_cache_requests_total', labels={'result': 'hit' if cached is not None else 'miss'})
+            if cached is not None:
+                print(f"Result cache hit for query: {query}")
+                return cached[0]
+
+        rows = self._execute_on_replica(query)
+        if rows is not None:
+            if self.result_cache is not None:
+                self.result_cache.put(query, rows)
+            return rows
 
         try:
-            with self.engine.connect() as connection:
+            with self._connect() as connection:
 
                 result = connection.execute(text(query))
 
-                return [dict(zip(result.keys(), row)) for row in result.fetchall()]
+                rows = ResultSet(result.keys(), [tuple(row) for row in result.fetchall()])
+
+            if self.result_cache is not None:
+                self.result_cache.put(query, rows)
+            return rows
         except Exception as e:
             print(f"Error executing query: {query} - {e}")
             traceback.print_exc()
-            return []
+            return ResultSet(())
+
+    def _stream_options(self, batch_size: int) -> Dict[str, Any]:
+        """
+        stream_results chỉ khi dialect có server-side cursor; với driver khác tùy chọn này không có tác dụng.
+        """
+        if not self.server_side_cursors:
+            return {}
+        return {'stream_results': True, 'max_row_buffer': batch_size}
+
+    def iter_query(self, query: str, batch_size: int = 100) -> Iterator[Dict[str, Any]]:
+        """
+        Thực thi SQL đã xác thực và yield từng hàng dạng dict. Với driver có server-side cursor các hàng
+        được đọc dần theo lô `batch_size`; ngược lại driver đã nạp đủ kết quả về client trước khi yield.
+        Kết nối được giữ cho tới khi generator chạy hết hoặc bị đóng.
+        """
+        if self.engine is None:
+            print("Error: Database engine is not initialized due to connection failure.")
+            return
+
+        with self._connect() as connection:
+            result = connection.execution_options(**self._stream_options(batch_size)).execute(text(query))
+            keys = list(result.keys())
+            try:
+                for row in result:
+                    yield dict(zip(keys, row))
+            finally:
+                result.close()
+
+    def fetch_bounded(self, query: str, keep_rows: int, batch_size: int = 100) -> Tuple[ResultSet, int]:
+        """
+        Thực thi SQL, chỉ giữ `keep_rows` hàng đầu tiên (dạng tuple trong ResultSet), các hàng còn lại
+        chỉ được đếm. Trả về (rows, total_count).
+        Số hàng driver nạp về bị chặn bởi LIMIT trong câu SQL (apply_row_limit: MAX_QUERY_ROWS); chỉ driver
+        có server-side cursor mới đọc dần theo lô (xem `server_side_cursors`).
+        """
+        if self.engine is None:
+            print("Error: Database engine is not initialized due to connection failure.")
+            return ResultSet(()), 0
+
+        if self.result_cache is not None:
+            cached = self.result_cache.get(query, min_rows=keep_rows)
+            metrics.inc('result_cache_requests_total', labels={'result': 'hit' if cached is not None else 'miss'})
+            if cached is not None:
+                print(f"Result cache hit for query: {query}")
+                return cached[0][:keep_rows], cached[1]
+
+        local_rows = self._execute_on_replica(query)
+        if local_rows is not None:
+            if self.result_cache is not None:
+                self.result_cache.put(query, local_rows[:keep_rows], len(local_rows))
+            return local_rows[:keep_rows], len(local_rows)
+
+        kept = []
+        total_count = 0
+        try:
+            with self._connect() as connection:
+                result = connection.execution_options(**self._stream_options(batch_size)).execute(text(query))
+                columns = tuple(result.keys())
+                try:
+                    for row in result:
+                        if total_count < keep_rows:
+                            kept.append(tuple(row))
+                        total_count += 1
+                finally:
+                    result.close()
+        except Exception as e:
+            print(f"Error executing query: {query} - {e}")
+            traceback.print_exc()
+            return ResultSet(()), 0
+
+        rows = ResultSet(columns, kept)
+
+        if self.result_cache is not None:
+            self.result_cache.put(query, rows, total_count)
+        return rows, total_count
+
+    def count_query(self, query: str) -> int:
+        """
+        Đếm chính xác số hàng của một SQL SELECT đã xác thực (bọc trong COUNT(*)). Trả về -1 nếu lỗi.
+        """
+        if self.engine is None:
+            return -1
+
+        count_sql = f"SELECT COUNT(*) FROM ({query.strip().rstrip(';')}) AS counted_rows"
+        local_rows = self._execute_on_replica(count_sql)
+        if local_rows:
+            return int(next(iter(local_rows[0].values())) or 0)
+
+        try:
+            with self._connect() as connection:
+                return int(connection.execute(text(count_sql)).scalar() or 0)
+        except Exception as e:
+            print(f"Error counting rows for query: {query} - {e}")
+            traceback.print_exc()
+            return -1
+
+    def invalidate_results_for_view(self, view_name: str) -> int:
+        """
+        Xóa các kết quả đã cache có chạm tới view (vd. 'events_view' sau khi quantity_now thay đổi).
+        """
+        if self.result_cache is None:
+            return 0
+        removed = self.result_cache.invalidate_view(view_name)
+        print(f"Invalidated {removed} cached result(s) for view '{view_name}'.")
+        return removed
 
     def get_schema_description(self) -> str:
         """
@@ -140,31 +444,3 @@ class DatabaseConnector:
             schema_description += "Error retrieving schema details from database.\n"
 
             return schema_description
-
-
-def format_results(results: List[Dict[str, Any]]) -> str:
-    """
-    Định dạng kết quả từ DB (List of Dict) thành chuỗi văn bản dạng bảng.
-    Hàm này nhận kết quả TRỰC TIẾP TỪ DB.
-    """
-    if not results: return "Không có kết quả từ database."
-    max_rows_for_llm = 15
-    display_results = results[:max_rows_for_llm]
-    formatted_string = "Results:\n"
-    columns = list(display_results[0].keys())
-    formatted_string += "| " + " | ".join(columns) + " |\n"
-    col_widths = [max(len(col), 3) for col in columns]
-    formatted_string += "|-" + "-|-".join(['-' * width for width in col_widths]) + "-|\n"
-
-    for row_dict in display_results:
-        row_values = []
-        for col in columns:
-            value = str(row_dict.get(col, 'NULL')) if row_dict.get(col) is not None else 'NULL'
-            value = value.replace('|', '-')
-            row_values.append(value)
-        formatted_string += "| " + " | ".join(row_values) + " |\n"
-
-    if len(results) > max_rows_for_llm:
-        formatted_string += f"(... {len(results) - max_rows_for_llm} hàng khác bị ẩn ...)\n"
-
-    return formatted_string
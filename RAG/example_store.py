@@ -0,0 +1,130 @@
+import json
+import math
+import os
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from .sql_validator import SqlValidator, default_validator
+from .text_utils import normalize_question
+
+
+DEFAULT_EXAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sql_examples.json')
+
+
+class SqlExample(NamedTuple):
+    question: str
+    sql: str
+    note: str = ""
+
+
+def char_ngrams(text: str, n: int = 3) -> Counter:
+    """
+    Đếm n-gram ký tự của câu hỏi đã chuẩn hóa (bỏ dấu, chữ thường), mỗi từ được đệm bằng khoảng trắng
+    để n-gram đầu/cuối từ có trọng số riêng.
+    """
+    grams: Counter = Counter()
+    for word in normalize_question(text).split():
+        padded = f" {word} "
+        if len(padded) <= n:
+            grams[padded] += 1
+            continue
+        for i in range(len(padded) - n + 1):
+            grams[padded[i:i + n]] += 1
+    return grams
+
+
+class ExampleStore:
+    """
+    Kho ví dụ few-shot (câu hỏi, SQL) cho prompt sinh SQL.
+    Nạp từ file JSON (danh sách {"question", "sql", "note"}), bỏ qua ví dụ có SQL không qua SqlValidator,
+    dựng chỉ mục TF-IDF trên trigram ký tự của câu hỏi, và chọn `top_k` ví dụ gần nhất (cosine) cho mỗi câu hỏi.
+    """
+
+    def __init__(self, examples: List[SqlExample], top_k: int = 4, ngram_size: int = 3):
+        self.examples = examples
+        self.top_k = top_k
+        self.ngram_size = ngram_size
+
+        self._idf: Dict[str, float] = {}
+        self._postings: Dict[str, List[Tuple[int, float]]] = {}
+        self._build_index()
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_EXAMPLES_PATH, top_k: int = 4,
+                  validator: SqlValidator = default_validator) -> "ExampleStore":
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                raw_examples = json.load(f)
+        except Exception as e:
+            print(f"Error loading SQL examples from {path}: {e}")
+            raw_examples = []
+
+        examples = []
+        for item in raw_examples:
+            example = SqlExample(item.get('question', ''), item.get('sql', ''), item.get('note', ''))
+            valid, reason = validator.validate(example.sql)
+            if not example.question or not valid:
+                print(f"Warning: SQL example ignored ({reason}): {example.question}")
+                continue
+            examples.append(example)
+
+        print(f"Loaded {len(examples)} SQL examples from {path}.")
+        return cls(examples, top_k=top_k)
+
+    @classmethod
+    def from_env(cls) -> "ExampleStore":
+        """
+        Đọc cấu hình từ biến môi trường: SQL_EXAMPLES_PATH (mặc định RAG/sql_examples.json),
+        SQL_EXAMPLES_TOP_K (số ví dụ đưa vào mỗi prompt, mặc định 4).
+        """
+        return cls.from_file(
+            path=os.getenv("SQL_EXAMPLES_PATH", DEFAULT_EXAMPLES_PATH),
+            top_k=int(os.getenv("SQL_EXAMPLES_TOP_K", "4")),
+        )
+
+    def _build_index(self) -> None:
+        documents = [char_ngrams(example.question, self.ngram_size) for example in self.examples]
+        document_frequency: Counter = Counter()
+        for grams in documents:
+            document_frequency.update(grams.keys())
+
+        total = len(documents)
+        self._idf = {gram: math.log((1 + total) / (1 + df)) + 1.0 for gram, df in document_frequency.items()}
+
+        for index, grams in enumerate(documents):
+            weights = {gram: count * self._idf[gram] for gram, count in grams.items()}
+            norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+            for gram, weight in weights.items():
+                self._postings.setdefault(gram, []).append((index, weight / norm))
+
+    def search(self, question: str, top_k: Optional[int] = None) -> List[Tuple[SqlExample, float]]:
+        """
+        Trả về tối đa `top_k` (ví dụ, điểm cosine) gần câu hỏi nhất, điểm giảm dần.
+        """
+        top_k = self.top_k if top_k is None else top_k
+        if top_k <= 0 or not self.examples:
+            return []
+
+        grams = char_ngrams(question, self.ngram_size)
+        weights = {gram: count * self._idf[gram] for gram, count in grams.items() if gram in self._idf}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        if not norm:
+            return []
+
+        scores: Dict[int, float] = {}
+        for gram, weight in weights.items():
+            for index, doc_weight in self._postings[gram]:
+                scores[index] = scores.get(index, 0.0) + weight * doc_weight
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+        return [(self.examples[index], score / norm) for index, score in ranked]
+
+    def render(self, question: str, top_k: Optional[int] = None) -> str:
+        """
+        Các ví dụ gần nhất ở định dạng "User question: ... / SQL query: ..." của prompt sinh SQL.
+        """
+        blocks = []
+        for example, _ in self.search(question, top_k):
+            sql = f"{example.sql} -- {example.note}" if example.note else example.sql
+            blocks.append(f"        User question: {example.question}\n        SQL query: {sql}")
+        return "\n\n".join(blocks)
@@ -0,0 +1,183 @@
+import re
+import unicodedata
+from typing import Dict, List, NamedTuple, Optional, Pattern, Tuple
+
+from .sql_validator import SqlValidator, default_validator
+from .text_utils import fold_diacritics
+
+
+EVENT_COLUMNS = "event_id, name, description, location, start_date, end_date, quantity_now, max_quantity, image"
+
+# Tiền tố/hậu tố chung của các câu hỏi về sự kiện, viết trên văn bản đã bỏ dấu, chữ thường.
+_EVENT_PREFIX = (r"(?:cho (?:toi|minh) (?:biet |xem )?|liet ke |tim |xem )?(?:co )?(?:(?:cac|nhung) )?"
+                 r"su kien(?: nao)?")
+_REGISTRATION = r"(?: (?:dang ki|dang ky|tham gia))?"
+_TAIL = r"(?: (?:la gi|nao|vay|the|khong|a|nhi|ha))*"
+
+# Ngoặc kép và dấu nháy đơn đứng ngoài từ bị bỏ; nháy đơn giữa hai chữ cái ("O'Brien") được giữ.
+_QUOTES_RE = re.compile(r"[\"`“”]|(?<!\w)['‘’]|['‘’](?!\w)")
+_TRAILING_PUNCTUATION_RE = re.compile(r"[\s?!.,;:]+$")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Từ/cụm từ cho thấy slot bắt được thực ra còn chứa điều kiện hoặc mệnh đề hỏi khác ("tại hà nội do ai tổ chức",
+# "tại hà nội có kết quả chưa") -> để LLM xử lý. So khớp theo nguyên từ trên văn bản đã bỏ dấu.
+_CLAUSE_STOPWORDS = {'do ai', 'ai', 'to chuc', 'co', 'ket qua', 'tai', 'o'}
+_LOCATION_STOPWORDS = {'sap', 'vua', 'moi', 'con', 'nao', 'het', 'luot', 'day', 'dang', 'ket', 'thuc', 'va',
+                       'hoac', 'khi', 'nhieu', 'bao', 'truoc', 'sau', 'thang', 'nam', 'ngay', 'tuan', 'cua'
+                       } | _CLAUSE_STOPWORDS
+_NAME_STOPWORDS = {'va', 'hoac'} | _CLAUSE_STOPWORDS
+# Từ để hỏi / chỉ định ("ở đâu", "ở đó", "sự kiện này"): slot chỉ gồm các từ này không phải giá trị thật.
+# Kiểm tra "chỉ gồm" thay vì "có chứa" để không loại nhầm địa danh như "Đồ Sơn" (do son).
+_REFERENCE_WORDS = {'dau', 'do', 'day', 'nay', 'kia', 'ay', 'nao', 'gi', 'no', 'ben', 'cho', 'noi'}
+
+# Intent trả về danh sách sự kiện (câu trả lời liệt kê tên + địa điểm là đủ, xem ResponseSynthesizer).
+LIST_INTENTS = frozenset({'events_almost_full', 'events_many_slots', 'events_open', 'events_full',
+                          'events_upcoming', 'events_recently_ended', 'events_at_location'})
+
+
+class IntentRule(NamedTuple):
+    name: str
+    pattern: Pattern
+    sql_template: str
+    slot_stopwords: Dict[str, set] = {}
+
+
+class IntentMatch(NamedTuple):
+    intent: str
+    sql: str
+    slots: Dict[str, str]
+
+
+def _rule(name: str, pattern: str, sql_template: str, **slot_stopwords: set) -> IntentRule:
+    return IntentRule(name, re.compile(pattern), sql_template, slot_stopwords)
+
+
+# Thứ tự có ý nghĩa: luật cụ thể hơn ("sắp hết chỗ", "còn nhiều chỗ") đứng trước luật chung.
+DEFAULT_RULES: List[IntentRule] = [
+    _rule('events_almost_full',
+          _EVENT_PREFIX + r" (?:sap|gan) (?:het|day)(?: (?:cho|slot|luot))?" + _REGISTRATION + _TAIL,
+          f"SELECT {EVENT_COLUMNS} FROM events_view WHERE quantity_now >= max_quantity * 0.75 "
+          f"AND quantity_now < max_quantity ORDER BY (max_quantity - quantity_now) ASC"),
+    _rule('events_many_slots',
+          _EVENT_PREFIX + r" con nhieu (?:cho|slot|luot)(?: trong)?" + _REGISTRATION + _TAIL,
+          f"SELECT {EVENT_COLUMNS} FROM events_view WHERE max_quantity - quantity_now > 20"),
+    _rule('events_open',
+          _EVENT_PREFIX + r" (?:van )?con (?:cho|slot|luot)(?: trong)?" + _REGISTRATION + _TAIL,
+          f"SELECT {EVENT_COLUMNS} FROM events_view WHERE quantity_now < max_quantity"),
+    _rule('events_full',
+          _EVENT_PREFIX + r" (?:da (?:day|het)(?: (?:cho|slot|luot))?|(?:day|het) (?:cho|slot|luot))"
+          + _REGISTRATION + _TAIL,
+          f"SELECT {EVENT_COLUMNS} FROM events_view WHERE quantity_now >= max_quantity"),
+    _rule('events_upcoming',
+          _EVENT_PREFIX + r" (?:sap|chuan bi) (?:dien ra|to chuc|bat dau)" + _TAIL,
+          f"SELECT {EVENT_COLUMNS} FROM events_view WHERE start_date > NOW() ORDER BY start_date ASC LIMIT 10"),
+    _rule('events_recently_ended',
+          _EVENT_PREFIX + r" (?:vua|moi) (?:ket thuc|dien ra xong|xong)" + _TAIL,
+          f"SELECT {EVENT_COLUMNS} FROM events_view WHERE end_date < NOW() AND end_date >= NOW() - INTERVAL '7' DAY "
+          f"ORDER BY end_date DESC LIMIT 10"),
+    _rule('events_at_location',
+          _EVENT_PREFIX + r" (?:dien ra |to chuc |duoc to chuc )?(?:tai|o) (?P<location>.+?)" + _TAIL,
+          f"SELECT {EVENT_COLUMNS} FROM events_view WHERE LOWER(location) LIKE '%{{location}}%'",
+          location=_LOCATION_STOPWORDS),
+    _rule('event_results',
+          r"(?:co |xem |cho (?:toi|minh) (?:biet |xem )?)?ket qua (?:cua )?su kien (?P<event_name>.+?)"
+          r"(?: (?:chua|khong|nhu the nao|the nao|ra sao|la gi))*",
+          "SELECT r.result_id, r.content AS result_description, r.images AS result_image, e.event_id, "
+          "e.name AS event_name, e.description AS event_description, e.image AS event_image "
+          "FROM results_view r JOIN events_view e ON r.event_id = e.event_id "
+          "WHERE LOWER(e.name) LIKE '%{event_name}%'",
+          event_name=_NAME_STOPWORDS),
+    _rule('event_results',
+          r"su kien (?P<event_name>.+?) (?:da )?co ket qua(?: (?:chua|khong|gi|nao))*",
+          "SELECT r.result_id, r.content AS result_description, r.images AS result_image, e.event_id, "
+          "e.name AS event_name, e.description AS event_description, e.image AS event_image "
+          "FROM results_view r JOIN events_view e ON r.event_id = e.event_id "
+          "WHERE LOWER(e.name) LIKE '%{event_name}%'",
+          event_name=_NAME_STOPWORDS),
+    _rule('event_organizer',
+          r"su kien (?P<event_name>.+?) (?:cua|do) (?:nha to chuc|to chuc|don vi|ai)(?: nao)?"
+          r"(?: (?:to chuc|vay|the|a))*",
+          "SELECT e.name AS event_name, o.username AS organization_name, e.event_id, "
+          "e.description AS event_description, e.location, e.start_date, e.end_date, e.quantity_now, "
+          "e.max_quantity, e.image AS event_image FROM events_view AS e "
+          "JOIN organizations_view AS o ON e.organization_id = o.organization_id "
+          "WHERE LOWER(e.name) LIKE '%{event_name}%'",
+          event_name=_NAME_STOPWORDS),
+]
+
+
+def _prepare(question: str) -> Tuple[str, str]:
+    """
+    Trả về (display, folded): `display` là câu hỏi chữ thường, giữ dấu, bỏ ngoặc kép (giữ nháy đơn trong từ) và dấu câu cuối;
+    `folded` là bản bỏ dấu của `display` với cùng độ dài, để vị trí slot bắt được trên `folded`
+    cắt thẳng ra giá trị có dấu từ `display`.
+    """
+    display = unicodedata.normalize('NFC', question).lower()
+    display = _QUOTES_RE.sub(" ", display)
+    display = _TRAILING_PUNCTUATION_RE.sub("", _WHITESPACE_RE.sub(" ", display).strip())
+    folded = "".join(fold_diacritics(ch)[:1] or " " for ch in display)
+    return display, folded
+
+
+def escape_like_literal(value: str) -> str:
+    """
+    Đưa giá trị slot vào trong '%...%' an toàn: bỏ ký tự wildcard/escape, nhân đôi dấu nháy đơn.
+    """
+    value = value.replace("\\", " ").replace("%", " ").replace("\x00", " ")
+    return _WHITESPACE_RE.sub(" ", value).strip().replace("'", "''")
+
+
+class IntentRouter:
+    """
+    Bộ định tuyến câu hỏi cục bộ chạy trước LLM lần 1: các dạng câu hỏi thường gặp
+    (sự kiện còn chỗ / sắp đầy / đã đầy / sắp diễn ra / vừa kết thúc / tại địa điểm,
+    kết quả và nhà tổ chức của một sự kiện) được so khớp bằng luật trên văn bản đã bỏ dấu
+    và ánh xạ thẳng sang SQL template, với slot (tên sự kiện, địa điểm) lấy từ câu hỏi gốc.
+
+    Mọi template được xác thực bằng SqlValidator khi khởi tạo (lỗi -> ValueError);
+    giá trị slot chỉ nằm trong chuỗi LIKE đã escape nên SQL sinh ra không cần xác thực lại.
+    Câu hỏi không khớp luật nào trả về None và đi tiếp sang cache/LLM.
+    """
+
+    def __init__(self, rules: Optional[List[IntentRule]] = None, validator: SqlValidator = default_validator):
+        self.rules = list(DEFAULT_RULES if rules is None else rules)
+        self._validate_templates(validator)
+
+    def _validate_templates(self, validator: SqlValidator) -> None:
+        for rule in self.rules:
+            sample_slots = {slot: 'mau' for slot in rule.pattern.groupindex}
+            valid, reason = validator.validate(rule.sql_template.format(**sample_slots))
+            if not valid:
+                raise ValueError(f"SQL template for intent '{rule.name}' is invalid: {reason}")
+
+    def route(self, question: str) -> Optional[IntentMatch]:
+        if not isinstance(question, str) or not question.strip():
+            return None
+
+        display, folded = _prepare(question)
+        if len(display) != len(folded):
+            return None
+
+        for rule in self.rules:
+            match = rule.pattern.fullmatch(folded)
+            if match is None:
+                continue
+
+            slots = {}
+            for slot in rule.pattern.groupindex:
+                start, end = match.span(slot)
+                value = escape_like_literal(display[start:end])
+                stopwords = rule.slot_stopwords.get(slot, set())
+                words = folded[start:end].split()
+                padded = f" {' '.join(words)} "
+                if (not value or any(f" {stopword} " in padded for stopword in stopwords)
+                        or _REFERENCE_WORDS.issuperset(words)):
+                    slots = None
+                    break
+                slots[slot] = value
+
+            if slots is None:
+                continue
+            return IntentMatch(rule.name, rule.sql_template.format(**slots), slots)
+
+        return None
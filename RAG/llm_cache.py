@@ -0,0 +1,213 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from .metrics import metrics
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    schema_fingerprint TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS llm_cache_last_access ON llm_cache (last_access);
+CREATE INDEX IF NOT EXISTS llm_cache_expires_at ON llm_cache (expires_at);
+"""
+
+
+class PersistentLlmCache:
+    """
+    Cache phản hồi LLM lưu trên đĩa (SQLite, chế độ WAL) để giữ lại qua các lần deploy/restart.
+
+    - Khóa: sha256(model, schema fingerprint, sha256(prompt)).
+    - Mỗi mục hết hạn sau `ttl_seconds`; `compact()` xóa mục hết hạn rồi loại bỏ theo LRU
+      (last_access) cho tới khi không vượt `max_entries` và `max_bytes`. Compaction tự chạy
+      sau mỗi `compact_every` lần ghi.
+    - File chỉ được mở ở lần get/put đầu tiên (không làm chậm lúc khởi động). Mỗi thread, mỗi process
+      dùng kết nối riêng; WAL + busy_timeout cho phép nhiều worker cùng đọc/ghi một file.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float = 86400.0, max_entries: int = 50000,
+                 max_bytes: int = 256 * 1024 * 1024, compact_every: int = 500, busy_timeout_ms: int = 5000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.compact_every = compact_every
+        self.busy_timeout_ms = busy_timeout_ms
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._initialized_pid: Optional[int] = None
+        self._puts_since_compact = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["PersistentLlmCache"]:
+        """
+        Đọc cấu hình từ biến môi trường; trả về None nếu LLM_CACHE_PATH không được đặt (cache tắt).
+        LLM_CACHE_TTL (giây, mặc định 86400), LLM_CACHE_MAX_ENTRIES (50000), LLM_CACHE_MAX_BYTES (256MB).
+        """
+        path = os.getenv("LLM_CACHE_PATH")
+        if not path:
+            return None
+        return cls(
+            path=path,
+            ttl_seconds=float(os.getenv("LLM_CACHE_TTL", "86400")),
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "50000")),
+            max_bytes=int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+        )
+
+    @staticmethod
+    def make_key(model: str, prompt: str, schema_fingerprint: str = "") -> str:
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        return hashlib.sha256(f"{model}\0{schema_fingerprint}\0{prompt_hash}".encode('utf-8')).hexdigest()
+
+    def _connection(self) -> sqlite3.Connection:
+        pid = os.getpid()
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and getattr(self._local, 'pid', None) == pid:
+            return connection
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000.0, isolation_level=None)
+        connection.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+
+        with self._lock:
+            if self._initialized_pid != pid:
+                connection.executescript(_SCHEMA)
+                self._initialized_pid = pid
+
+        self._local.connection = connection
+        self._local.pid = pid
+        return connection
+
+    def get(self, model: str, prompt: str, schema_fingerprint: str = "") -> Optional[str]:
+        key = self.make_key(model, prompt, schema_fingerprint)
+        now = time.time()
+        try:
+            connection = self._connection()
+            row = connection.execute("SELECT response, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] > now:
+                connection.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+        except sqlite3.Error as e:
+            self._record_error('get', e)
+            return None
+
+        if row is None or row[1] <= now:
+            with self._lock:
+                self.misses += 1
+            metrics.inc('llm_cache_requests_total', labels={'result': 'miss' if row is None else 'expired'})
+            return None
+
+        with self._lock:
+            self.hits += 1
+        metrics.inc('llm_cache_requests_total', labels={'result': 'hit'})
+        return row[0]
+
+    def put(self, model: str, prompt: str, response: str, schema_fingerprint: str = "") -> None:
+        key = self.make_key(model, prompt, schema_fingerprint)
+        now = time.time()
+        try:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO llm_cache "
+                "(key, model, schema_fingerprint, response, size, created_at, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, model, schema_fingerprint, response, len(response.encode('utf-8')), now,
+                 now + self.ttl_seconds, now))
+        except sqlite3.Error as e:
+            self._record_error('put', e)
+            return
+
+        with self._lock:
+            self._puts_since_compact += 1
+            due = self.compact_every > 0 and self._puts_since_compact >= self.compact_every
+            if due:
+                self._puts_since_compact = 0
+        if due:
+            self.compact()
+
+    def compact(self, vacuum: bool = False) -> int:
+        """
+        Xóa mục hết hạn, rồi loại mục ít dùng gần đây nhất cho tới khi nằm trong max_entries/max_bytes.
+        Trả về số mục đã xóa. `vacuum=True` thu hồi dung lượng file (chậm, nên chạy ngoài giờ cao điểm).
+        """
+        try:
+            connection = self._connection()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                removed = connection.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+                removed += connection.execute(
+                    "DELETE FROM llm_cache WHERE key IN "
+                    "(SELECT key FROM llm_cache ORDER BY last_access DESC, key LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)).rowcount
+                removed += connection.execute(
+                    "DELETE FROM llm_cache WHERE key IN (SELECT key FROM "
+                    "(SELECT key, SUM(size) OVER (ORDER BY last_access DESC, key) AS running FROM llm_cache) "
+                    "WHERE running > ?)",
+                    (self.max_bytes,)).rowcount
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+            connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            if vacuum:
+                connection.execute("VACUUM")
+        except sqlite3.Error as e:
+            self._record_error('compact', e)
+            return 0
+
+        if removed:
+            print(f"LLM cache compaction removed {removed} entries.")
+        return removed
+
+    def clear(self) -> None:
+        try:
+            self._connection().execute("DELETE FROM llm_cache")
+        except sqlite3.Error as e:
+            self._record_error('clear', e)
+
+    def stats(self) -> Dict[str, Any]:
+        entries, total_bytes = 0, 0
+        try:
+            entries, total_bytes = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        except sqlite3.Error as e:
+            self._record_error('stats', e)
+
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'path': self.path,
+                'entries': entries,
+                'bytes': total_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'errors': self.errors,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _record_error(self, operation: str, error: Exception) -> None:
+        print(f"Warning: LLM cache {operation} failed ({self.path}): {error}")
+        with self._lock:
+            self.errors += 1
+        metrics.inc('llm_cache_requests_total', labels={'result': 'error'})
@@ -1,29 +1,168 @@
+import asyncio
+import hashlib
+from typing import AsyncIterator, Iterator, Optional
+
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage
 
+from .llm_cache import PersistentLlmCache
+from .llm_resilience import LlmCallPolicy
+from .singleflight import SingleFlight
+
+
+EMPTY_RESPONSE_TEXT = "Không nhận được phản hồi dạng văn bản từ LLM (có thể do nội dung không phù hợp)."
+
 
 class LlmClient:
-    def __init__(self, api_key: str, model: str):
+    def __init__(self, api_key: str, model: str, coalesce: bool = True,
+                 response_cache: Optional[PersistentLlmCache] = None,
+                 call_policy: Optional[LlmCallPolicy] = None, chat_model=None):
+        """
+        coalesce: gộp các lời gọi generate_text/agenerate_text đồng thời có cùng model và prompt
+        thành một lời gọi Gemini (xem SingleFlight); số lời gọi được gộp ghi vào llm_coalesced_waiters_total.
+        response_cache: cache phản hồi trên đĩa (PersistentLlmCache), dùng cho generate_text/agenerate_text.
+        call_policy: timeout, thử lại và hedging cho generate_text/agenerate_text (xem LlmCallPolicy);
+        khi có, retry nội bộ của LangChain bị tắt để không thử lại hai tầng.
+        chat_model: chat model dùng thay ChatGoogleGenerativeAI (vd. model giả lập trong benchmark/kiểm thử),
+        cần có invoke/ainvoke/stream/astream.
+        """
         self.api_key = api_key
         self.model = model
+        self.response_cache = response_cache
+        self.call_policy = call_policy
+        self._coalesce = coalesce
+        self._singleflight = SingleFlight('llm_coalesced_waiters_total') if coalesce else None
+        self._injected_chat_model = chat_model is not None
+
+        if chat_model is not None:
+            self._client = chat_model
+            return
 
         if not self.api_key:
             raise ValueError('GEMINI_API_KEY chưa được cung cấp.')
 
+        self._client = self._create_chat_model()
+
+    def _create_chat_model(self) -> ChatGoogleGenerativeAI:
+        client_options = {}
+        if self.call_policy is not None:
+            client_options = {'max_retries': 0, 'timeout': self.call_policy.timeout_seconds}
+
         try:
-            self._client = ChatGoogleGenerativeAI(google_api_key=self.api_key, model=self.model)
+            return ChatGoogleGenerativeAI(google_api_key=self.api_key, model=self.model, **client_options)
         except Exception as e:
             print(f"ERROR: Loi khi khoi tao Chat Model Gemini: {e}")
             raise e
 
-    def generate_text(self, prompt: str) -> str:
+    def reset_after_fork(self) -> None:
+        """
+        Gọi trong process con ngay sau fork: kênh gRPC/HTTP của Gemini client, thread của call_policy và
+        các lời gọi đang gộp của process cha không dùng được an toàn trong process con nên được tạo lại.
+        """
+        if self._coalesce:
+            self._singleflight = SingleFlight('llm_coalesced_waiters_total')
+        if self.call_policy is not None:
+            self.call_policy.reset_after_fork()
+        if not self._injected_chat_model:
+            self._client = self._create_chat_model()
+
+    def _coalesce_key(self, prompt: str, schema_fingerprint: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{schema_fingerprint}\0{prompt}".encode('utf-8')).hexdigest()
+
+    def generate_text(self, prompt: str, schema_fingerprint: str = "") -> str:
+        """
+        schema_fingerprint: phiên bản schema mà prompt dựa trên, là một phần khóa của response_cache.
+        """
+        if self._singleflight is None:
+            return self._cached_generate_text(prompt, schema_fingerprint)
+        return self._singleflight.do(self._coalesce_key(prompt, schema_fingerprint),
+                                     lambda: self._cached_generate_text(prompt, schema_fingerprint))
+
+    async def agenerate_text(self, prompt: str, schema_fingerprint: str = "") -> str:
+        """
+        Phiên bản async của generate_text (dùng ainvoke), không giữ thread trong lúc chờ Gemini.
+        """
+        if self._singleflight is None:
+            return await self._acached_generate_text(prompt, schema_fingerprint)
+        return await self._singleflight.ado(self._coalesce_key(prompt, schema_fingerprint),
+                                            lambda: self._acached_generate_text(prompt, schema_fingerprint))
+
+    def _cached_generate_text(self, prompt: str, schema_fingerprint: str) -> str:
+        if self.response_cache is None:
+            return self._generate_text(prompt)
+
+        cached = self.response_cache.get(self.model, prompt, schema_fingerprint)
+        if cached is not None:
+            return cached
+        text = self._generate_text(prompt)
+        if text != EMPTY_RESPONSE_TEXT:
+            self.response_cache.put(self.model, prompt, text, schema_fingerprint)
+        return text
+
+    async def _acached_generate_text(self, prompt: str, schema_fingerprint: str) -> str:
+        if self.response_cache is None:
+            return await self._agenerate_text(prompt)
+
+        cached = await asyncio.to_thread(self.response_cache.get, self.model, prompt, schema_fingerprint)
+        if cached is not None:
+            return cached
+        text = await self._agenerate_text(prompt)
+        if text != EMPTY_RESPONSE_TEXT:
+            await asyncio.to_thread(self.response_cache.put, self.model, prompt, text, schema_fingerprint)
+        return text
+
+    def _generate_text(self, prompt: str) -> str:
         try:
             messages = [HumanMessage(content=prompt)]
-            response = self._client.invoke(messages)
+            if self.call_policy is not None:
+                response = self.call_policy.call(lambda: self._client.invoke(messages))
+            else:
+                response = self._client.invoke(messages)
             if response and response.content:
                 return response.content.strip()
             else:
-                return "Không nhận được phản hồi dạng văn bản từ LLM (có thể do nội dung không phù hợp)."
+                return EMPTY_RESPONSE_TEXT
         except Exception as e:
             print(f"Lỗi khi gọi API LLM qua LangChain: {e}")
             raise
+
+    async def _agenerate_text(self, prompt: str) -> str:
+        try:
+            messages = [HumanMessage(content=prompt)]
+            if self.call_policy is not None:
+                response = await self.call_policy.acall(lambda: self._client.ainvoke(messages))
+            else:
+                response = await self._client.ainvoke(messages)
+            if response and response.content:
+                return response.content.strip()
+            else:
+                return EMPTY_RESPONSE_TEXT
+        except Exception as e:
+            print(f"Lỗi khi gọi API LLM qua LangChain (async): {e}")
+            raise
+
+    def stream_text(self, prompt: str) -> Iterator[str]:
+        """
+        Sinh văn bản dạng stream: yield từng đoạn text ngay khi Gemini trả về.
+        """
+        try:
+            messages = [HumanMessage(content=prompt)]
+            for chunk in self._client.stream(messages):
+                if chunk and chunk.content:
+                    yield chunk.content
+        except Exception as e:
+            print(f"Lỗi khi gọi API LLM qua LangChain (stream): {e}")
+            raise
+
+    async def astream_text(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Phiên bản async của stream_text.
+        """
+        try:
+            messages = [HumanMessage(content=prompt)]
+            async for chunk in self._client.astream(messages):
+                if chunk and chunk.content:
+                    yield chunk.content
+        except Exception as e:
+            print(f"Lỗi khi gọi API LLM qua LangChain (async stream): {e}")
+            raise
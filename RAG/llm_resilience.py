@@ -0,0 +1,299 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Deque, Optional
+
+from .metrics import metrics
+
+
+# Tên lớp exception (google.api_core / httpx / grpc) được coi là lỗi tạm thời, đáng thử lại.
+_RETRYABLE_ERROR_NAMES = {
+    'ResourceExhausted', 'TooManyRequests', 'ServiceUnavailable', 'DeadlineExceeded', 'InternalServerError',
+    'BadGateway', 'GatewayTimeout', 'Aborted', 'RetryError', 'ConnectTimeout', 'ReadTimeout', 'ConnectError',
+    'RemoteProtocolError',
+}
+_RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Lỗi tạm thời (timeout, mất kết nối, 429/5xx) thì thử lại; lỗi nội dung/xác thực thì không.
+    """
+    if isinstance(error, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in _RETRYABLE_ERROR_NAMES:
+        return True
+    code = getattr(error, 'code', None)
+    code = code() if callable(code) else code
+    return isinstance(code, int) and code in _RETRYABLE_STATUS_CODES
+
+
+class RetryBudget:
+    """
+    Ngân sách thử lại dùng chung cho mọi lời gọi: mỗi lời gọi gửi vào `ratio` token,
+    mỗi lần thử lại hoặc gửi hedge tiêu 1 token. Khi Gemini lỗi hàng loạt, số request phát sinh thêm
+    bị chặn ở khoảng `ratio` * lưu lượng (+ `min_tokens` ban đầu) thay vì nhân lên theo số lần thử.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_tokens: float = 10.0, max_tokens: float = 100.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = min_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            return self._tokens
+
+
+class LatencyTracker:
+    """
+    Giữ độ trễ của các lời gọi thành công gần nhất để tính ngưỡng hedge (vd. p95).
+    """
+
+    def __init__(self, window: int = 512, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+class LlmCallPolicy:
+    """
+    Chính sách gọi LLM: timeout mỗi lần thử, hạn chót tổng, thử lại với backoff có jitter
+    (giới hạn bởi RetryBudget), và hedging: nếu lần gọi chưa xong sau ngưỡng `hedge_after`
+    (số giây cố định, hoặc 'p95'/'p99' theo độ trễ quan sát được) thì gửi thêm một request giống hệt
+    và lấy kết quả nào về trước.
+    """
+
+    def __init__(self, timeout_seconds: Optional[float] = 30.0, deadline_seconds: Optional[float] = 60.0,
+                 max_retries: int = 2, backoff_base_seconds: float = 0.5, backoff_max_seconds: float = 4.0,
+                 retry_budget: Optional[RetryBudget] = None, hedge_after: Optional[str] = None,
+                 hedge_min_seconds: float = 0.5, max_workers: int = 32):
+        self.timeout_seconds = timeout_seconds
+        self.deadline_seconds = deadline_seconds
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.retry_budget = retry_budget or RetryBudget()
+        self.hedge_after = (hedge_after or '').strip().lower() or None
+        self.hedge_min_seconds = hedge_min_seconds
+        self.latency = LatencyTracker()
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        self.max_workers = max_workers
+
+    @classmethod
+    def from_env(cls) -> "LlmCallPolicy":
+        """
+        Đọc cấu hình từ biến môi trường:
+        LLM_TIMEOUT_SECONDS (mỗi lần thử, 0 = không giới hạn), LLM_DEADLINE_SECONDS (tổng, kể cả thử lại),
+        LLM_MAX_RETRIES, LLM_BACKOFF_BASE_SECONDS, LLM_BACKOFF_MAX_SECONDS, LLM_RETRY_BUDGET_RATIO,
+        LLM_HEDGE_AFTER ('' = tắt, số giây, hoặc 'p95'/'p99'), LLM_HEDGE_MIN_SECONDS, LLM_MAX_CONCURRENCY.
+        """
+        timeout_seconds = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+        deadline_seconds = float(os.getenv("LLM_DEADLINE_SECONDS", "60"))
+        return cls(
+            timeout_seconds=timeout_seconds or None,
+            deadline_seconds=deadline_seconds or None,
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+            backoff_base_seconds=float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5")),
+            backoff_max_seconds=float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "4")),
+            retry_budget=RetryBudget(ratio=float(os.getenv("LLM_RETRY_BUDGET_RATIO", "0.2"))),
+            hedge_after=os.getenv("LLM_HEDGE_AFTER", ""),
+            hedge_min_seconds=float(os.getenv("LLM_HEDGE_MIN_SECONDS", "0.5")),
+            max_workers=int(os.getenv("LLM_MAX_CONCURRENCY", "32")),
+        )
+
+    def hedge_delay(self) -> Optional[float]:
+        if self.hedge_after is None:
+            return None
+        if self.hedge_after.startswith('p'):
+            observed = self.latency.quantile(float(self.hedge_after[1:]) / 100.0)
+            return None if observed is None else max(observed, self.hedge_min_seconds)
+        return max(float(self.hedge_after), 0.0)
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Backoff mũ với "full jitter": ngẫu nhiên trong [0, min(max, base * 2^(attempt-1))].
+        """
+        return random.uniform(0.0, min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** (attempt - 1)))
+
+    def _attempt_timeout(self, deadline: Optional[float]) -> Optional[float]:
+        remaining = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+        if self.timeout_seconds is None:
+            return remaining
+        return self.timeout_seconds if remaining is None else min(self.timeout_seconds, remaining)
+
+    def _should_retry(self, error: BaseException, attempt: int, deadline: Optional[float]) -> Optional[float]:
+        """
+        Trả về thời gian chờ trước lần thử kế tiếp, hoặc None nếu không thử lại.
+        """
+        if attempt > self.max_retries or not is_retryable(error):
+            return None
+        delay = self.backoff(attempt)
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            return None
+        if not self.retry_budget.try_withdraw():
+            metrics.inc('llm_retry_budget_exhausted_total')
+            return None
+        metrics.inc('llm_retries_total', labels={'error': type(error).__name__})
+        return delay
+
+    def _record_success(self, started: float, hedged: bool, hedge_won: bool) -> None:
+        self.latency.observe(time.perf_counter() - started)
+        self.retry_budget.deposit()
+        if hedged:
+            metrics.inc('llm_hedges_total', labels={'outcome': 'won' if hedge_won else 'lost'})
+
+    def reset_after_fork(self) -> None:
+        """
+        Thread của executor không tồn tại trong process con sau fork; tạo executor mới ở lần gọi kế tiếp.
+        """
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='llm-call')
+            return self._executor
+
+    def call(self, fn: Callable[[], Any]) -> Any:
+        """
+        Gọi `fn` (đồng bộ) theo chính sách. Lần thử quá hạn ném TimeoutError; thread của lần thử đó
+        vẫn chạy nốt ở nền nhưng kết quả bị bỏ qua.
+        """
+        deadline = None if self.deadline_seconds is None else time.monotonic() + self.deadline_seconds
+        attempt = 0
+        while True:
+            attempt += 1
+            metrics.inc('llm_attempts_total', labels={'kind': 'primary' if attempt == 1 else 'retry'})
+            try:
+                return self._call_once(fn, self._attempt_timeout(deadline))
+            except Exception as e:
+                delay = self._should_retry(e, attempt, deadline)
+                if delay is None:
+                    raise
+                print(f"LLM call failed ({type(e).__name__}: {e}), retrying in {delay:.2f}s...")
+                time.sleep(delay)
+
+    def _call_once(self, fn: Callable[[], Any], timeout: Optional[float]) -> Any:
+        hedge_delay = self.hedge_delay()
+        if timeout is None and hedge_delay is None:
+            started = time.perf_counter()
+            result = fn()
+            self._record_success(started, False, False)
+            return result
+
+        executor = self._get_executor()
+        started = time.perf_counter()
+        expires = None if timeout is None else started + timeout
+        futures = [executor.submit(fn)]
+        hedge = None
+
+        if hedge_delay is not None and (timeout is None or hedge_delay < timeout):
+            done, _ = wait(futures, timeout=hedge_delay)
+            if not done and self.retry_budget.try_withdraw():
+                metrics.inc('llm_attempts_total', labels={'kind': 'hedge'})
+                hedge = executor.submit(fn)
+                futures.append(hedge)
+
+        last_error: Optional[BaseException] = None
+        pending = set(futures)
+        while pending:
+            remaining = None if expires is None else max(expires - time.perf_counter(), 0.0)
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    self._record_success(started, hedge is not None, future is hedge)
+                    return future.result()
+                last_error = future.exception()
+
+        if pending or last_error is None:
+            metrics.inc('llm_timeouts_total')
+            raise TimeoutError(f"LLM call timed out after {timeout:.1f}s")
+        raise last_error
+
+    async def acall(self, coro_fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Phiên bản async của call: lần thử quá hạn hoặc thua hedge bị hủy (cancel) thay vì chạy nốt.
+        """
+        deadline = None if self.deadline_seconds is None else time.monotonic() + self.deadline_seconds
+        attempt = 0
+        while True:
+            attempt += 1
+            metrics.inc('llm_attempts_total', labels={'kind': 'primary' if attempt == 1 else 'retry'})
+            try:
+                return await self._acall_once(coro_fn, self._attempt_timeout(deadline))
+            except Exception as e:
+                delay = self._should_retry(e, attempt, deadline)
+                if delay is None:
+                    raise
+                print(f"LLM call failed ({type(e).__name__}: {e}), retrying in {delay:.2f}s...")
+                await asyncio.sleep(delay)
+
+    async def _acall_once(self, coro_fn: Callable[[], Awaitable[Any]], timeout: Optional[float]) -> Any:
+        started = time.perf_counter()
+        expires = None if timeout is None else started + timeout
+        tasks = [asyncio.ensure_future(coro_fn())]
+        hedge = None
+        try:
+            hedge_delay = self.hedge_delay()
+            if hedge_delay is not None and (timeout is None or hedge_delay < timeout):
+                done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+                if not done and self.retry_budget.try_withdraw():
+                    metrics.inc('llm_attempts_total', labels={'kind': 'hedge'})
+                    hedge = asyncio.ensure_future(coro_fn())
+                    tasks.append(hedge)
+
+            last_error: Optional[BaseException] = None
+            pending = set(tasks)
+            while pending:
+                remaining = None if expires is None else max(expires - time.perf_counter(), 0.0)
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    if task.exception() is None:
+                        self._record_success(started, hedge is not None, task is hedge)
+                        return task.result()
+                    last_error = task.exception()
+
+            if pending or last_error is None:
+                metrics.inc('llm_timeouts_total')
+                raise TimeoutError(f"LLM call timed out after {timeout:.1f}s")
+            raise last_error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
@@ -0,0 +1,221 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+
+_LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Optional[Dict[str, str]]) -> _LabelKey:
+    return tuple(sorted((labels or {}).items()))
+
+
+def _format_labels(label_key: _LabelKey, extra: Optional[Dict[str, str]] = None) -> str:
+    items = list(label_key) + list((extra or {}).items())
+    if not items:
+        return ""
+    rendered = ",".join(f'{name}="{str(value).replace(chr(34), chr(39))}"' for name, value in items)
+    return "{" + rendered + "}"
+
+
+class _Histogram:
+    """
+    Giữ `reservoir_size` mẫu gần nhất để tính p50/p95/p99, cùng tổng count/sum từ lúc khởi động.
+    """
+
+    def __init__(self, reservoir_size: int):
+        self.samples: Deque[float] = deque(maxlen=reservoir_size)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float) -> None:
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def percentiles(self, quantiles=(0.5, 0.95, 0.99)) -> Dict[float, float]:
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {q: 0.0 for q in quantiles}
+        last = len(ordered) - 1
+        return {q: ordered[min(last, int(round(q * last)))] for q in quantiles}
+
+
+class MetricsRegistry:
+    """
+    Registry đơn giản cho counter và histogram có nhãn, xuất ra định dạng text của Prometheus.
+    Histogram được xuất dưới dạng summary (quantile 0.5/0.95/0.99 + _count/_sum).
+    """
+
+    def __init__(self, reservoir_size: int = 2048):
+        self.reservoir_size = reservoir_size
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[_LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[_LabelKey, _Histogram]] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def inc(self, name: str, amount: float = 1.0, labels: Optional[Dict[str, str]] = None) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = _Histogram(self.reservoir_size)
+            histogram.observe(value)
+
+    def counter_value(self, name: str, labels: Optional[Dict[str, str]] = None) -> float:
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0.0)
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """
+        Ảnh chụp dạng dict (dùng cho benchmark/log): {name: {labels: {...}}}.
+        """
+        result: Dict[str, Dict[str, Dict[str, float]]] = {}
+        with self._lock:
+            for name, series in self._histograms.items():
+                for key, histogram in series.items():
+                    p = histogram.percentiles()
+                    result.setdefault(name, {})[_format_labels(key) or "{}"] = {
+                        'count': histogram.count, 'sum': histogram.total,
+                        'p50': p[0.5], 'p95': p[0.95], 'p99': p[0.99],
+                    }
+            for name, series in self._counters.items():
+                for key, value in series.items():
+                    result.setdefault(name, {})[_format_labels(key) or "{}"] = {'value': value}
+        return result
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name in sorted(self._counters):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(self._counters[name].items()):
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+
+            for name in sorted(self._histograms):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} summary")
+                for key, histogram in sorted(self._histograms[name].items()):
+                    for quantile, value in histogram.percentiles().items():
+                        lines.append(f"{name}{_format_labels(key, {'quantile': str(quantile)})} {value:.6f}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.total:.6f}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+metrics = MetricsRegistry()
+metrics.describe('chat_stage_seconds', 'Latency of each /chat pipeline stage in seconds.')
+metrics.describe('chat_requests_total', 'Number of /chat requests by outcome.')
+metrics.describe('intent_router_requests_total', 'Questions answered by a local SQL template, by intent (none = LLM).')
+metrics.describe('sql_prompt_chars', 'SQL-generation prompt size in characters, with the full and the pruned schema.')
+metrics.describe('result_prompt_chars', 'Size in characters of the result table sent to the answer prompt.')
+metrics.describe('answer_prompt_chars', 'Friendly-answer (second LLM call) prompt size in characters.')
+metrics.describe('sql_cache_requests_total', 'Question-to-SQL cache lookups by result.')
+metrics.describe('result_cache_requests_total', 'SQL result cache lookups by result.')
+metrics.describe('sql_validation_rejections_total', 'Generated SQL rejected by the validator.')
+metrics.describe('llm_errors_total', 'LLM call failures by stage.')
+metrics.describe('llm_attempts_total', 'Upstream LLM attempts by kind (primary, retry, hedge).')
+metrics.describe('llm_hedges_total', 'Hedged LLM calls by outcome (won = the hedge answered first).')
+metrics.describe('llm_retries_total', 'LLM retries by the error that caused them.')
+metrics.describe('llm_timeouts_total', 'LLM attempts abandoned after the per-attempt timeout.')
+metrics.describe('llm_retry_budget_exhausted_total', 'LLM retries or hedges skipped because the retry budget was empty.')
+metrics.describe('llm_cache_requests_total', 'Persistent LLM response cache lookups by result.')
+metrics.describe('replica_queries_total', 'Queries sent to the local replica, by result (local, unsupported, error, not_ready).')
+metrics.describe('replica_refresh_total', 'Local replica refreshes, by kind (full, incremental, error).')
+metrics.describe('replica_refresh_seconds', 'Duration of a local replica refresh in seconds.')
+metrics.describe('replica_rows_changed_total', 'Rows written or deleted in the local replica, by view.')
+metrics.describe('name_index_rewrites_total', 'Leading-wildcard LIKE predicates seen by the name index, by result (rewritten, no_match, too_many, unsupported).')
+metrics.describe('session_follow_ups_total', 'Questions in a session with prior results, by how they were answered (local kind or pipeline).')
+metrics.describe('llm_coalesced_waiters_total', 'LLM calls that shared an identical in-flight request instead of calling Gemini.')
+metrics.describe('llm_calls_avoided_total', 'Friendly-answer LLM calls replaced by a template, by result shape.')
+
+
+_current_request: contextvars.ContextVar[Optional[Dict]] = contextvars.ContextVar('chat_request', default=None)
+
+
+def structured_logs_enabled() -> bool:
+    return os.getenv("STRUCTURED_LOGS", "false").lower() in ("1", "true", "yes")
+
+
+def current_request_id() -> Optional[str]:
+    request = _current_request.get()
+    return request['request_id'] if request else None
+
+
+def mark_request(status: str) -> None:
+    """
+    Ghi kết quả (vd. 'step1_error', 'llm_error') cho request đang được track_request theo dõi.
+    """
+    request = _current_request.get()
+    if request is not None:
+        request['status'] = status
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """
+    Đo thời gian một bước của pipeline: ghi vào histogram chat_stage_seconds{stage=...}
+    và vào bản ghi của request hiện tại (nếu có) cho log JSON.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.observe('chat_stage_seconds', elapsed, {'stage': stage})
+        request = _current_request.get()
+        if request is not None:
+            request['stages'][stage] = round(request['stages'].get(stage, 0.0) + elapsed * 1000, 3)
+
+
+@contextmanager
+def track_request(request_id: Optional[str] = None, endpoint: str = 'chat') -> Iterator[Dict]:
+    """
+    Bao một request /chat: gán request ID, đo tổng thời gian và (nếu STRUCTURED_LOGS bật)
+    in một dòng log JSON chứa thời gian từng bước.
+    Gán `record['status']` bên trong để ghi lại kết quả (mặc định 'ok').
+    """
+    record = {'request_id': request_id or uuid.uuid4().hex, 'endpoint': endpoint, 'status': 'ok', 'stages': {}}
+    token = _current_request.set(record)
+    started = time.perf_counter()
+    try:
+        yield record
+    except Exception:
+        record['status'] = 'exception'
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        metrics.observe('chat_stage_seconds', elapsed, {'stage': f'{endpoint}_total'})
+        metrics.inc('chat_requests_total', labels={'endpoint': endpoint, 'status': record['status']})
+        try:
+            _current_request.reset(token)
+        except ValueError:
+            _current_request.set(None)
+        if structured_logs_enabled():
+            record['total_ms'] = round(elapsed * 1000, 3)
+            record['ts'] = time.time()
+            print(json.dumps(record, ensure_ascii=False, default=str))
@@ -0,0 +1,303 @@
+import os
+import re
+import threading
+import time
+import traceback
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import text
+
+from .metrics import metrics
+from .text_utils import fold_diacritics
+
+
+class IndexedField(NamedTuple):
+    view: str
+    column: str
+    key: str
+
+
+# Các cột tên/địa điểm mà prompt hướng LLM dùng LIKE '%...%', kèm khóa để viết lại thành `key IN (...)`.
+DEFAULT_FIELDS: List[IndexedField] = [
+    IndexedField('events_view', 'name', 'event_id'),
+    IndexedField('events_view', 'location', 'event_id'),
+    IndexedField('organizations_view', 'fullname', 'organization_id'),
+    IndexedField('organizations_view', 'username', 'organization_id'),
+]
+
+_SQL_KEYWORDS = ('WHERE', 'JOIN', 'ON', 'LEFT', 'RIGHT', 'INNER', 'OUTER', 'CROSS', 'NATURAL', 'STRAIGHT_JOIN',
+                 'GROUP', 'ORDER', 'LIMIT', 'HAVING', 'USING', 'UNION')
+_STRING_LITERAL = r"'(?:[^'\\]|''|\\.)*'"
+_LITERAL_RE = re.compile(_STRING_LITERAL + r"|\"(?:[^\"\\]|\"\"|\\.)*\"|`[^`]*`", re.DOTALL)
+_TABLE_RE = re.compile(r"\b(?:FROM|JOIN)\s+`?(\w+)`?(?:\s+(?:AS\s+)?(?!(?:" + "|".join(_SQL_KEYWORDS) + r")\b)(\w+))?",
+                       re.IGNORECASE)
+_PREDICATE_RE = re.compile(
+    r"(?P<literal>" + _LITERAL_RE.pattern + r")"
+    r"|(?<![\w.`])(?P<not>NOT\s+)?"
+    r"(?:LOWER\s*\(\s*(?P<lower_column>(?:`?\w+`?\.)?`?\w+`?)\s*\)|(?P<column>(?:`?\w+`?\.)?`?\w+`?))"
+    r"\s+(?P<not_like>NOT\s+)?LIKE\s+"
+    r"(?:LOWER\s*\(\s*(?P<lower_pattern>" + _STRING_LITERAL + r")\s*\)|(?P<pattern>" + _STRING_LITERAL + r"))"
+    r"(?!\s*ESCAPE\b)",
+    re.IGNORECASE | re.DOTALL)
+
+
+def fold_name(value) -> str:
+    """
+    Dạng so khớp của tên/địa điểm: bỏ dấu, chữ thường, gộp khoảng trắng ("Hà  Nội" -> "ha noi").
+    """
+    if value is None:
+        return ""
+    return " ".join(fold_diacritics(str(value)).casefold().split())
+
+
+def _trigrams(folded: str) -> Set[str]:
+    return {folded[i:i + 3] for i in range(len(folded) - 2)}
+
+
+class NameIndex:
+    """
+    Chỉ mục trigram trong process trên tên sự kiện, địa điểm, tên và username tổ chức (DEFAULT_FIELDS),
+    so khớp không phân biệt hoa thường và dấu tiếng Việt ("ha noi" khớp "Hà Nội").
+
+    - `refresh()` đọc (khóa, các cột) của từng view và chỉ cập nhật posting của các hàng thay đổi/bị xóa;
+      chạy lúc khởi động và định kỳ trong thread nền.
+    - `search(view, column, pattern)` trả về các khóa có giá trị khớp mẫu LIKE (`%` là wildcard).
+    - `rewrite_sql(sql)` viết lại các vị từ `[LOWER(]col[)] LIKE '%...'` (wildcard ở đầu, MySQL không dùng
+      được index) trên các cột được lập chỉ mục thành `key IN ('id1', ...)`. Vị từ được giữ nguyên khi chỉ mục
+      không tìm thấy hàng nào (có thể do chỉ mục chưa kịp làm mới) hoặc tìm thấy quá `max_ids` hàng.
+    """
+
+    def __init__(self, source_engine, fields: List[IndexedField] = DEFAULT_FIELDS, refresh_interval: float = 120.0,
+                 max_ids: int = 200):
+        self.source_engine = source_engine
+        self.fields = fields
+        self.refresh_interval = refresh_interval
+        self.max_ids = max_ids
+
+        self._fields_by_view: Dict[str, List[IndexedField]] = {}
+        for field in fields:
+            self._fields_by_view.setdefault(field.view, []).append(field)
+
+        self._lock = threading.Lock()
+        self._texts: Dict[Tuple[str, str], Dict[str, str]] = {(f.view, f.column): {} for f in fields}
+        self._postings: Dict[Tuple[str, str], Dict[str, Set[str]]] = {(f.view, f.column): {} for f in fields}
+        self._ready = False
+        self.last_refresh_at: Optional[float] = None
+
+        self._stop_event = threading.Event()
+        self._refresh_thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls, source_engine) -> Optional["NameIndex"]:
+        """
+        Trả về None nếu NAME_INDEX_ENABLED tắt hoặc không có kết nối DB.
+        NAME_INDEX_REFRESH_INTERVAL (giây, mặc định 120), NAME_INDEX_MAX_IDS (mặc định 200).
+        """
+        if source_engine is None or os.getenv("NAME_INDEX_ENABLED", "true").lower() not in ("1", "true", "yes"):
+            return None
+        return cls(
+            source_engine,
+            refresh_interval=float(os.getenv("NAME_INDEX_REFRESH_INTERVAL", "120")),
+            max_ids=int(os.getenv("NAME_INDEX_MAX_IDS", "200")),
+        )
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def _update_field(self, field_key: Tuple[str, str], values: Dict[str, str]) -> int:
+        texts = self._texts[field_key]
+        postings = self._postings[field_key]
+        changed = 0
+
+        for key in [key for key in texts if key not in values]:
+            for gram in _trigrams(texts.pop(key)):
+                postings[gram].discard(key)
+            changed += 1
+
+        for key, folded in values.items():
+            previous = texts.get(key)
+            if previous == folded:
+                continue
+            old_grams = _trigrams(previous) if previous is not None else set()
+            new_grams = _trigrams(folded)
+            for gram in old_grams - new_grams:
+                postings[gram].discard(key)
+            for gram in new_grams - old_grams:
+                postings.setdefault(gram, set()).add(key)
+            texts[key] = folded
+            changed += 1
+        return changed
+
+    def refresh(self) -> int:
+        """
+        Đồng bộ chỉ mục với DB; trả về số giá trị đã thêm/đổi/xóa.
+        """
+        started = time.perf_counter()
+        fetched: Dict[Tuple[str, str], Dict[str, str]] = {}
+        try:
+            with self.source_engine.connect() as connection:
+                for view, fields in self._fields_by_view.items():
+                    key = fields[0].key
+                    columns = ", ".join(f"`{field.column}`" for field in fields)
+                    rows = connection.execute(text(f"SELECT `{key}`, {columns} FROM `{view}`")).fetchall()
+                    for index, field in enumerate(fields, start=1):
+                        fetched[(view, field.column)] = {str(row[0]): fold_name(row[index]) for row in rows}
+        except Exception as e:
+            print(f"Error refreshing name index: {e}")
+            traceback.print_exc()
+            return 0
+
+        with self._lock:
+            changed = sum(self._update_field(field_key, values) for field_key, values in fetched.items())
+            self._ready = True
+        self.last_refresh_at = time.time()
+        print(f"Name index refreshed in {(time.perf_counter() - started) * 1000:.1f} ms ({changed} change(s)).")
+        return changed
+
+    def search(self, view: str, column: str, pattern: str) -> Optional[List[str]]:
+        """
+        Các khóa có giá trị khớp mẫu LIKE `pattern` (sau khi bỏ dấu), sắp xếp tăng dần.
+        None nếu cột không được lập chỉ mục, chỉ mục chưa sẵn sàng, hoặc mẫu dùng `_`/ký tự escape.
+        """
+        field_key = (view.lower(), column.lower())
+        if field_key not in self._texts or not self._ready or '_' in pattern or '\\' in pattern:
+            return None
+
+        pieces = [fold_name(piece) for piece in pattern.split('%')]
+        anchored_start, anchored_end = not pattern.startswith('%'), not pattern.endswith('%')
+        needles = [piece for piece in pieces if piece]
+        longest = max(needles, key=len, default="")
+
+        with self._lock:
+            texts = self._texts[field_key]
+            postings = self._postings[field_key]
+            if len(longest) >= 3:
+                grams = sorted((postings.get(gram, set()) for gram in _trigrams(longest)), key=len)
+                candidates = set(grams[0]).intersection(*grams[1:]) if grams else set()
+            else:
+                candidates = set(texts)
+            matches = [key for key in candidates
+                       if self._matches(texts[key], pieces, anchored_start, anchored_end)]
+        return sorted(matches)
+
+    @staticmethod
+    def _matches(folded: str, pieces: List[str], anchored_start: bool, anchored_end: bool) -> bool:
+        if anchored_start and not folded.startswith(pieces[0]):
+            return False
+        if anchored_end and not folded.endswith(pieces[-1]):
+            return False
+        position = 0
+        for piece in pieces:
+            if not piece:
+                continue
+            found = folded.find(piece, position)
+            if found < 0:
+                return False
+            position = found + len(piece)
+        return True
+
+    def rewrite_sql(self, sql: str) -> str:
+        """
+        Viết lại các vị từ LIKE có wildcard ở đầu trên cột được lập chỉ mục thành tra cứu `key IN (...)`.
+        Trả về SQL gốc nếu không có gì để viết lại.
+        """
+        if not self._ready:
+            return sql
+
+        stripped = _LITERAL_RE.sub("''", sql)
+        aliases: Dict[str, str] = {}
+        references: Dict[str, str] = {}
+        for match in _TABLE_RE.finditer(stripped):
+            view = match.group(1).lower()
+            aliases[view] = view
+            if match.group(2):
+                aliases[match.group(2).lower()] = view
+            references.setdefault(view, match.group(2) or match.group(1))
+
+        indexed_views = {view for view in aliases.values() if view in self._fields_by_view}
+        if not indexed_views:
+            return sql
+        multi_table = len(set(aliases.values())) > 1
+
+        def replace(match: re.Match) -> str:
+            if match.group('literal') is not None:
+                return match.group(0)
+            column_ref = (match.group('lower_column') or match.group('column')).replace('`', '')
+            raw_pattern = match.group('lower_pattern') or match.group('pattern')
+            pattern = raw_pattern[1:-1].replace("''", "'")
+            if match.group('not') or match.group('not_like') or not pattern.startswith('%'):
+                return match.group(0)
+
+            qualifier, _, column = column_ref.rpartition('.')
+            if qualifier:
+                view = aliases.get(qualifier.lower())
+                candidates = [view] if view in indexed_views else []
+            else:
+                candidates = [view for view in indexed_views
+                              if any(field.column == column.lower() for field in self._fields_by_view[view])]
+            if len(candidates) != 1:
+                return match.group(0)
+            view = candidates[0]
+            field = next((f for f in self._fields_by_view[view] if f.column == column.lower()), None)
+            if field is None:
+                return match.group(0)
+
+            ids = self.search(view, field.column, pattern)
+            if ids is None:
+                metrics.inc('name_index_rewrites_total', labels={'result': 'unsupported'})
+                return match.group(0)
+            if not ids:
+                metrics.inc('name_index_rewrites_total', labels={'result': 'no_match'})
+                return match.group(0)
+            if len(ids) > self.max_ids:
+                metrics.inc('name_index_rewrites_total', labels={'result': 'too_many'})
+                return match.group(0)
+
+            metrics.inc('name_index_rewrites_total', labels={'result': 'rewritten'})
+            if qualifier or multi_table:
+                key = f"{qualifier or references[view]}.{field.key}"
+            else:
+                key = field.key
+            id_list = ", ".join("'" + key_id.replace("'", "''") + "'" for key_id in ids)
+            return f"{key} IN ({id_list})"
+
+        return _PREDICATE_RE.sub(replace, sql)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                'ready': self._ready,
+                'fields': {f"{view}.{column}": len(texts) for (view, column), texts in self._texts.items()},
+                'last_refresh_at': self.last_refresh_at,
+                'refresh_interval': self.refresh_interval,
+            }
+
+    def start_background_refresh(self) -> None:
+        if self.refresh_interval <= 0:
+            print("Name index background refresh disabled (refresh_interval <= 0).")
+            return
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._refresh_thread = threading.Thread(target=self._refresh_loop, name="name-index-refresh", daemon=True)
+        self._refresh_thread.start()
+        print(f"Name index background refresh started (every {self.refresh_interval}s).")
+
+    def stop_background_refresh(self) -> None:
+        self._stop_event.set()
+        if self._refresh_thread is not None:
+            self._refresh_thread.join(timeout=5)
+            self._refresh_thread = None
+
+    def _refresh_loop(self) -> None:
+        if self._ready:
+            self._stop_event.wait(self.refresh_interval)
+        while not self._stop_event.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error refreshing name index in background: {e}")
+                traceback.print_exc()
+            self._stop_event.wait(self.refresh_interval)
@@ -0,0 +1,232 @@
+import re
+import threading
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from .text_utils import normalize_question
+
+
+_TABLE_HEADER_RE = re.compile(r"^-Bảng '([^']+)':\s*$")
+
+# Từ khóa (đã bỏ dấu) cho từng view, bổ sung cho tên cột/ghi chú lấy từ chính schema.
+VIEW_KEYWORDS: Dict[str, List[str]] = {
+    'events_view': ['su kien', 'hoat dong', 'chuong trinh', 'dang ki', 'dang ky', 'con cho', 'het cho', 'dien ra',
+                    'dia diem', 'to chuc o', 'to chuc tai'],
+    'organizations_view': ['to chuc', 'nha to chuc', 'don vi', 'ban to chuc', 'cau lac bo', 'clb', 'nguoi dai dien'],
+    'volunteers_view': ['tinh nguyen vien', 'tnv', 'thanh vien', 'nguoi tham gia', 'nguoi dung'],
+    'top_volunteers_view': ['top', 'tich cuc', 'xep hang', 'bang xep hang', 'nhieu nhat', 'noi bat', 'quy'],
+    'results_view': ['ket qua', 'thanh qua', 'bao cao', 'tong ket', 'hinh anh ket qua'],
+}
+
+# Từ khóa (đã bỏ dấu) cho từng cột; khớp cột nào thì chọn view chứa cột đó.
+COLUMN_KEYWORDS: Dict[str, List[str]] = {
+    'location': ['dia diem', 'o dau', 'tai'],
+    'start_date': ['bat dau', 'khi nao', 'ngay', 'sap dien ra', 'thoi gian'],
+    'end_date': ['ket thuc', 'vua ket thuc', 'thoi gian'],
+    'quantity_now': ['con cho', 'het cho', 'so luong', 'dang ki', 'dang ky', 'day'],
+    'max_quantity': ['con cho', 'het cho', 'so luong', 'toi da', 'day'],
+    'min_quantity': ['toi thieu'],
+    'status': ['trang thai'],
+    'email': ['email', 'lien he', 'lien lac'],
+    'phone': ['so dien thoai', 'sdt', 'dien thoai', 'lien he', 'lien lac'],
+    'address': ['dia chi'],
+    'website': ['website', 'trang web'],
+    'founded_at': ['thanh lap'],
+    'representative': ['dai dien'],
+    'point': ['diem so', 'diem tich luy', 'bao nhieu diem'],
+    'participation_count': ['so lan tham gia', 'tham gia nhieu'],
+    'quarter': ['quy'],
+    'year': ['nam nay', 'nam ngoai'],
+    'content': ['noi dung'],
+    'images': ['hinh anh', 'anh'],
+    'image': ['hinh anh', 'anh'],
+}
+
+# View chỉ có nghĩa khi đi kèm view liên kết (kết quả cần tên sự kiện, top TNV cần tên TNV).
+REQUIRED_JOIN_PARTNERS: Dict[str, List[str]] = {
+    'results_view': ['events_view'],
+    'top_volunteers_view': ['volunteers_view'],
+}
+
+# Cột ít khi cần cho câu hỏi của người dùng; chỉ giữ lại khi câu hỏi nhắc tới.
+LOW_VALUE_COLUMNS = {'created_at', 'updated_at', 'avatar', 'cover'}
+LOW_VALUE_KEYWORDS: Dict[str, List[str]] = {
+    'created_at': ['tao', 'dang', 'moi nhat', 'gan day'],
+    'updated_at': ['cap nhat'],
+    'avatar': ['avatar', 'anh dai dien'],
+    'cover': ['anh bia', 'cover'],
+}
+
+
+class _ViewBlock(NamedTuple):
+    header: str
+    columns: List[Tuple[str, str]]
+    primary_key: Optional[str]
+
+
+class PrunedSchema(NamedTuple):
+    text: str
+    views: List[str]
+    full_chars: int
+    pruned_chars: int
+
+
+def _contains_phrase(padded_question: str, phrase: str) -> bool:
+    return f" {phrase} " in padded_question
+
+
+def parse_schema(schema_text: str) -> Tuple[str, Dict[str, _ViewBlock]]:
+    """
+    Tách mô tả schema (định dạng của DatabaseConnector.get_schema_description / db_context.txt)
+    thành phần mở đầu và từng khối "-Bảng 'x':" kèm danh sách (tên cột, dòng gốc).
+    """
+    preamble: List[str] = []
+    blocks: Dict[str, _ViewBlock] = {}
+    current = None
+    for line in schema_text.splitlines():
+        header = _TABLE_HEADER_RE.match(line.strip())
+        if header:
+            current = header.group(1)
+            blocks[current.lower()] = _ViewBlock(line.strip(), [], None)
+            continue
+        if current is None:
+            preamble.append(line)
+            continue
+        parts = line.split()
+        if len(parts) >= 2 and parts[0].isdigit():
+            block = blocks[current.lower()]
+            column = parts[1].lower()
+            block.columns.append((column, line.rstrip()))
+            if block.primary_key is None:
+                blocks[current.lower()] = block._replace(primary_key=column)
+    return "\n".join(preamble).strip(), blocks
+
+
+class SchemaPruner:
+    """
+    Rút gọn mô tả schema trong prompt sinh SQL theo câu hỏi:
+    - chọn view theo chỉ mục từ khóa/đồng nghĩa trên câu hỏi đã bỏ dấu: trước hết theo tên view và
+      VIEW_KEYWORDS, nếu không khớp view nào thì theo tên cột, ghi chú cột và COLUMN_KEYWORDS;
+    - tự thêm view liên kết bắt buộc (REQUIRED_JOIN_PARTNERS) và view trung gian trên đường JOIN
+      (khóa ngoại *_id suy ra từ khóa chính của các view, vd. event_id, organization_id);
+    - bỏ các cột ít giá trị (created_at, avatar, ...) trừ khi câu hỏi nhắc tới.
+    Không khớp view nào thì giữ nguyên schema đầy đủ.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._parsed_for: Optional[str] = None
+        self._parsed = None
+
+    def _parse(self, schema_text: str):
+        with self._lock:
+            if self._parsed_for == schema_text:
+                return self._parsed
+
+        preamble, blocks = parse_schema(schema_text)
+        keyword_index = self._build_keyword_index(blocks)
+        join_graph = self._build_join_graph(blocks)
+        parsed = (preamble, blocks, keyword_index, join_graph)
+
+        with self._lock:
+            self._parsed_for, self._parsed = schema_text, parsed
+        return parsed
+
+    @staticmethod
+    def _build_keyword_index(blocks: Dict[str, _ViewBlock]) -> Tuple[Dict[str, Set[str]], Dict[str, Set[str]]]:
+        """
+        Trả về (từ khóa cấp view, từ khóa cấp cột) cho từng view.
+        """
+        view_index: Dict[str, Set[str]] = {}
+        column_index: Dict[str, Set[str]] = {}
+        for view, block in blocks.items():
+            view_keywords = view_index.setdefault(view, set(VIEW_KEYWORDS.get(view, [])))
+            view_keywords.add(normalize_question(view[:-len('_view')] if view.endswith('_view') else view))
+
+            column_keywords = column_index.setdefault(view, set())
+            for column, line in block.columns:
+                column_keywords.update(COLUMN_KEYWORDS.get(column, []))
+                if column not in LOW_VALUE_COLUMNS and not column.endswith('_id'):
+                    column_keywords.add(normalize_question(column))
+                if ':' in line:
+                    comment = normalize_question(line.split(':', 1)[1])
+                    column_keywords.update(word for word in comment.split() if len(word) >= 4)
+        return view_index, column_index
+
+    @staticmethod
+    def _build_join_graph(blocks: Dict[str, _ViewBlock]) -> Dict[str, Set[str]]:
+        owners = {block.primary_key: view for view, block in blocks.items()
+                  if block.primary_key and block.primary_key.endswith('_id')}
+        graph: Dict[str, Set[str]] = {view: set() for view in blocks}
+        for view, block in blocks.items():
+            for column, _ in block.columns:
+                owner = owners.get(column)
+                if owner and owner != view:
+                    graph[view].add(owner)
+                    graph[owner].add(view)
+        return graph
+
+    @staticmethod
+    def _shortest_path(graph: Dict[str, Set[str]], start: str, goal: str) -> List[str]:
+        previous = {start: None}
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            if node == goal:
+                path = []
+                while node is not None:
+                    path.append(node)
+                    node = previous[node]
+                return path
+            for neighbour in sorted(graph.get(node, ())):
+                if neighbour not in previous:
+                    previous[neighbour] = node
+                    queue.append(neighbour)
+        return []
+
+    def select_views(self, schema_text: str, question: str) -> List[str]:
+        _, blocks, (view_index, column_index), join_graph = self._parse(schema_text)
+        padded = f" {normalize_question(question)} "
+
+        selected = set()
+        for keyword_index in (view_index, column_index):
+            selected = {view for view, keywords in keyword_index.items()
+                        if any(_contains_phrase(padded, keyword) for keyword in keywords if keyword)}
+            if selected:
+                break
+        if not selected:
+            return []
+
+        for view in list(selected):
+            selected.update(partner for partner in REQUIRED_JOIN_PARTNERS.get(view, []) if partner in blocks)
+
+        ordered = [view for view in blocks if view in selected]
+        anchor = ordered[0]
+        for view in ordered[1:]:
+            selected.update(self._shortest_path(join_graph, anchor, view))
+
+        return [view for view in blocks if view in selected]
+
+    def prune(self, schema_text: str, question: str) -> PrunedSchema:
+        preamble, blocks, _, _ = self._parse(schema_text)
+        views = self.select_views(schema_text, question)
+        if not views:
+            return PrunedSchema(schema_text, list(blocks), len(schema_text), len(schema_text))
+
+        padded = f" {normalize_question(question)} "
+        lines = [preamble] if preamble else []
+        for view in views:
+            block = blocks[view]
+            lines.append("")
+            lines.append(block.header)
+            for column, line in block.columns:
+                if column in LOW_VALUE_COLUMNS and not any(
+                        _contains_phrase(padded, keyword) for keyword in LOW_VALUE_KEYWORDS.get(column, [])):
+                    continue
+                lines.append(line)
+
+        text = "\n".join(lines) + "\n"
+        return PrunedSchema(text, views, len(schema_text), len(text))
+
+
+default_schema_pruner = SchemaPruner()
@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from .text_utils import normalize_question
+
+
+class SqlQueryCache:
+    """
+    Cache câu hỏi -> SQL đã qua clean_sql_query và is_valid_sql, để bỏ qua lần gọi LLM tạo SQL.
+
+    Khóa là (câu hỏi đã chuẩn hóa, fingerprint của schema), nên khi schema đổi thì các mục cũ
+    tự động không còn khớp. Loại bỏ theo LRU khi vượt `max_entries` và theo TTL `ttl_seconds`.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[str, float, float]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.llm_seconds_saved = 0.0
+
+    @staticmethod
+    def make_key(question: str, schema_fingerprint: str) -> Tuple[str, str]:
+        return normalize_question(question), schema_fingerprint
+
+    def get(self, question: str, schema_fingerprint: str) -> Optional[str]:
+        """
+        Trả về SQL đã cache cho câu hỏi, hoặc None nếu không có / đã hết hạn.
+        """
+        key = self.make_key(question, schema_fingerprint)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            sql, stored_at, llm_seconds = entry
+            if self.ttl_seconds > 0 and now - stored_at >= self.ttl_seconds:
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.llm_seconds_saved += llm_seconds
+            return sql
+
+    def put(self, question: str, schema_fingerprint: str, sql: str, llm_seconds: float = 0.0) -> None:
+        """
+        Lưu SQL đã xác thực. `llm_seconds` là thời gian LLM đã tốn để tạo SQL này,
+        được cộng vào `llm_seconds_saved` mỗi lần cache hit.
+        """
+        if self.max_entries <= 0:
+            return
+        key = self.make_key(question, schema_fingerprint)
+        if not key[0]:
+            return
+        with self._lock:
+            self._entries[key] = (sql, time.monotonic(), llm_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits / total) if total else 0.0,
+                'llm_seconds_saved': round(self.llm_seconds_saved, 3),
+            }
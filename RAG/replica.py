@@ -0,0 +1,566 @@
+import datetime
+import decimal
+import functools
+import os
+import re
+import sqlite3
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy import types as sqltypes
+
+from .constants import ALLOWED_TABLES, BLACKLISTED_COLUMNS
+from .metrics import metrics
+from .result_set import ResultSet
+from .text_utils import fold_diacritics
+
+
+# ----------------------------------------------------------------------------------------------
+# Dịch SQL MySQL -> SQLite
+# ----------------------------------------------------------------------------------------------
+
+_LITERAL_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"|`[^`]*`", re.DOTALL)
+_PLACEHOLDER_RE = re.compile(r"\x00(\d+)\x00")
+_LIMIT_OFFSET_RE = re.compile(r"\bLIMIT\s+(\d+)\s*,\s*(\d+)", re.IGNORECASE)
+_NOW_RE = re.compile(r"\b(?:NOW|CURRENT_TIMESTAMP|SYSDATE|LOCALTIME|LOCALTIMESTAMP)\s*\(\s*\)|\bCURRENT_TIMESTAMP\b",
+                     re.IGNORECASE)
+_CURDATE_RE = re.compile(r"\b(?:CURDATE|CURRENT_DATE)\s*\(\s*\)|\bCURRENT_DATE\b", re.IGNORECASE)
+_INTERVAL_RE = re.compile(
+    r"INTERVAL\s+(?:(-?\d+)|\x00(\d+)\x00)\s+(SECOND|MINUTE|HOUR|DAY|WEEK|MONTH|QUARTER|YEAR)S?\b", re.IGNORECASE)
+_SIGNED_INTERVAL_RE = re.compile(r"([+-])\s*" + _INTERVAL_RE.pattern, re.IGNORECASE)
+_FUNCTION_RE = re.compile(r"\b(YEAR|MONTH|DAY|DAYOFMONTH|HOUR|MINUTE|QUARTER|DATEDIFF|DATE_ADD|DATE_SUB|CONCAT)\s*\(",
+                          re.IGNORECASE)
+# Cấu trúc có ngữ nghĩa khác giữa MySQL và SQLite (chia số nguyên, định dạng ngày...) -> chạy trên MySQL.
+_UNSUPPORTED_RE = re.compile(
+    r"\b(?:DATE_FORMAT|STR_TO_DATE|TIMESTAMPDIFF|UNIX_TIMESTAMP|FROM_UNIXTIME|FIND_IN_SET|SEPARATOR|DIV|"
+    r"REGEXP|RLIKE|SOUNDS|MATCH|AGAINST|FOR\s+UPDATE|LOCK)\b|/|@", re.IGNORECASE)
+
+_NOW_SQL = "datetime('now', 'localtime')"
+_CURDATE_SQL = "date('now', 'localtime')"
+_UNIT_MODIFIERS = {'SECOND': ('seconds', 1), 'MINUTE': ('minutes', 1), 'HOUR': ('hours', 1), 'DAY': ('days', 1),
+                   'WEEK': ('days', 7), 'MONTH': ('months', 1), 'QUARTER': ('months', 3), 'YEAR': ('years', 1)}
+_STRFTIME_PARTS = {'YEAR': '%Y', 'MONTH': '%m', 'DAY': '%d', 'DAYOFMONTH': '%d', 'HOUR': '%H', 'MINUTE': '%M'}
+
+
+class UnsupportedSql(ValueError):
+    """
+    SQL dùng cấu trúc MySQL không dịch được sang SQLite; caller chạy câu lệnh gốc trên MySQL.
+    """
+
+
+def _sqlite_literal(raw: str) -> str:
+    """
+    Chuỗi MySQL ('...' hoặc "...", có escape bằng backslash) -> chuỗi SQLite '...'.
+    Như MySQL, \\% và \\_ giữ nguyên backslash (để LIKE hiểu là ký tự thường). Identifier `...` -> "...".
+    """
+    if raw[0] == '`':
+        return '"' + raw[1:-1].replace('"', '""') + '"'
+    quote = raw[0]
+    body = raw[1:-1].replace(quote * 2, quote)
+    body = re.sub(r"\\(.)", lambda m: {'n': '\n', 't': '\t', '0': '\0', '%': '\\%', '_': '\\_'}.get(
+        m.group(1), m.group(1)), body, flags=re.DOTALL)
+    return "'" + body.replace("'", "''") + "'"
+
+
+def _interval_modifier(match: re.Match, literals: List[str], sign: str = '+') -> str:
+    number, literal_index, unit = match.group(match.lastindex - 2), match.group(match.lastindex - 1), match.group(
+        match.lastindex)
+    if number is None:
+        value = literals[int(literal_index)][1:-1].replace("''", "'")
+        if not re.fullmatch(r"-?\d+", value.strip()):
+            raise UnsupportedSql(f"INTERVAL value is not an integer: {value}")
+        number = value.strip()
+    name, factor = _UNIT_MODIFIERS[unit.upper()]
+    amount = int(number) * factor * (-1 if sign == '-' else 1)
+    return f"'{amount:+d} {name}'"
+
+
+def _matching_paren(code: str, open_index: int) -> int:
+    depth = 0
+    for index in range(open_index, len(code)):
+        if code[index] == '(':
+            depth += 1
+        elif code[index] == ')':
+            depth -= 1
+            if depth == 0:
+                return index
+    raise UnsupportedSql("Unbalanced parentheses.")
+
+
+def _split_arguments(arguments: str) -> List[str]:
+    parts, depth, start = [], 0, 0
+    for index, ch in enumerate(arguments):
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+        elif ch == ',' and depth == 0:
+            parts.append(arguments[start:index].strip())
+            start = index + 1
+    parts.append(arguments[start:].strip())
+    return parts
+
+
+def _operand_start(code: str, end: int) -> int:
+    """
+    Vị trí bắt đầu của toán hạng kết thúc ngay trước `end` (identifier, số, hoặc lời gọi hàm/ngoặc).
+    """
+    index = end
+    while index > 0 and code[index - 1].isspace():
+        index -= 1
+    if index > 0 and code[index - 1] == ')':
+        depth = 0
+        while index > 0:
+            index -= 1
+            if code[index] == ')':
+                depth += 1
+            elif code[index] == '(':
+                depth -= 1
+                if depth == 0:
+                    break
+        if depth != 0:
+            raise UnsupportedSql("Unbalanced parentheses.")
+    while index > 0 and (code[index - 1].isalnum() or code[index - 1] in '_."\x00'):
+        index -= 1
+    return index
+
+
+def _translate_calls(code: str, literals: List[str]) -> str:
+    output, position = [], 0
+    while True:
+        match = _FUNCTION_RE.search(code, position)
+        if match is None:
+            output.append(code[position:])
+            return "".join(output)
+
+        close = _matching_paren(code, match.end() - 1)
+        arguments = [_translate_calls(argument, literals)
+                     for argument in _split_arguments(code[match.end():close])]
+        name = match.group(1).upper()
+
+        if name in _STRFTIME_PARTS:
+            replacement = f"CAST(strftime('{_STRFTIME_PARTS[name]}', {arguments[0]}) AS INTEGER)"
+        elif name == 'QUARTER':
+            replacement = f"((CAST(strftime('%m', {arguments[0]}) AS INTEGER) + 2) / 3)"
+        elif name == 'DATEDIFF':
+            replacement = f"CAST(julianday(date({arguments[0]})) - julianday(date({arguments[1]})) AS INTEGER)"
+        elif name in ('DATE_ADD', 'DATE_SUB'):
+            interval = _INTERVAL_RE.fullmatch(arguments[1]) if len(arguments) == 2 else None
+            if interval is None:
+                raise UnsupportedSql(f"Unsupported {name} arguments.")
+            sign = '-' if name == 'DATE_SUB' else '+'
+            replacement = f"datetime({arguments[0]}, {_interval_modifier(interval, literals, sign)})"
+        else:
+            replacement = "(" + " || ".join(arguments) + ")"
+
+        output.append(code[position:match.start()])
+        output.append(replacement)
+        position = close + 1
+
+
+def _translate_signed_intervals(code: str, literals: List[str]) -> str:
+    while True:
+        match = _SIGNED_INTERVAL_RE.search(code)
+        if match is None:
+            return code
+        start = _operand_start(code, match.start())
+        operand = code[start:match.start()].strip()
+        if not operand:
+            raise UnsupportedSql("INTERVAL without a left operand.")
+        modifier = _interval_modifier(match, literals, match.group(1))
+        code = f"{code[:start]}datetime({operand}, {modifier}){code[match.end():]}"
+
+
+def translate_mysql_to_sqlite(sql: str) -> str:
+    """
+    Dịch câu SELECT MySQL (dạng SqlValidator chấp nhận và prompt khuyến khích) sang SQLite:
+    NOW()/CURDATE(), `x ± INTERVAL 'n' UNIT`, DATE_ADD/DATE_SUB, YEAR/MONTH/DAY/QUARTER/HOUR/MINUTE,
+    DATEDIFF, CONCAT, `LIMIT a, b`, identifier `...` và chuỗi có escape backslash.
+    Ném UnsupportedSql với cấu trúc không dịch được hoặc có ngữ nghĩa khác (vd. phép chia, DATE_FORMAT).
+    """
+    literals: List[str] = []
+
+    def stash(match: re.Match) -> str:
+        literals.append(match.group(0))
+        return f"\x00{len(literals) - 1}\x00"
+
+    code = _LITERAL_RE.sub(stash, sql.strip().rstrip(';'))
+    unsupported = _UNSUPPORTED_RE.search(code)
+    if unsupported:
+        raise UnsupportedSql(f"Unsupported construct: {unsupported.group(0)}")
+
+    code = _NOW_RE.sub(_NOW_SQL, code)
+    code = _CURDATE_RE.sub(_CURDATE_SQL, code)
+    code = _translate_calls(code, literals)
+    code = _translate_signed_intervals(code, literals)
+    code = _LIMIT_OFFSET_RE.sub(r"LIMIT \2 OFFSET \1", code)
+    if re.search(r"\bINTERVAL\b", code, re.IGNORECASE):
+        raise UnsupportedSql("Unsupported INTERVAL expression.")
+
+    return _PLACEHOLDER_RE.sub(lambda m: _sqlite_literal(literals[int(m.group(1))]), code)
+
+
+# ----------------------------------------------------------------------------------------------
+# Hàm/collation SQLite mô phỏng collation utf8mb4_unicode_ci của MySQL (không phân biệt hoa thường, dấu)
+# ----------------------------------------------------------------------------------------------
+
+def _fold(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    return fold_diacritics(str(value)).casefold()
+
+
+@functools.lru_cache(maxsize=1024)
+def _like_regex(pattern: str, escape: Optional[str]) -> re.Pattern:
+    parts, index = [], 0
+    while index < len(pattern):
+        ch = pattern[index]
+        if escape and ch == escape and index + 1 < len(pattern):
+            parts.append(re.escape(pattern[index + 1]))
+            index += 2
+            continue
+        parts.append('.*' if ch == '%' else '.' if ch == '_' else re.escape(ch))
+        index += 1
+    return re.compile("".join(parts), re.DOTALL)
+
+
+def _sqlite_like(pattern: Any, value: Any, escape: Optional[str] = '\\') -> Optional[int]:
+    if pattern is None or value is None:
+        return None
+    return 1 if _like_regex(_fold(pattern), escape).fullmatch(_fold(value)) else 0
+
+
+def _mysql_ci_collation(left: str, right: str) -> int:
+    left, right = _fold(left), _fold(right)
+    return (left > right) - (left < right)
+
+
+def _configure_connection(connection: sqlite3.Connection) -> None:
+    connection.create_function('like', 2, _sqlite_like, deterministic=True)
+    connection.create_function('like', 3, _sqlite_like, deterministic=True)
+    connection.create_function('lower', 1, lambda v: v.lower() if isinstance(v, str) else v, deterministic=True)
+    connection.create_function('upper', 1, lambda v: v.upper() if isinstance(v, str) else v, deterministic=True)
+    connection.create_collation('MYSQL_CI', _mysql_ci_collation)
+
+
+sqlite3.register_converter('REPLICA_DATETIME', lambda raw: datetime.datetime.fromisoformat(raw.decode()))
+sqlite3.register_converter('REPLICA_DATE', lambda raw: datetime.date.fromisoformat(raw.decode()))
+
+
+def _column_decl(column_type: Any) -> str:
+    if isinstance(column_type, sqltypes.DateTime):
+        return 'REPLICA_DATETIME'
+    if isinstance(column_type, sqltypes.Date):
+        return 'REPLICA_DATE'
+    if isinstance(column_type, (sqltypes.Integer, sqltypes.Boolean)):
+        return 'INTEGER'
+    if isinstance(column_type, (sqltypes.Numeric, sqltypes.Float)):
+        return 'REAL'
+    return 'TEXT COLLATE MYSQL_CI'
+
+
+def _to_sqlite(value: Any) -> Any:
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.time, datetime.timedelta)):
+        return str(value)
+    return value
+
+
+# ----------------------------------------------------------------------------------------------
+# Bản sao cục bộ
+# ----------------------------------------------------------------------------------------------
+
+class _ViewState:
+    __slots__ = ('name', 'columns', 'key', 'timestamp_column', 'high_water', 'row_hashes')
+
+    def __init__(self, name: str, columns: List[str], key: str, timestamp_column: Optional[str]):
+        self.name = name
+        self.columns = columns
+        self.key = key
+        self.timestamp_column = timestamp_column
+        self.high_water: Any = None
+        self.row_hashes: Dict[Any, int] = {}
+
+
+class LocalReplica:
+    """
+    Bản sao trong process (SQLite in-memory) của các view trong ALLOWED_TABLES, không gồm BLACKLISTED_COLUMNS,
+    để truy vấn của chatbot chạy tại chỗ thay vì đi qua mạng tới MySQL.
+
+    - Làm mới định kỳ, tăng dần: view có cột `updated_at` chỉ tải các hàng có updated_at >= mốc lần trước
+      (cộng danh sách khóa để phát hiện hàng bị xóa); view khác so checksum từng hàng và chỉ ghi hàng thay đổi.
+      Cứ `full_sync_every` lần làm mới thì mọi view được so checksum toàn bộ.
+      Khóa của view là cột đầu tiên (event_id, organization_id, ...), theo quy ước của db_context.
+    - `execute(sql)` dịch SQL MySQL sang SQLite (translate_mysql_to_sqlite); trả về None nếu bản sao chưa sẵn sàng,
+      SQL không dịch được hoặc SQLite báo lỗi, khi đó caller chạy trên MySQL.
+    - LIKE, =, ORDER BY trên cột chữ không phân biệt hoa thường và dấu như collation *_unicode_ci của MySQL.
+    - Một kết nối SQLite dùng chung, mọi thao tác được tuần tự hóa bằng lock (truy vấn trên bản sao nhỏ mất < 1 ms).
+    """
+
+    def __init__(self, source_engine, views: Iterable[str] = ALLOWED_TABLES,
+                 blacklisted_columns: Iterable[str] = BLACKLISTED_COLUMNS, refresh_interval: float = 60.0,
+                 full_sync_every: int = 10, timestamp_column: str = 'updated_at',
+                 on_change: Optional[Callable[[str], Any]] = None):
+        self.source_engine = source_engine
+        self.views = sorted(views)
+        self.blacklisted_columns = {column.lower() for column in blacklisted_columns}
+        self.refresh_interval = refresh_interval
+        self.full_sync_every = full_sync_every
+        self.timestamp_column = timestamp_column
+        self.on_change = on_change
+
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._connection = self._connect()
+        self._states: Dict[str, _ViewState] = {}
+        self._refresh_count = 0
+        self._ready = False
+        self.last_refresh_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+        self._stop_event = threading.Event()
+        self._refresh_thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls, source_engine, on_change: Optional[Callable[[str], Any]] = None) -> Optional["LocalReplica"]:
+        """
+        Trả về None nếu DB_REPLICA_ENABLED không bật. DB_REPLICA_REFRESH_INTERVAL (giây, mặc định 60),
+        DB_REPLICA_FULL_SYNC_EVERY (mặc định 10 lần làm mới thì so checksum toàn bộ).
+        """
+        if os.getenv("DB_REPLICA_ENABLED", "false").lower() not in ("1", "true", "yes"):
+            return None
+        return cls(
+            source_engine,
+            refresh_interval=float(os.getenv("DB_REPLICA_REFRESH_INTERVAL", "60")),
+            full_sync_every=int(os.getenv("DB_REPLICA_FULL_SYNC_EVERY", "10")),
+            on_change=on_change,
+        )
+
+    @staticmethod
+    def _connect() -> sqlite3.Connection:
+        connection = sqlite3.connect(':memory:', check_same_thread=False, isolation_level=None,
+                                     detect_types=sqlite3.PARSE_DECLTYPES)
+        _configure_connection(connection)
+        return connection
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def _is_blacklisted(self, view: str, column: str) -> bool:
+        base = view[:-len('_view')] if view.endswith('_view') else view
+        column = column.lower()
+        return column in self.blacklisted_columns or f"{base}.{column}" in self.blacklisted_columns
+
+    def _create_view_table(self, inspector, view: str) -> _ViewState:
+        columns = [column for column in inspector.get_columns(view) if not self._is_blacklisted(view, column['name'])]
+        if not columns:
+            raise ValueError(f"View '{view}' has no replicable columns.")
+
+        names = [column['name'] for column in columns]
+        key = names[0]
+        declarations = ", ".join(f'"{column["name"]}" {_column_decl(column["type"])}' for column in columns)
+        timestamp_column = self.timestamp_column if self.timestamp_column in names else None
+
+        with self._lock:
+            self._connection.execute(f'DROP TABLE IF EXISTS "{view}"')
+            self._connection.execute(f'CREATE TABLE "{view}" ({declarations})')
+            self._connection.execute(f'CREATE UNIQUE INDEX "{view}__key" ON "{view}" ("{key}")')
+            for name in names[1:]:
+                if name.endswith('_id') or name == timestamp_column:
+                    self._connection.execute(f'CREATE INDEX "{view}__{name}" ON "{view}" ("{name}")')
+        return _ViewState(view, names, key, timestamp_column)
+
+    def _fetch(self, connection, state: _ViewState, incremental: bool) -> Tuple[List[tuple], Optional[set]]:
+        """
+        Trả về (các hàng cần so với bản sao, tập khóa hiện có trên MySQL hoặc None nếu đã tải toàn bộ).
+        """
+        select = ", ".join(f"`{column}`" for column in state.columns)
+        if incremental:
+            rows = connection.execute(
+                text(f"SELECT {select} FROM `{state.name}` WHERE `{state.timestamp_column}` >= :high_water"),
+                {'high_water': state.high_water}).fetchall()
+            keys = {row[0] for row in connection.execute(text(f"SELECT `{state.key}` FROM `{state.name}`"))}
+            return [tuple(row) for row in rows], keys
+        return [tuple(row) for row in connection.execute(text(f"SELECT {select} FROM `{state.name}`"))], None
+
+    def _apply(self, state: _ViewState, rows: List[tuple], keys: Optional[set]) -> int:
+        changed = []
+        seen = set()
+        for row in rows:
+            converted = tuple(_to_sqlite(value) for value in row)
+            seen.add(converted[0])
+            row_hash = hash(converted)
+            if state.row_hashes.get(converted[0]) != row_hash:
+                state.row_hashes[converted[0]] = row_hash
+                changed.append(converted)
+
+        live_keys = {_to_sqlite(key) for key in keys} if keys is not None else seen
+        deleted = [key for key in state.row_hashes if key not in live_keys]
+        for key in deleted:
+            del state.row_hashes[key]
+
+        if state.timestamp_column is not None:
+            index = state.columns.index(state.timestamp_column)
+            stamps = [row[index] for row in rows if row[index] is not None]
+            if stamps:
+                state.high_water = max([state.high_water, *stamps]) if state.high_water is not None else max(stamps)
+
+        if not changed and not deleted:
+            return 0
+
+        placeholders = ", ".join("?" for _ in state.columns)
+        columns = ", ".join(f'"{column}"' for column in state.columns)
+        self._connection.executemany(f'INSERT OR REPLACE INTO "{state.name}" ({columns}) VALUES ({placeholders})',
+                                     changed)
+        self._connection.executemany(f'DELETE FROM "{state.name}" WHERE "{state.key}" = ?',
+                                     [(key,) for key in deleted])
+        return len(changed) + len(deleted)
+
+    def refresh(self) -> Dict[str, int]:
+        """
+        Đồng bộ bản sao với MySQL; trả về số hàng thay đổi (ghi + xóa) theo view.
+        Dữ liệu được tải ngoài lock, rồi ghi trong một transaction để truy vấn luôn thấy snapshot nhất quán.
+        """
+        if self.source_engine is None:
+            return {}
+
+        with self._refresh_lock:
+            started = time.perf_counter()
+            full_sync = self._refresh_count % max(self.full_sync_every, 1) == 0
+            fetched = {}
+            try:
+                with self.source_engine.connect() as connection:
+                    inspector = None
+                    for view in self.views:
+                        state = self._states.get(view)
+                        if state is None:
+                            inspector = inspector or inspect(connection)
+                            state = self._states[view] = self._create_view_table(inspector, view)
+                        incremental = (not full_sync and state.timestamp_column is not None
+                                       and state.high_water is not None)
+                        fetched[view] = self._fetch(connection, state, incremental)
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Error refreshing local replica: {e}")
+                traceback.print_exc()
+                metrics.inc('replica_refresh_total', labels={'result': 'error'})
+                return {}
+
+            changes = {}
+            with self._lock:
+                self._connection.execute("BEGIN")
+                try:
+                    for view, (rows, keys) in fetched.items():
+                        changes[view] = self._apply(self._states[view], rows, keys)
+                    self._connection.execute("COMMIT")
+                except BaseException:
+                    # Trạng thái đồng bộ đã lệch với bảng: lần làm mới sau dựng lại bản sao từ đầu.
+                    self._connection.execute("ROLLBACK")
+                    self._states.clear()
+                    self._refresh_count = 0
+                    self._ready = False
+                    raise
+                self._ready = True
+
+            self._refresh_count += 1
+            self.last_refresh_at = time.time()
+            self.last_error = None
+            elapsed = time.perf_counter() - started
+            metrics.inc('replica_refresh_total', labels={'result': 'full' if full_sync else 'incremental'})
+            metrics.observe('replica_refresh_seconds', elapsed)
+
+        for view, count in changes.items():
+            if count:
+                metrics.inc('replica_rows_changed_total', amount=count, labels={'view': view})
+                if self.on_change is not None:
+                    self.on_change(view)
+        print(f"Local replica {'full' if full_sync else 'incremental'} refresh in {elapsed * 1000:.1f} ms: "
+              f"{changes}")
+        return changes
+
+    def execute(self, sql: str) -> Optional[ResultSet]:
+        """
+        Chạy SQL trên bản sao; None nghĩa là caller phải chạy trên MySQL.
+        """
+        if not self._ready:
+            metrics.inc('replica_queries_total', labels={'result': 'not_ready'})
+            return None
+        try:
+            translated = translate_mysql_to_sqlite(sql)
+        except UnsupportedSql as e:
+            print(f"Local replica fallback ({e}): {sql}")
+            metrics.inc('replica_queries_total', labels={'result': 'unsupported'})
+            return None
+
+        try:
+            with self._lock:
+                cursor = self._connection.execute(translated)
+                rows = ResultSet((column[0] for column in cursor.description or ()), cursor.fetchall())
+        except (sqlite3.Error, ValueError) as e:
+            print(f"Local replica fallback ({e}): {translated}")
+            metrics.inc('replica_queries_total', labels={'result': 'error'})
+            return None
+
+        metrics.inc('replica_queries_total', labels={'result': 'local'})
+        return rows
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            row_counts = {view: len(state.row_hashes) for view, state in self._states.items()}
+        return {
+            'ready': self._ready,
+            'views': row_counts,
+            'refresh_count': self._refresh_count,
+            'refresh_interval': self.refresh_interval,
+            'last_refresh_at': self.last_refresh_at,
+            'last_error': self.last_error,
+        }
+
+    def reset_after_fork(self) -> None:
+        """
+        Gọi trong process con sau fork: chép snapshot thừa hưởng sang kết nối SQLite mới của process này
+        (bản in-memory không có file lock nên sao chép an toàn) thay vì tải lại từ MySQL.
+        """
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        connection = self._connect()
+        self._connection.backup(connection)
+        self._connection = connection
+
+    def start_background_refresh(self) -> None:
+        if self.refresh_interval <= 0:
+            print("Local replica background refresh disabled (refresh_interval <= 0).")
+            return
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._refresh_thread = threading.Thread(target=self._refresh_loop, name="local-replica-refresh", daemon=True)
+        self._refresh_thread.start()
+        print(f"Local replica background refresh started (every {self.refresh_interval}s).")
+
+    def stop_background_refresh(self) -> None:
+        self._stop_event.set()
+        if self._refresh_thread is not None:
+            self._refresh_thread.join(timeout=5)
+            self._refresh_thread = None
+
+    def _refresh_loop(self) -> None:
+        if self._ready:
+            self._stop_event.wait(self.refresh_interval)
+        while not self._stop_event.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error refreshing local replica in background: {e}")
+                traceback.print_exc()
+            self._stop_event.wait(self.refresh_interval)
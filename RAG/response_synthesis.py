@@ -0,0 +1,142 @@
+import os
+import re
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from .intent_router import LIST_INTENTS
+from .metrics import metrics
+from .text_utils import normalize_question
+
+
+SHAPE_EMPTY = 'empty'
+SHAPE_SCALAR = 'scalar'
+SHAPE_EVENT_LIST = 'event_list'
+
+EMPTY_TEMPLATE = "Xin lỗi, tôi không tìm thấy kết quả nào phù hợp với câu hỏi của bạn."
+COUNT_TEMPLATE = "Có tổng cộng {value} {noun} phù hợp với câu hỏi của bạn."
+SCALAR_TEMPLATE = "Kết quả cho câu hỏi của bạn là: {value}."
+EVENT_LIST_TEMPLATE = "Có {count} sự kiện phù hợp với câu hỏi của bạn:\n{items}"
+
+_COUNT_COLUMN_RE = re.compile(r"(^|_)(count|total|so_luong|tong)(_|$)|^count\(", re.IGNORECASE)
+_EVENT_NAME_KEYS = ('name', 'event_name')
+# Cột được phép trong kết quả dùng template danh sách: cột sự kiện chuẩn mà template bỏ qua một cách hợp lý.
+# Có cột khác (vd. organization_name) nghĩa là câu hỏi cần thông tin đó -> để LLM trả lời.
+_EVENT_LIST_COLUMNS = frozenset({'event_id', 'name', 'event_name', 'description', 'event_description', 'location',
+                                 'start_date', 'end_date', 'quantity_now', 'max_quantity', 'image', 'event_image'})
+# Câu hỏi hỏi về một thuộc tính (thời gian, số chỗ, mô tả, người tổ chức...) mà template danh sách không nêu.
+_ATTRIBUTE_QUESTION_RE = re.compile(
+    r"\b(?:khi nao|luc nao|bao gio|ngay nao|may gio|thoi gian|bat dau|ket thuc|bao nhieu|may cho|may nguoi|"
+    r"con cho|so cho|cho trong|so luong|dang ky|dang ki|mo ta|noi dung|gioi thieu|chi tiet|thong tin|ai|"
+    r"nha to chuc|to chuc boi|don vi|ket qua|hinh anh)\b")
+# Danh từ dùng trong COUNT_TEMPLATE, chọn theo tên cột (vd. total_events -> "sự kiện").
+_COUNT_NOUNS = (('volunteer', 'tình nguyện viên'), ('organization', 'tổ chức'), ('event', 'sự kiện'),
+                ('result', 'kết quả'))
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    return os.getenv(name, "true" if default else "false").lower() in ("1", "true", "yes")
+
+
+def format_scalar(value: Any) -> str:
+    if isinstance(value, Decimal) and value == value.to_integral_value():
+        value = int(value)
+    if isinstance(value, bool):
+        return "có" if value else "không"
+    if isinstance(value, int):
+        return f"{value:,}".replace(',', '.')
+    if isinstance(value, datetime):
+        return value.strftime('%H:%M %d/%m/%Y')
+    if isinstance(value, date):
+        return value.strftime('%d/%m/%Y')
+    return str(value)
+
+
+class ResponseSynthesizer:
+    """
+    Đường tắt tất định cho bước LLM thứ hai: với các dạng kết quả đơn giản, câu trả lời
+    tiếng Việt được dựng từ template thay vì gọi Gemini.
+
+    - `empty`: truy vấn không trả về hàng nào.
+    - `scalar`: đúng một hàng một cột (vd. COUNT(*)).
+    - `event_list`: danh sách sự kiện ngắn (<= `max_list_items`), chỉ liệt kê tên và địa điểm; chỉ dùng cho
+      câu hỏi liệt kê (intent danh sách của IntentRouter, hoặc câu hỏi không hỏi thuộc tính nào)
+      và khi kết quả chỉ gồm các cột sự kiện chuẩn.
+
+    Mỗi lần dùng template tăng counter llm_calls_avoided_total{shape=...}.
+    """
+
+    def __init__(self, empty: bool = True, scalar: bool = True, event_list: bool = True, max_list_items: int = 5):
+        self.enabled = {SHAPE_EMPTY: empty, SHAPE_SCALAR: scalar, SHAPE_EVENT_LIST: event_list}
+        self.max_list_items = max_list_items
+
+    @classmethod
+    def from_env(cls) -> "ResponseSynthesizer":
+        """
+        Đọc cấu hình từ biến môi trường:
+        FAST_PATH_EMPTY, FAST_PATH_SCALAR, FAST_PATH_EVENT_LIST (true/false, mặc định true),
+        FAST_PATH_EVENT_LIST_MAX (số sự kiện tối đa được liệt kê bằng template, mặc định 5).
+        """
+        return cls(
+            empty=_env_flag("FAST_PATH_EMPTY", True),
+            scalar=_env_flag("FAST_PATH_SCALAR", True),
+            event_list=_env_flag("FAST_PATH_EVENT_LIST", True),
+            max_list_items=int(os.getenv("FAST_PATH_EVENT_LIST_MAX", "5")),
+        )
+
+    def synthesize(self, raw_results_list: List[Dict[str, Any]], result_info: Dict[str, Any],
+                   question: str = "") -> Optional[str]:
+        """
+        Trả về câu trả lời dựng từ template nếu kết quả thuộc một dạng đã bật, ngược lại None
+        (khi đó pipeline gọi LLM như bình thường).
+        """
+        total_count = result_info.get('total_count', len(raw_results_list))
+        complete = result_info.get('total_count_exact', True) and total_count == len(raw_results_list)
+
+        shape, text = None, None
+        if not raw_results_list and total_count == 0:
+            shape, text = SHAPE_EMPTY, EMPTY_TEMPLATE
+        elif complete and len(raw_results_list) == 1 and len(raw_results_list[0]) == 1:
+            shape, text = SHAPE_SCALAR, self._render_scalar(raw_results_list[0])
+        elif (complete and len(raw_results_list) <= self.max_list_items
+              and self._is_listing_question(question, result_info.get('intent'))):
+            shape, text = SHAPE_EVENT_LIST, self._render_event_list(raw_results_list)
+
+        if text is None or not self.enabled[shape]:
+            return None
+
+        metrics.inc('llm_calls_avoided_total', labels={'shape': shape})
+        return text
+
+    @staticmethod
+    def _render_scalar(row: Dict[str, Any]) -> Optional[str]:
+        (column, value), = row.items()
+        if value is None:
+            return None
+        if isinstance(value, (int, Decimal)) and not isinstance(value, bool) and _COUNT_COLUMN_RE.search(column):
+            if value == 0:
+                return EMPTY_TEMPLATE
+            noun = next((noun for key, noun in _COUNT_NOUNS if key in column.lower()), 'kết quả')
+            return COUNT_TEMPLATE.format(value=format_scalar(value), noun=noun)
+        return SCALAR_TEMPLATE.format(value=format_scalar(value))
+
+    @staticmethod
+    def _is_listing_question(question: str, intent: Optional[str]) -> bool:
+        if intent is not None:
+            return intent in LIST_INTENTS
+        return _ATTRIBUTE_QUESTION_RE.search(normalize_question(question)) is None
+
+    @staticmethod
+    def _render_event_list(rows: List[Dict[str, Any]]) -> Optional[str]:
+        if not _EVENT_LIST_COLUMNS.issuperset(rows[0].keys()):
+            return None
+        items = []
+        for row in rows:
+            if 'event_id' not in row or 'result_id' in row:
+                return None
+            name = next((row[key] for key in _EVENT_NAME_KEYS if row.get(key)), None)
+            if name is None:
+                return None
+            location = row.get('location')
+            items.append(f"- {name} ({location})" if location else f"- {name}")
+        return EVENT_LIST_TEMPLATE.format(count=len(items), items="\n".join(items))
@@ -0,0 +1,198 @@
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from .constants import ALLOWED_TABLES
+from .result_set import ResultSet
+
+
+_LITERAL_OR_SPACE_RE = re.compile(r"('(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\")|\s+")
+_NOW_RE = re.compile(r"\b(now|current_timestamp|current_date|curdate|sysdate)\b\s*(\(\s*\))?", re.IGNORECASE)
+_VIEW_RE = re.compile(r"\b(" + "|".join(sorted(ALLOWED_TABLES)) + r")\b", re.IGNORECASE)
+
+
+def canonicalize_sql(sql: str) -> str:
+    """
+    Chuẩn hóa SQL làm khóa cache: gộp khoảng trắng (giữ nguyên chuỗi literal), bỏ dấu ';' cuối.
+    """
+    def _replace(match):
+        return match.group(1) if match.group(1) is not None else " "
+
+    return _LITERAL_OR_SPACE_RE.sub(_replace, sql).strip().rstrip(';').strip()
+
+
+def referenced_views(sql: str) -> FrozenSet[str]:
+    """
+    Các view trong ALLOWED_TABLES xuất hiện trong câu SQL.
+    """
+    return frozenset(match.lower() for match in _VIEW_RE.findall(sql))
+
+
+def uses_current_time(sql: str) -> bool:
+    return _NOW_RE.search(sql) is not None
+
+
+def estimate_rows_size(rows: List[Dict[str, Any]]) -> int:
+    """
+    Ước lượng số byte bộ nhớ của list-of-dict kết quả (đủ chính xác để giới hạn ngân sách).
+    """
+    if isinstance(rows, ResultSet):
+        return rows.estimate_size()
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row)
+        for value in row.values():
+            size += sys.getsizeof(value)
+    return size
+
+
+class ResultCache:
+    """
+    Cache ngắn hạn kết quả của SQL đã xác thực (opt-in).
+
+    - Khóa: SQL đã chuẩn hóa bằng `canonicalize_sql`.
+    - TTL theo view (`view_ttls`), mục chạm nhiều view lấy TTL nhỏ nhất.
+    - SQL có NOW()/CURRENT_TIMESTAMP dùng `now_ttl` riêng (0 = không cache).
+    - Tổng dung lượng ước lượng không vượt `max_bytes`, loại bỏ theo LRU.
+    - `invalidate_view('events_view')` xóa mọi mục có chạm view đó.
+    """
+
+    def __init__(self, default_ttl: float = 60.0, view_ttls: Optional[Dict[str, float]] = None,
+                 now_ttl: float = 10.0, max_bytes: int = 32 * 1024 * 1024):
+        self.default_ttl = default_ttl
+        self.view_ttls = {k.lower(): v for k, v in (view_ttls or {}).items()}
+        self.now_ttl = now_ttl
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[List[Dict[str, Any]], int, float, FrozenSet[str], int]]" = OrderedDict()
+        self._total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls) -> "ResultCache":
+        """
+        Đọc cấu hình từ biến môi trường:
+        RESULT_CACHE_TTL, RESULT_CACHE_NOW_TTL, RESULT_CACHE_MAX_BYTES,
+        RESULT_CACHE_VIEW_TTLS (dạng "events_view=30,results_view=300").
+        """
+        view_ttls = {}
+        for part in os.getenv("RESULT_CACHE_VIEW_TTLS", "").split(','):
+            if '=' not in part:
+                continue
+            view, ttl = part.split('=', 1)
+            try:
+                view_ttls[view.strip().lower()] = float(ttl)
+            except ValueError:
+                print(f"Warning: Invalid RESULT_CACHE_VIEW_TTLS entry ignored: {part}")
+
+        return cls(
+            default_ttl=float(os.getenv("RESULT_CACHE_TTL", "60")),
+            view_ttls=view_ttls,
+            now_ttl=float(os.getenv("RESULT_CACHE_NOW_TTL", "10")),
+            max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+        )
+
+    def ttl_for(self, sql: str, views: FrozenSet[str]) -> float:
+        ttls = [self.view_ttls.get(view, self.default_ttl) for view in views] or [self.default_ttl]
+        ttl = min(ttls)
+        if uses_current_time(sql):
+            ttl = min(ttl, self.now_ttl)
+        return ttl
+
+    def get(self, sql: str, min_rows: Optional[int] = None) -> Optional[Tuple[List[Dict[str, Any]], int]]:
+        """
+        Trả về (rows, total_count) đã cache, hoặc None.
+        Nếu `min_rows` được chỉ định, chỉ coi là hit khi bản cache giữ đủ số hàng cần thiết.
+        """
+        key = canonicalize_sql(sql)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            rows, total_count, expires_at, _, _ = entry
+            if now >= expires_at:
+                self._remove_locked(key)
+                self.misses += 1
+                return None
+
+            if min_rows is not None and len(rows) < min(min_rows, total_count):
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return rows[:], total_count
+
+    def put(self, sql: str, rows: List[Dict[str, Any]], total_count: Optional[int] = None) -> None:
+        """
+        Lưu kết quả. `total_count` là tổng số hàng của truy vấn khi `rows` chỉ là phần đầu.
+        """
+        if total_count is None:
+            total_count = len(rows)
+        key = canonicalize_sql(sql)
+        views = referenced_views(key)
+        ttl = self.ttl_for(key, views)
+        if ttl <= 0:
+            return
+
+        size = estimate_rows_size(rows)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove_locked(key)
+            self._entries[key] = (rows[:], total_count, time.monotonic() + ttl, views, size)
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes and self._entries:
+                oldest_key = next(iter(self._entries))
+                self._remove_locked(oldest_key)
+                self.evictions += 1
+
+    def invalidate_view(self, view_name: str) -> int:
+        """
+        Xóa mọi mục cache có tham chiếu tới `view_name`. Trả về số mục đã xóa.
+        """
+        view_name = view_name.lower()
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if view_name in entry[3]]
+            for key in keys:
+                self._remove_locked(key)
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def _remove_locked(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[4]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': (self.hits / total) if total else 0.0,
+            }
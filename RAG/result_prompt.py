@@ -0,0 +1,134 @@
+import os
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Sequence
+
+from .result_set import ResultSet
+
+
+# Cột ảnh/URL: prompt trả lời không dùng tới, luôn bỏ (trừ khi là cột duy nhất).
+OMIT_COLUMNS = frozenset({'image', 'event_image', 'images', 'result_image'})
+# Cột văn bản dài: bỏ khi có nhiều hàng (prompt yêu cầu không liệt kê mô tả), cắt ngắn khi chỉ có một hàng.
+LONG_TEXT_COLUMNS = frozenset({'description', 'event_description', 'content', 'result_description'})
+
+# Ước lượng thô cho tiếng Việt có dấu với tokenizer của Gemini (dùng khi cấu hình ngân sách theo token).
+CHARS_PER_TOKEN = 3
+
+EMPTY_RESULTS_TEXT = "Không có kết quả từ database."
+
+
+class SerializedResults(NamedTuple):
+    text: str
+    rows: int
+    total_count: int
+    columns: List[str]
+    omitted_columns: List[str]
+    clipped_cells: int
+
+
+def _env_columns(name: str, default: FrozenSet[str]) -> FrozenSet[str]:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return frozenset(column.strip() for column in value.split(',') if column.strip())
+
+
+class ResultPromptSerializer:
+    """
+    Chuyển kết quả truy vấn thành bảng cho prompt trả lời (LLM lần 2) trong một ngân sách ký tự:
+
+    - bỏ cột ảnh (OMIT_COLUMNS); bỏ cột văn bản dài (LONG_TEXT_COLUMNS) khi có nhiều hàng,
+      còn khi chỉ có một hàng thì cắt chúng ở `max_detail_chars`;
+    - cắt mỗi ô ở `max_cell_chars`, gộp xuống dòng thành khoảng trắng;
+    - lấy các hàng theo thứ tự của câu SQL (tối đa `max_rows`) cho tới khi hết `max_chars`,
+      số hàng còn lại được ghi ở dòng cuối.
+
+    Bảng không căn độ rộng cột: khoảng trắng đệm chỉ tốn token mà LLM không cần.
+    """
+
+    def __init__(self, max_chars: int = 2500, max_rows: int = 15, max_cell_chars: int = 60,
+                 max_detail_chars: int = 600, omit_columns: FrozenSet[str] = OMIT_COLUMNS,
+                 long_text_columns: FrozenSet[str] = LONG_TEXT_COLUMNS):
+        self.max_chars = max_chars
+        self.max_rows = max_rows
+        self.max_cell_chars = max_cell_chars
+        self.max_detail_chars = max_detail_chars
+        self.omit_columns = omit_columns
+        self.long_text_columns = long_text_columns
+
+    @classmethod
+    def from_env(cls, max_rows: int = 15) -> "ResultPromptSerializer":
+        """
+        RESULT_PROMPT_MAX_CHARS (mặc định 2500) hoặc RESULT_PROMPT_MAX_TOKENS (ưu tiên nếu đặt,
+        quy đổi CHARS_PER_TOKEN ký tự/token), RESULT_PROMPT_MAX_CELL_CHARS (60),
+        RESULT_PROMPT_MAX_DETAIL_CHARS (600), RESULT_PROMPT_OMIT_COLUMNS và RESULT_PROMPT_LONG_TEXT_COLUMNS
+        (danh sách cột phân cách bằng dấu phẩy). `max_rows` là RESULT_ROWS_FOR_LLM của service.
+        """
+        max_tokens = os.getenv("RESULT_PROMPT_MAX_TOKENS")
+        if max_tokens:
+            max_chars = int(max_tokens) * CHARS_PER_TOKEN
+        else:
+            max_chars = int(os.getenv("RESULT_PROMPT_MAX_CHARS", "2500"))
+        return cls(
+            max_chars=max_chars,
+            max_rows=max_rows,
+            max_cell_chars=int(os.getenv("RESULT_PROMPT_MAX_CELL_CHARS", "60")),
+            max_detail_chars=int(os.getenv("RESULT_PROMPT_MAX_DETAIL_CHARS", "600")),
+            omit_columns=_env_columns("RESULT_PROMPT_OMIT_COLUMNS", OMIT_COLUMNS),
+            long_text_columns=_env_columns("RESULT_PROMPT_LONG_TEXT_COLUMNS", LONG_TEXT_COLUMNS),
+        )
+
+    def _select_columns(self, columns: List[str], row_count: int) -> List[str]:
+        omitted = set(self.omit_columns)
+        if row_count > 1:
+            omitted |= self.long_text_columns
+        kept = [column for column in columns if column not in omitted]
+        if kept:
+            return kept
+        return [column for column in columns if column not in self.omit_columns] or columns
+
+    def serialize(self, results: Sequence[Dict[str, Any]], total_count: Optional[int] = None) -> SerializedResults:
+        result_set = ResultSet.from_dicts(results)
+        if total_count is None:
+            total_count = len(result_set)
+        if not result_set:
+            return SerializedResults(EMPTY_RESULTS_TEXT, 0, total_count, [], [], 0)
+
+        candidates = result_set.rows[:self.max_rows]
+        all_columns = list(result_set.column_index)
+        columns = self._select_columns(all_columns, len(candidates))
+        positions = [result_set.column_index[column] for column in columns]
+        limits = [self.max_detail_chars if len(candidates) == 1 and column in self.long_text_columns
+                  else self.max_cell_chars for column in columns]
+
+        lines = ["Results:\n", "| " + " | ".join(columns) + " |\n", "|" + "|".join(["---"] * len(columns)) + "|\n"]
+        used = sum(len(line) for line in lines)
+        clipped_cells = 0
+        included = 0
+        for values in candidates:
+            cells = []
+            row_clipped = 0
+            for position, limit in zip(positions, limits):
+                value = values[position]
+                if value is None:
+                    cells.append('NULL')
+                    continue
+                cell = " ".join(str(value).replace('|', '-').split())
+                if len(cell) > limit:
+                    cell = cell[:max(limit - 1, 0)].rstrip() + "…"
+                    row_clipped += 1
+                cells.append(cell)
+            line = "| " + " | ".join(cells) + " |\n"
+
+            remaining = total_count - included - 1
+            footer = len(f"(... {remaining} hàng khác bị ẩn ...)\n") if remaining > 0 else 0
+            if included and used + len(line) + footer > self.max_chars:
+                break
+            lines.append(line)
+            used += len(line)
+            clipped_cells += row_clipped
+            included += 1
+
+        if total_count > included:
+            lines.append(f"(... {total_count - included} hàng khác bị ẩn ...)\n")
+
+        omitted_columns = [column for column in all_columns if column not in columns]
+        return SerializedResults("".join(lines), included, total_count, columns, omitted_columns, clipped_cells)
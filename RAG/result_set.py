@@ -0,0 +1,176 @@
+import json
+import sys
+from collections.abc import Mapping, Sequence
+from itertools import repeat
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class RowView(Mapping):
+    """
+    Một hàng của ResultSet nhìn như dict (row['name'], row.get(...), keys/items, so sánh == với dict)
+    nhưng không sao chép dữ liệu: chỉ giữ tham chiếu tới tuple giá trị và bảng chỉ số cột dùng chung.
+    """
+
+    __slots__ = ('_index', '_values')
+
+    def __init__(self, index: Dict[str, int], values: tuple):
+        self._index = index
+        self._values = values
+
+    def __getitem__(self, key: str) -> Any:
+        return self._values[self._index[key]]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        position = self._index.get(key)
+        return default if position is None else self._values[position]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+
+class ResultSet(Sequence):
+    """
+    Kết quả truy vấn dạng cột: một header `columns` dùng chung và danh sách tuple `rows`,
+    thay cho list-of-dict (mỗi hàng một dict riêng lặp lại toàn bộ khóa).
+
+    Tương thích với code cũ đọc list-of-dict: len(), rs[i] (RowView), lặp, cắt lát (trả về ResultSet
+    dùng chung header). Các đường nóng đọc thẳng tuple: `render_table` (bảng cho prompt LLM),
+    `dumps_json` (payload frontend), RowNormalizer (chiếu cột theo vị trí).
+
+    Khi câu SQL trả về hai cột trùng tên, giá trị của cột xuất hiện sau được dùng (như dict(zip(...))).
+    """
+
+    __slots__ = ('columns', 'rows', '_index')
+
+    def __init__(self, columns: Iterable[str], rows: Iterable[tuple] = ()):
+        self.columns: Tuple[str, ...] = tuple(columns)
+        self.rows: List[tuple] = rows if isinstance(rows, list) else list(rows)
+        self._index: Dict[str, int] = {column: position for position, column in enumerate(self.columns)}
+
+    @classmethod
+    def from_dicts(cls, rows: Sequence[Mapping]) -> "ResultSet":
+        """
+        Chuyển list-of-dict sang ResultSet (bộ cột lấy từ hàng đầu tiên, cột thiếu thành None).
+        """
+        if isinstance(rows, ResultSet):
+            return rows
+        if not rows:
+            return cls(())
+        columns = tuple(rows[0].keys())
+        return cls(columns, [tuple(row.get(column) for column in columns) for row in rows])
+
+    def _derive(self, rows: List[tuple]) -> "ResultSet":
+        derived = ResultSet.__new__(ResultSet)
+        derived.columns = self.columns
+        derived.rows = rows
+        derived._index = self._index
+        return derived
+
+    @property
+    def column_index(self) -> Dict[str, int]:
+        """
+        Tên cột -> vị trí trong tuple (cột trùng tên trỏ tới vị trí sau cùng).
+        """
+        return self._index
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return self._derive(self.rows[item])
+        return RowView(self._index, self.rows[item])
+
+    def __iter__(self) -> Iterator[RowView]:
+        index = self._index
+        for values in self.rows:
+            yield RowView(index, values)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, ResultSet):
+            return self.columns == other.columns and self.rows == other.rows
+        if isinstance(other, list):
+            return len(self) == len(other) and all(view == row for view, row in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return repr(self.to_dicts())
+
+    def column(self, name: str) -> List[Any]:
+        position = self._index[name]
+        return [values[position] for values in self.rows]
+
+    def to_dicts(self) -> List[Dict[str, Any]]:
+        if len(self._index) == len(self.columns):
+            return list(map(dict, map(zip, repeat(self.columns), self.rows)))
+        keys = tuple(self._index)
+        positions = tuple(self._index.values())
+        return [dict(zip(keys, (values[p] for p in positions))) for values in self.rows]
+
+    def estimate_size(self) -> int:
+        """
+        Ước lượng số byte bộ nhớ (header + list + tuple + giá trị), cùng cách tính với estimate_rows_size.
+        """
+        size = sys.getsizeof(self.rows) + sys.getsizeof(self.columns) + sys.getsizeof(self._index)
+        for values in self.rows:
+            size += sys.getsizeof(values)
+            for value in values:
+                size += sys.getsizeof(value)
+        return size
+
+    def render_table(self, total_count: Optional[int] = None, max_rows: int = 15) -> str:
+        """
+        Bảng văn bản (markdown) đọc trực tiếp từ tuple, đủ mọi cột; prompt trả lời dùng ResultPromptSerializer.
+        """
+        if not self.rows:
+            return "Không có kết quả từ database."
+        if total_count is None:
+            total_count = len(self.rows)
+        display_rows = self.rows[:max_rows]
+        columns = list(self._index)
+        positions = tuple(self._index.values())
+
+        lines = ["Results:\n", "| " + " | ".join(columns) + " |\n", "|" + "|".join(["---"] * len(columns)) + "|\n"]
+        for values in display_rows:
+            cells = []
+            for position in positions:
+                value = values[position]
+                cells.append('NULL' if value is None else str(value).replace('|', '-'))
+            lines.append("| " + " | ".join(cells) + " |\n")
+
+        if total_count > len(display_rows):
+            lines.append(f"(... {total_count - len(display_rows)} hàng khác bị ẩn ...)\n")
+        return "".join(lines)
+
+    def to_json(self) -> str:
+        """
+        Mảng JSON các object, giống json.dumps(list-of-dict, ensure_ascii=False, default=str).
+        """
+        return dumps_json(self)
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, ResultSet):
+        return value.to_dicts()
+    if isinstance(value, RowView):
+        return dict(value.items())
+    return str(value)
+
+
+def dumps_json(value: Any) -> str:
+    """
+    json.dumps(value, ensure_ascii=False, default=str) hiểu thêm ResultSet/RowView trong payload:
+    dict của từng hàng được dựng thẳng từ tuple ngay lúc mã hóa, bộ mã hóa C của json làm phần còn lại.
+    """
+    return json.dumps(value, ensure_ascii=False, default=_json_default)
@@ -0,0 +1,159 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .result_set import ResultSet
+
+
+# Khóa chuẩn hóa cho frontend -> các tên cột thô có thể có (theo thứ tự ưu tiên).
+KEY_MAPPING: Dict[str, List[str]] = {
+    'id': ['event_id', 'result_id'],
+    'name': ['name', 'event_name'],
+    'description': ['description', 'event_description'],
+    'location': ['location'],
+    'start_date': ['start_date'],
+    'end_date': ['end_date'],
+    'quantity_now': ['quantity_now'],
+    'max_quantity': ['max_quantity'],
+    'image': ['image', 'event_image'],
+    'organization_name': ['username', 'organization_name'],
+
+    'result_id': ['result_id'],
+    'result_description': ['content', 'result_description'],
+    'result_image': ['images', 'result_image'],
+
+    'related_event_id': ['event_id'],
+    'related_event_name': ['name', 'event_name'],
+    'related_event_description': ['description', 'event_description'],
+    'related_event_image': ['image', 'event_image'],
+}
+
+# Các cột luôn được kiểm tra chuyển datetime -> ISO, kể cả khi hàng mẫu đầu tiên là NULL.
+DATETIME_COLUMNS = {'start_date', 'end_date', 'created_at', 'updated_at', 'founded_at'}
+
+
+class ProjectionPlan:
+    """
+    Kế hoạch chiếu đã biên dịch cho một bộ cột cố định:
+    cột thô nào cấp cho khóa chuẩn hóa nào, khóa nào cần chuyển datetime, và `type` của hàng.
+    """
+
+    __slots__ = ('columns', 'output_keys', 'source_columns', 'datetime_keys', 'row_type', '_getter')
+
+    def __init__(self, columns: Tuple[str, ...], datetime_columns: set):
+        self.columns = columns
+        column_set = set(columns)
+
+        output_keys = []
+        source_columns = []
+        for standardized_key, possible_raw_keys in KEY_MAPPING.items():
+            for raw_key in possible_raw_keys:
+                if raw_key in column_set:
+                    output_keys.append(standardized_key)
+                    source_columns.append(raw_key)
+                    break
+
+        self.output_keys = tuple(output_keys)
+        self.source_columns = tuple(source_columns)
+        self.datetime_keys = tuple(key for key, col in zip(output_keys, source_columns)
+                                   if col in DATETIME_COLUMNS or col in datetime_columns)
+
+        if 'result_id' in column_set:
+            self.row_type = 'result'
+        elif 'event_id' in column_set:
+            self.row_type = 'event'
+        else:
+            self.row_type = 'unknown'
+
+        if len(source_columns) > 1:
+            self._getter = itemgetter(*source_columns)
+        elif source_columns:
+            single = itemgetter(source_columns[0])
+            self._getter = lambda row: (single(row),)
+        else:
+            self._getter = lambda row: ()
+
+    def apply(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        item = dict(zip(self.output_keys, self._getter(row)))
+        for key in self.datetime_keys:
+            value = item[key]
+            if isinstance(value, datetime):
+                item[key] = value.isoformat()
+        item['type'] = self.row_type
+        return item
+
+    def apply_all(self, rows: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        apply = self.apply
+        return [apply(row) for row in rows]
+
+    def apply_columnar(self, result_set: ResultSet) -> ResultSet:
+        """
+        Chiếu trực tiếp trên tuple của ResultSet (lấy cột theo vị trí), trả về ResultSet
+        với header output_keys + ('type',) — không dựng dict cho từng hàng.
+        """
+        positions = [result_set.column_index[column] for column in self.source_columns]
+        if len(positions) > 1:
+            getter = itemgetter(*positions)
+        elif positions:
+            single = itemgetter(positions[0])
+            getter = lambda values: (single(values),)
+        else:
+            getter = lambda values: ()
+        datetime_positions = [self.output_keys.index(key) for key in self.datetime_keys]
+        row_type = (self.row_type,)
+
+        rows = []
+        for values in result_set.rows:
+            projected = getter(values)
+            if datetime_positions:
+                projected = list(projected)
+                for position in datetime_positions:
+                    value = projected[position]
+                    if isinstance(value, datetime):
+                        projected[position] = value.isoformat()
+                projected = tuple(projected)
+            rows.append(projected + row_type)
+        return ResultSet(self.output_keys + ('type',), rows)
+
+
+class RowNormalizer:
+    """
+    Chuẩn hóa kết quả DB thành cấu trúc frontend, biên dịch ProjectionPlan một lần cho mỗi bộ cột
+    (kết quả của một câu SQL luôn có cùng bộ cột) và cache lại theo LRU.
+    """
+
+    def __init__(self, max_plans: int = 256):
+        self.max_plans = max_plans
+        self._lock = threading.Lock()
+        self._plans: "OrderedDict[Tuple[str, ...], ProjectionPlan]" = OrderedDict()
+
+    def plan_for(self, first_row: Dict[str, Any]) -> ProjectionPlan:
+        columns = tuple(first_row.keys())
+        with self._lock:
+            plan = self._plans.get(columns)
+            if plan is not None:
+                self._plans.move_to_end(columns)
+                return plan
+
+        datetime_columns = {col for col, value in first_row.items() if isinstance(value, datetime)}
+        plan = ProjectionPlan(columns, datetime_columns)
+        with self._lock:
+            self._plans[columns] = plan
+            while len(self._plans) > self.max_plans:
+                self._plans.popitem(last=False)
+        return plan
+
+    def normalize(self, rows: Optional[Sequence[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        list-of-dict -> list-of-dict; ResultSet -> ResultSet (đọc được như list-of-dict, xem dumps_json).
+        """
+        if not rows:
+            return []
+        if isinstance(rows, ResultSet):
+            return self.plan_for(rows[0]).apply_columnar(rows)
+        return self.plan_for(rows[0]).apply_all(rows)
+
+
+default_row_normalizer = RowNormalizer()
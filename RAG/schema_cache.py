@@ -0,0 +1,160 @@
+import hashlib
+import os
+import threading
+import time
+import traceback
+from typing import Callable, Optional
+
+
+SCHEMA_FILE_ERROR = "Database schema description file not found or could not be read."
+
+
+def is_schema_error(schema_description: str) -> bool:
+    """
+    Kiểm tra mô tả schema có phải là thông báo lỗi (lấy động thất bại / không có view được phép) hay không.
+    """
+    return (not schema_description
+            or schema_description.startswith("Error")
+            or "Error retrieving schema" in schema_description
+            or "Không tìm thấy bảng hoặc views nào" in schema_description)
+
+
+class SchemaCache:
+    """
+    Cache mô tả schema đã dựng sẵn để hot path của /chat không phải inspect DB mỗi lần.
+
+    - Mô tả lấy động từ DB được giữ trong `ttl_seconds` giây.
+    - File fallback (`fallback_path`) chỉ được đọc một lần và giữ trong cùng cache.
+    - `invalidate()` xóa bản cache (dùng cho admin endpoint hoặc signal).
+    - `start_background_refresh()` làm mới định kỳ trong thread nền.
+    """
+
+    def __init__(self, db_loader: Callable[[], str], fallback_path: str,
+                 ttl_seconds: float = 300.0, refresh_interval: float = 0.0):
+        self.db_loader = db_loader
+        self.fallback_path = fallback_path
+        self.ttl_seconds = ttl_seconds
+        self.refresh_interval = refresh_interval
+
+        self._lock = threading.Lock()
+        self._description: Optional[str] = None
+        self._fingerprint = ""
+        self._loaded_at = 0.0
+        self._fallback_text: Optional[str] = None
+
+        self._stop_event = threading.Event()
+        self._refresh_thread: Optional[threading.Thread] = None
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Hash ngắn của mô tả schema hiện tại (rỗng nếu chưa nạp).
+        """
+        return self._fingerprint
+
+    def _is_fresh(self) -> bool:
+        if self._description is None:
+            return False
+        if self.ttl_seconds <= 0:
+            return True
+        return (time.monotonic() - self._loaded_at) < self.ttl_seconds
+
+    def get(self) -> str:
+        """
+        Trả về mô tả schema từ cache, nạp lại nếu chưa có hoặc đã hết hạn.
+        """
+        description = self._description
+        if description is not None and self._is_fresh():
+            return description
+
+        with self._lock:
+            if self._is_fresh():
+                return self._description
+            return self._load_locked()
+
+    def refresh(self) -> str:
+        """
+        Buộc nạp lại mô tả schema từ DB (fallback sang file nếu thất bại).
+        """
+        with self._lock:
+            return self._load_locked()
+
+    def invalidate(self, reload_fallback: bool = False) -> None:
+        """
+        Xóa mô tả schema đã cache. Lần gọi `get()` kế tiếp sẽ inspect lại DB.
+        """
+        with self._lock:
+            self._description = None
+            self._fingerprint = ""
+            self._loaded_at = 0.0
+            if reload_fallback:
+                self._fallback_text = None
+        print("Schema cache invalidated.")
+
+    def _load_locked(self) -> str:
+        description = self.db_loader()
+
+        if is_schema_error(description):
+            print(
+                f"Warning: Dynamic schema retrieval failed or found no allowed tables/views by inspector. Attempting to use schema from {self.fallback_path}")
+            description = self.get_fallback_text()
+        else:
+            print("Dynamic schema description retrieved successfully.")
+
+        self._description = description
+        self._fingerprint = hashlib.sha256(description.encode('utf-8')).hexdigest()[:16]
+        self._loaded_at = time.monotonic()
+        return description
+
+    def get_fallback_text(self) -> str:
+        """
+        Đọc mô tả schema từ file fallback (chỉ đọc một lần, sau đó dùng bản đã cache).
+        """
+        if self._fallback_text is not None:
+            return self._fallback_text
+
+        try:
+            if os.path.exists(self.fallback_path):
+                with open(self.fallback_path, 'r', encoding='utf-8') as f:
+                    self._fallback_text = f.read()
+                print(f"Successfully read DB context from: {self.fallback_path}")
+            else:
+                print(
+                    f"Warning: DB context file not found at {self.fallback_path}. Schema description will not include additional context.")
+                self._fallback_text = SCHEMA_FILE_ERROR
+        except Exception as e:
+            print(f"Error reading DB context file {self.fallback_path}: {e}")
+            traceback.print_exc()
+            return SCHEMA_FILE_ERROR
+
+        return self._fallback_text
+
+    def start_background_refresh(self) -> None:
+        """
+        Khởi động thread nền nạp schema ngay lập tức rồi làm mới mỗi `refresh_interval` giây.
+        """
+        if self.refresh_interval <= 0:
+            print("Schema background refresh disabled (refresh_interval <= 0).")
+            return
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            return
+
+        self._stop_event.clear()
+        self._refresh_thread = threading.Thread(target=self._refresh_loop, name="schema-cache-refresh", daemon=True)
+        self._refresh_thread.start()
+        print(f"Schema background refresh started (every {self.refresh_interval}s).")
+
+    def stop_background_refresh(self) -> None:
+        self._stop_event.set()
+        if self._refresh_thread is not None:
+            self._refresh_thread.join(timeout=5)
+            self._refresh_thread = None
+
+    def _refresh_loop(self) -> None:
+        while not self._stop_event.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Error refreshing schema cache in background: {e}")
+                traceback.print_exc()
+            self._stop_event.wait(self.refresh_interval)
@@ -1,84 +1,100 @@
+import asyncio
 import os
+import time
 import traceback
-from typing import List, Dict, Any, Tuple, Union
-
-import sqlparse
-from sqlparse.sql import Identifier, IdentifierList, Parenthesis, Function, TokenList
-from sqlparse.tokens import Keyword, DML
+from typing import List, Dict, Any, Optional, Tuple, Union
 
 from .llm_client import LlmClient
 from .database import DatabaseConnector
+from .schema_cache import SchemaCache, is_schema_error
+from .query_cache import SqlQueryCache
+from .intent_router import IntentMatch, IntentRouter
+from .prompt_builder import SchemaPruner
+from .example_store import ExampleStore
+from .name_index import NameIndex
+from .result_prompt import ResultPromptSerializer
+from .metrics import metrics, timed
 
 
 class DatabaseChatbotService:
 
-    def __init__(self, llm_client: LlmClient, db_context_path: str):
+    def __init__(self, llm_client: LlmClient, db_context_path: str,
+                 db_connector: Optional[DatabaseConnector] = None):
         """
         Khởi tạo DatabaseChatbotService.
 
         Args:
             llm_client: Instance của LlmClient.
             db_context_path: Đường dẫn đến file mô tả schema tĩnh (dùng làm fallback).
+            db_connector: DatabaseConnector dùng sẵn (mặc định tạo mới từ biến môi trường).
         """
         self.llm_client = llm_client
 
-        self.db_connector = DatabaseConnector()
+        self.db_connector = db_connector or DatabaseConnector()
         self.db_context_path = db_context_path
+
+        self.schema_cache = SchemaCache(
+            db_loader=self.db_connector.get_schema_description,
+            fallback_path=db_context_path,
+            ttl_seconds=float(os.getenv("SCHEMA_CACHE_TTL", "300")),
+            refresh_interval=float(os.getenv("SCHEMA_REFRESH_INTERVAL", "240")),
+        )
+        self.sql_cache = SqlQueryCache(
+            max_entries=int(os.getenv("SQL_CACHE_MAX_ENTRIES", "1000")),
+            ttl_seconds=float(os.getenv("SQL_CACHE_TTL", "3600")),
+        )
+
+        self.max_query_rows = int(os.getenv("MAX_QUERY_ROWS", "500"))
+        self.llm_result_rows = int(os.getenv("RESULT_ROWS_FOR_LLM", "15"))
+        self.frontend_result_rows = int(os.getenv("RESULT_ROWS_FOR_FRONTEND", "100"))
+        self.exact_total_count = os.getenv("RESULT_EXACT_COUNT", "false").lower() in ("1", "true", "yes")
+        self.result_serializer = ResultPromptSerializer.from_env(max_rows=self.llm_result_rows)
+
+        intent_router_enabled = os.getenv("INTENT_ROUTER_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.intent_router = IntentRouter() if intent_router_enabled else None
+
+        schema_pruning_enabled = os.getenv("SCHEMA_PRUNING_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.schema_pruner = SchemaPruner() if schema_pruning_enabled else None
+        self.example_store = ExampleStore.from_env()
+        self.name_index = NameIndex.from_env(self.db_connector.engine)
         print("DatabaseChatbotService initialized.")
 
     def get_schema_description(self) -> str:
         """
-        Lấy mô tả schema của các bảng được phép (bao gồm Views) từ DB thực tế.
-        Kết hợp kết quả từ get_table_names() và get_view_names().
-        Fallback sang file nếu lấy động thất bại hoặc không tìm thấy bảng/view được phép.
+        Lấy mô tả schema của các bảng được phép (bao gồm Views) từ cache.
+        Cache được nạp từ DB thực tế (get_table_names() và get_view_names()),
+        fallback sang file nếu lấy động thất bại hoặc không tìm thấy bảng/view được phép.
         """
-        print("Attempting to get database schema description...")
-
-        db_schema_description = self.db_connector.get_schema_description()
-
-        if db_schema_description.startswith(
-                "Error retrieving schema details") or "Không tìm thấy bảng hoặc views nào" in db_schema_description:
-            print(
-                f"Warning: Dynamic schema retrieval failed or found no allowed tables/views by inspector. Attempting to use schema from {self.db_context_path}")
+        return self.schema_cache.get()
 
-            return self.get_schema_description_from_file()
-        else:
-
-            print("Dynamic schema description retrieved successfully.")
-            return db_schema_description
+    def invalidate_schema_cache(self) -> None:
+        """
+        Xóa schema đã cache, lần gọi kế tiếp sẽ inspect lại DB.
+        """
+        self.schema_cache.invalidate()
 
     def get_schema_description_from_file(self) -> str:
         """
-        Đọc mô tả schema từ file (fallback).
+        Đọc mô tả schema từ file (fallback). File chỉ được đọc một lần và giữ trong schema cache.
         """
-        try:
-            if os.path.exists(self.db_context_path):
-                print(f"Successfully read DB context from: {self.db_context_path}")
-                with open(self.db_context_path, 'r', encoding='utf-8') as f:
-                    return f.read()
-            else:
-                print(
-                    f"Warning: DB context file not found at {self.db_context_path}. Schema description will not include additional context.")
-
-                return "Database schema description file not found or could not be read."
-        except Exception as e:
-            print(f"Error reading DB context file {self.db_context_path}: {e}")
-            traceback.print_exc()
-            return "Database schema description file not found or could not be read."
+        return self.schema_cache.get_fallback_text()
 
-    def process_query(self, user_query: str) -> Union[Tuple[str, List[Dict[str, Any]], str], Tuple[str,]]:
+    def build_sql_prompt(self, db_schema: str, user_query: str, conversation_context: str = "") -> str:
         """
-        Xử lý truy vấn từ người dùng: lấy schema, gọi LLM (lần 1 tạo SQL), xác thực SQL, thực thi SQL.
-        Trả về tuple (sql_cleaned, raw_results_list, formatted_results_string) nếu thành công,
-        hoặc tuple (error_message,) nếu có lỗi.
+        Tạo prompt cho LLM lần 1 (sinh SQL) từ mô tả schema và câu hỏi người dùng.
+        Phần ví dụ chỉ gồm các cặp câu hỏi/SQL gần câu hỏi nhất trong ExampleStore.
+        conversation_context: các câu hỏi/SQL trước trong cùng session (xem render_conversation_context).
         """
-
-        db_schema = self.get_schema_description()
-
-        if not db_schema or db_schema.startswith("Error") or "Không tìm thấy bảng hoặc views nào" in db_schema:
-            return (db_schema,)
-
-        prompt = f"""
+        conversation_section = ""
+        if conversation_context:
+            conversation_section = f"""
+        --- Conversation So Far ---
+        The user question may refer to earlier questions in this conversation (e.g. "sự kiện đó", "các tổ chức ấy").
+        Use the previous questions and SQL below only to resolve such references.
+{conversation_context}
+        --- End Conversation ---
+"""
+        return f"""
         You are a helpful assistant that can answer questions about the database by generating SQL queries.
         You can only query the tables and columns provided in the schema below.
         You must only generate SELECT statements.
@@ -99,65 +115,202 @@ class DatabaseChatbotService:
         {db_schema}
 
         --- Examples ---
-        User question: Các sự kiện nào còn chỗ đăng kí?
-        SQL query: SELECT event_id, name, description, location, start_date, end_date, quantity_now, max_quantity, image FROM events_view WHERE quantity_now < max_quantity; -- Bao gồm các cột cần thiết
+{self.example_store.render(user_query)}
 
-        User question: Sự kiện nào sắp hết lượt đăng kí?
-        SQL query: SELECT event_id, name, description, location, start_date, end_date, quantity_now, max_quantity, image FROM events_view WHERE quantity_now >= max_quantity * 0.75 AND quantity_now < max_quantity ORDER BY (max_quantity - quantity_now) ASC; -- Tìm sự kiện đầy từ 75% trở lên, sắp xếp sự kiện ít chỗ trống nhất lên đầu
+        --- End Examples ---
+{conversation_section}
+        Based on the user's question, generate a single SQL SELECT query using the schema and following the instructions and examples.
 
-        User question: Tìm sự kiện còn nhiều chỗ đăng kí.
-        SQL query: SELECT event_id, name, description, location, start_date, end_date, quantity_now, max_quantity, image FROM events_view WHERE max_quantity - quantity_now > 20; -- Bao gồm các cột cần thiết
+        User question: {user_query}
+        SQL query:
+        """
 
-        User question: Sự kiện nào đã đầy lượt đăng kí?
-        SQL query: SELECT event_id, name, description, location, start_date, end_date, quantity_now, max_quantity, image FROM events_view WHERE quantity_now >= max_quantity; -- Bao gồm các cột cần thiết
+    def process_query(self, user_query: str, conversation_context: str = "") -> Union[Tuple[str, List[Dict[str, Any]], str, Dict[str, Any]], Tuple[str,]]:
+        """
+        Xử lý truy vấn từ người dùng: lấy schema, gọi LLM (lần 1 tạo SQL), xác thực SQL, thực thi SQL.
+        Câu hỏi khớp một intent của IntentRouter được thực thi thẳng bằng SQL template, không qua LLM.
+        Có conversation_context thì SQL phụ thuộc ngữ cảnh nên bỏ qua IntentRouter và cache câu hỏi -> SQL;
+        ChatPipeline chỉ truyền ngữ cảnh khi câu hỏi trỏ về lượt trước (session_store.refers_to_previous).
+        Trả về tuple (sql_executed, raw_results_list, formatted_results_string, result_info) nếu thành công,
+        với result_info = {'total_count', 'total_count_exact'} (thêm 'intent' nếu câu hỏi khớp IntentRouter),
+        hoặc tuple (error_message,) nếu có lỗi.
+        """
+        routed = self._route_intent(user_query) if not conversation_context else None
+        if routed is not None:
+            return self._execute_validated_sql(routed.sql, intent=routed.intent)
 
-        User question: Sự kiện "Hoi nghi cong nghe" của nhà tổ chức nào?
-        SQL query: SELECT e.name AS event_name, o.username AS organization_name, e.event_id, e.description AS event_description, e.location, e.start_date, e.end_date, e.quantity_now, e.max_quantity, e.image AS event_image FROM events_view AS e JOIN organizations_view AS o ON e.organization_id = o.organization_id WHERE LOWER(e.name) LIKE '%hoi nghi cong nghe%'; -- Bao gồm các cột cần thiết từ event và tổ chức, dùng alias cho rõ
+        with timed('schema'):
+            db_schema = self.get_schema_description()
 
-        User question: Có kết quả của sự kiện "Fuga quia beatae" chưa?
-        SQL query: SELECT r.result_id, r.content AS result_description, r.images AS result_image, e.event_id, e.name AS event_name, e.description AS event_description, e.image AS event_image FROM results_view r JOIN events_view e ON r.event_id = e.event_id WHERE LOWER(e.name) LIKE '%fuga quia beatae%'; -- Bao gồm các cột cần thiết từ kết quả và sự kiện liên quan
+        if is_schema_error(db_schema):
+            return (db_schema,)
 
-        User question: Liệt kê các sự kiện diễn ra tại "Hà Nội".
-        SQL query: SELECT event_id, event_name, description, location, start_date, end_date, quantity_now, max_quantity, image FROM events_view WHERE LOWER(location) LIKE '%hà nội%'; -- Bao gồm các cột cần thiết
-        
-        User question: Các sự kiện nào vừa kết thúc?
-        SQL query: SELECT event_id, name, description, location, start_date, end_date, quantity_now, max_quantity, image FROM events_view WHERE end_date < NOW() AND end_date >= NOW() - INTERVAL '7' DAY ORDER BY end_date DESC LIMIT 10; -- Tìm các sự kiện có end_date trong vòng 7 ngày qua và đã kết thúc (end_date < NOW()), sắp xếp theo ngày kết thúc gần nhất
+        schema_fingerprint = self.schema_cache.fingerprint
+        cached_sql = self._lookup_cached_sql(user_query, schema_fingerprint) if not conversation_context else None
+        if cached_sql is not None:
+            return self._execute_validated_sql(cached_sql)
 
-        User question: Các sự kiện nào sắp diễn ra?
-        SQL query: SELECT event_id, name, description, location, start_date, end_date, quantity_now, max_quantity, image FROM events_view WHERE start_date > NOW() ORDER BY start_date ASC LIMIT 10; -- Tìm các sự kiện có start_date trong tương lai (start_date > NOW()), sắp xếp theo ngày bắt đầu sớm nhất
+        prompt = self._build_prompt_for_question(db_schema, user_query, conversation_context)
+        print("Sending prompt to LLM (SQL Generation)...")
+        try:
+            llm_started = time.perf_counter()
+            with timed('llm_sql'):
+                raw_sql = self.llm_client.generate_text(prompt, schema_fingerprint=schema_fingerprint)
+            llm_seconds = time.perf_counter() - llm_started
+            print(f"Raw SQL generated by LLM: {raw_sql}")
+        except Exception as e:
+            print(f"Error calling LLM (SQL Generation): {e}")
+            traceback.print_exc()
+            metrics.inc('llm_errors_total', labels={'stage': 'llm_sql'})
 
-        --- End Examples ---
+            return ("Xin lỗi, tôi gặp sự cố khi tạo truy vấn SQL.",)
 
-        Based on the user's question, generate a single SQL SELECT query using the schema and following the instructions and examples.
+        sql_cleaned = self._validate_generated_sql(raw_sql)
+        if sql_cleaned is None:
+            return ("Xin lỗi, truy vấn SQL được tạo ra không hợp lệ hoặc bị cấm vì lý do bảo mật.",)
 
-        User question: {user_query}
-        SQL query:
+        if not conversation_context:
+            self.sql_cache.put(user_query, schema_fingerprint, sql_cleaned, llm_seconds)
+
+        return self._execute_validated_sql(sql_cleaned)
+
+    async def aprocess_query(self, user_query: str, conversation_context: str = "") -> Union[Tuple[str, List[Dict[str, Any]], str, Dict[str, Any]], Tuple[str,]]:
         """
-        print(f"Sending prompt to LLM (SQL Generation)...")
+        Phiên bản async của process_query: gọi LLM bằng agenerate_text,
+        các bước chạm DB (nạp schema, thực thi SQL) chạy trong thread pool để không chặn event loop.
+        """
+        routed = self._route_intent(user_query) if not conversation_context else None
+        if routed is not None:
+            return await asyncio.to_thread(self._execute_validated_sql, routed.sql, routed.intent)
+
+        with timed('schema'):
+            db_schema = await asyncio.to_thread(self.get_schema_description)
+
+        if is_schema_error(db_schema):
+            return (db_schema,)
+
+        schema_fingerprint = self.schema_cache.fingerprint
+        cached_sql = self._lookup_cached_sql(user_query, schema_fingerprint) if not conversation_context else None
+        if cached_sql is not None:
+            return await asyncio.to_thread(self._execute_validated_sql, cached_sql)
+
+        prompt = self._build_prompt_for_question(db_schema, user_query, conversation_context)
+        print("Sending prompt to LLM (SQL Generation, async)...")
         try:
-            raw_sql = self.llm_client.generate_text(prompt)
+            llm_started = time.perf_counter()
+            with timed('llm_sql'):
+                raw_sql = await self.llm_client.agenerate_text(prompt, schema_fingerprint=schema_fingerprint)
+            llm_seconds = time.perf_counter() - llm_started
             print(f"Raw SQL generated by LLM: {raw_sql}")
         except Exception as e:
             print(f"Error calling LLM (SQL Generation): {e}")
             traceback.print_exc()
+            metrics.inc('llm_errors_total', labels={'stage': 'llm_sql'})
 
             return ("Xin lỗi, tôi gặp sự cố khi tạo truy vấn SQL.",)
 
-        sql_cleaned = clean_sql_query(raw_sql)
-        print(f"Cleaned SQL query: {sql_cleaned}")
-
-        if not is_valid_sql(sql_cleaned):
-            print(f"SQL Validation Failed for query: ```sql\n{sql_cleaned}\n```")
+        sql_cleaned = self._validate_generated_sql(raw_sql)
+        if sql_cleaned is None:
             return ("Xin lỗi, truy vấn SQL được tạo ra không hợp lệ hoặc bị cấm vì lý do bảo mật.",)
 
-        print(f"Executing validated SQL query: {sql_cleaned}")
+        if not conversation_context:
+            self.sql_cache.put(user_query, schema_fingerprint, sql_cleaned, llm_seconds)
 
-        raw_results = self.db_connector.execute_query(sql_cleaned)
+        return await asyncio.to_thread(self._execute_validated_sql, sql_cleaned)
 
-        formatted_results_string = format_results(raw_results)
-        print(f"Formatted results string for LLM2:\n```\n{formatted_results_string}\n```")
+    def _build_prompt_for_question(self, db_schema: str, user_query: str, conversation_context: str = "") -> str:
+        """
+        Tạo prompt sinh SQL chỉ với các view/cột liên quan tới câu hỏi (nếu bật SCHEMA_PRUNING_ENABLED),
+        và ghi kích thước prompt trước/sau khi rút gọn vào sql_prompt_chars{schema=full|pruned}.
+        """
+        if self.schema_pruner is None:
+            prompt = self.build_sql_prompt(db_schema, user_query, conversation_context)
+            metrics.observe('sql_prompt_chars', len(prompt), {'schema': 'full'})
+            return prompt
+
+        with timed('schema_prune'):
+            pruned = self.schema_pruner.prune(db_schema, user_query)
+        prompt = self.build_sql_prompt(pruned.text, user_query, conversation_context)
+        full_prompt_chars = len(prompt) + pruned.full_chars - pruned.pruned_chars
+
+        metrics.observe('sql_prompt_chars', full_prompt_chars, {'schema': 'full'})
+        metrics.observe('sql_prompt_chars', len(prompt), {'schema': 'pruned'})
+        print(f"SQL prompt schema pruned to {pruned.views}: {full_prompt_chars} -> {len(prompt)} chars")
+        return prompt
+
+    def _route_intent(self, user_query: str) -> Optional[IntentMatch]:
+        if self.intent_router is None:
+            return None
+        with timed('intent'):
+            match = self.intent_router.route(user_query)
+        metrics.inc('intent_router_requests_total', labels={'intent': match.intent if match else 'none'})
+        if match is None:
+            return None
+        print(f"Intent '{match.intent}' matched {match.slots}, skipping LLM (SQL Generation): {match.sql}")
+        return match
+
+    def _lookup_cached_sql(self, user_query: str, schema_fingerprint: str) -> Optional[str]:
+        cached_sql = self.sql_cache.get(user_query, schema_fingerprint)
+        metrics.inc('sql_cache_requests_total', labels={'result': 'hit' if cached_sql is not None else 'miss'})
+        if cached_sql is not None:
+            print(f"SQL cache hit, skipping LLM (SQL Generation): {cached_sql}")
+        return cached_sql
+
+    def _validate_generated_sql(self, raw_sql: str) -> Optional[str]:
+        """
+        Làm sạch và xác thực SQL do LLM tạo. Trả về SQL đã làm sạch, hoặc None nếu bị chặn.
+        """
+        with timed('validate'):
+            sql_cleaned = clean_sql_query(raw_sql)
+            print(f"Cleaned SQL query: {sql_cleaned}")
+            valid = is_valid_sql(sql_cleaned)
+
+        if not valid:
+            print(f"SQL Validation Failed for query: ```sql\n{sql_cleaned}\n```")
+            metrics.inc('sql_validation_rejections_total')
+            return None
 
-        return (sql_cleaned, raw_results, formatted_results_string)
+        return sql_cleaned
 
+    def _rewrite_name_lookups(self, sql: str) -> str:
+        if self.name_index is None:
+            return sql
+        with timed('name_index'):
+            return self.name_index.rewrite_sql(sql)
 
-from .sql_utils import is_valid_sql, format_results, clean_sql_query
+    def _execute_validated_sql(self, sql_cleaned: str, intent: Optional[str] = None) -> Tuple[str, List[Dict[str, Any]], str, Dict[str, Any]]:
+        """
+        Thực thi SQL đã được xác thực (tự thêm LIMIT nếu thiếu) và đọc kết quả theo kiểu lazy:
+        RESULT_ROWS_FOR_LLM hàng đầu cho LLM lần 2 (bảng trong ngân sách của ResultPromptSerializer),
+        RESULT_ROWS_FOR_FRONTEND hàng đầu cho frontend, tổng số hàng được báo riêng trong result_info.
+        Vị từ LIKE '%...%' trên tên/địa điểm được NameIndex viết lại thành `key IN (...)` trước khi thực thi;
+        SQL trả về (đưa vào prompt LLM lần 2) vẫn là bản chưa viết lại.
+        """
+        sql_limited, limit_applied = apply_row_limit(sql_cleaned, self.max_query_rows)
+        sql_to_execute = self._rewrite_name_lookups(sql_limited)
+        print(f"Executing validated SQL query: {sql_to_execute}")
+
+        keep_rows = max(self.llm_result_rows, self.frontend_result_rows)
+        with timed('db_execute'):
+            raw_results, total_count = self.db_connector.fetch_bounded(sql_to_execute, keep_rows)
+
+            total_count_exact = not (limit_applied and total_count >= self.max_query_rows)
+            if not total_count_exact and self.exact_total_count:
+                exact_count = self.db_connector.count_query(self._rewrite_name_lookups(sql_cleaned))
+                if exact_count >= 0:
+                    total_count, total_count_exact = exact_count, True
+
+        with timed('format_results'):
+            serialized = self.result_serializer.serialize(raw_results[:self.llm_result_rows], total_count)
+        formatted_results_string = serialized.text
+        metrics.observe('result_prompt_chars', len(formatted_results_string))
+        print(f"Formatted results string for LLM2 ({serialized.rows}/{serialized.total_count} rows, "
+              f"{len(formatted_results_string)} chars, omitted columns {serialized.omitted_columns}, "
+              f"{serialized.clipped_cells} clipped cells):\n```\n{formatted_results_string}\n```")
+
+        result_info = {'total_count': total_count, 'total_count_exact': total_count_exact}
+        if intent is not None:
+            result_info['intent'] = intent
+        return (sql_limited, raw_results[:self.frontend_result_rows], formatted_results_string, result_info)
+
+from .sql_utils import is_valid_sql, clean_sql_query, apply_row_limit
@@ -0,0 +1,418 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import date, datetime
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from .response_synthesis import format_scalar
+from .text_utils import normalize_question
+
+
+class SessionTurn(NamedTuple):
+    question: str
+    sql: str
+    rows: List[Dict[str, Any]]
+    complete: bool
+
+
+class _Session:
+    __slots__ = ('turns', 'last_access')
+
+    def __init__(self, max_turns: int):
+        self.turns: Deque[SessionTurn] = deque(maxlen=max_turns)
+        self.last_access = time.monotonic()
+
+
+class SessionStore:
+    """
+    Lưu các lượt hỏi gần đây (câu hỏi, SQL, các hàng kết quả) theo session ID của /chat,
+    để câu hỏi nối tiếp được trả lời từ kết quả trước (FollowUpResolver) hoặc gửi kèm ngữ cảnh cho LLM.
+
+    Giới hạn bộ nhớ: tối đa `max_sessions` session (loại theo LRU), `max_turns` lượt mỗi session,
+    `max_rows` hàng mỗi lượt; session không được dùng trong `idle_ttl_seconds` giây thì hết hạn.
+    """
+
+    def __init__(self, max_sessions: int = 1000, idle_ttl_seconds: float = 1800.0, max_turns: int = 5,
+                 max_rows: int = 100):
+        self.max_sessions = max_sessions
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.max_turns = max_turns
+        self.max_rows = max_rows
+
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["SessionStore"]:
+        """
+        Trả về None nếu SESSION_STORE_ENABLED tắt. SESSION_MAX (số session, mặc định 1000),
+        SESSION_IDLE_TTL (giây, mặc định 1800), SESSION_MAX_TURNS (5), SESSION_MAX_ROWS (100).
+        """
+        if os.getenv("SESSION_STORE_ENABLED", "true").lower() not in ("1", "true", "yes"):
+            return None
+        return cls(
+            max_sessions=int(os.getenv("SESSION_MAX", "1000")),
+            idle_ttl_seconds=float(os.getenv("SESSION_IDLE_TTL", "1800")),
+            max_turns=int(os.getenv("SESSION_MAX_TURNS", "5")),
+            max_rows=int(os.getenv("SESSION_MAX_ROWS", "100")),
+        )
+
+    def _expired(self, session: _Session, now: float) -> bool:
+        return self.idle_ttl_seconds > 0 and now - session.last_access >= self.idle_ttl_seconds
+
+    def get(self, session_id: str) -> List[SessionTurn]:
+        """
+        Các lượt đã lưu của session (cũ -> mới); rỗng nếu chưa có hoặc đã hết hạn.
+        """
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return []
+            if self._expired(session, now):
+                del self._sessions[session_id]
+                self.expirations += 1
+                return []
+            session.last_access = now
+            self._sessions.move_to_end(session_id)
+            return list(session.turns)
+
+    def record(self, session_id: str, question: str, sql: str, rows: List[Dict[str, Any]], complete: bool) -> None:
+        if self.max_sessions <= 0:
+            return
+        now = time.monotonic()
+        turn = SessionTurn(question, sql, rows[:self.max_rows], complete and len(rows) <= self.max_rows)
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or self._expired(session, now):
+                session = self._sessions[session_id] = _Session(self.max_turns)
+            session.turns.append(turn)
+            session.last_access = now
+            self._sessions.move_to_end(session_id)
+
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+            while self._sessions:
+                oldest_id, oldest = next(iter(self._sessions.items()))
+                if not self._expired(oldest, now):
+                    break
+                del self._sessions[oldest_id]
+                self.expirations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sessions.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'idle_ttl_seconds': self.idle_ttl_seconds,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+def render_conversation_context(turns: List[SessionTurn], max_turns: int = 3) -> str:
+    """
+    Ngữ cảnh hội thoại gửi kèm prompt sinh SQL: các câu hỏi và SQL gần nhất.
+    """
+    lines = []
+    for turn in turns[-max_turns:]:
+        lines.append(f"        Previous question: {turn.question}")
+        lines.append(f"        Previous SQL query: {turn.sql}")
+    return "\n".join(lines)
+
+
+# ----------------------------------------------------------------------------------------------
+# Trả lời câu hỏi nối tiếp từ kết quả trước
+# ----------------------------------------------------------------------------------------------
+
+class FollowUpAnswer(NamedTuple):
+    kind: str
+    response_text: str
+    rows: List[Dict[str, Any]]
+
+
+_ORDINALS = {'nhat': 1, 'hai': 2, 'ba': 3, 'tu': 4, 'nam': 5, 'sau': 6, 'bay': 7, 'tam': 8, 'chin': 9, 'muoi': 10}
+# Chỉ coi là số thứ tự khi có từ chỉ mục trong danh sách đứng ngay trước ("sự kiện/cái/kết quả thứ hai",
+# "sự kiện số 2"): "thứ hai".."thứ bảy" một mình là tên ngày trong tuần, "số 1" một mình có thể là số nhà, số phòng.
+_ORDINAL_RE = re.compile(r"\b(?:su kien|cai|ket qua|muc|dong|hang) (?:thu (nhat|hai|ba|tu|nam|sau|bay|tam|chin|muoi|"
+                         r"\d{1,3})|(dau tien)|(cuoi cung|cuoi)|so (\d{1,3}))\b")
+# Ngữ cảnh ngày trong tuần: "vào/ngày/hôm thứ hai", "tuần này", "chủ nhật" -> không phải chọn theo thứ tự.
+_WEEKDAY_RE = re.compile(r"\b(?:vao|ngay|hom|sang|chieu|toi|dem) thu (?:hai|ba|tu|nam|sau|bay)\b"
+                         r"|\btuan\b|\bchu nhat\b")
+# Dấu hiệu câu hỏi nói về danh sách vừa trả về ("trong số đó", "cái nào", ...).
+_REFERENCE_RE = re.compile(r"\b(?:trong (?:so )?(?:do|nay|danh sach)|o tren|vua roi|vua nay|cai nao|cac cai|"
+                           r"nhung cai|may cai|su kien do|su kien nay|cac su kien do|nhung su kien do)\b")
+# Chỉ định / tỉnh lược trỏ về lượt trước ("sự kiện đó", "nó", "sự kiện nào khác", "còn ở Đà Nẵng thì sao?").
+# Không dùng "đó"/"này" đứng một mình: trùng với "do" (bởi), "hôm nay".
+_ANAPHORA_RE = re.compile(r"\b(?:su kien|ket qua|cai|danh sach|nhung|cac|chung) (?:do|nay|kia|ay|tren)\b"
+                          r"|\b(?:nao|cai|su kien|nhung) khac\b|\bnua\b"
+                          r"|\bno\b|\bthi sao\b|^(?:the |vay )?con (?:o|tai|cai|nhung|may)\b")
+_SORT_RE = re.compile(r"\bsap xep\b")
+_SORT_DIRECTIONS = ('giam dan', 'nhieu nhat', 'muon nhat', 'moi nhat', 'tang dan', 'it nhat', 'som nhat', 'cu nhat')
+_COUNT_RE = re.compile(r"\b(?:co )?bao nhieu (?:su kien|ket qua|cai)\b")
+_LOCATION_FILTER_RE = re.compile(r"\b(?:o|tai) ((?!dau\b)[a-z0-9 ]+?)(?: (?:vay|the|a|nhi|khong))*$")
+# Từ đệm bị bỏ khi kiểm tra câu hỏi chỉ gồm thuộc tính ("còn bao nhiêu chỗ?").
+_FILLER_WORDS = {'vay', 'the', 'a', 'nhi', 'ha', 'khong', 'su', 'kien', 'do', 'nay', 'no', 'cai', 'thi', 'con', 'la',
+                 'cua', 'cho', 'minh', 'toi', 'biet', 'xem', 'vui', 'long'}
+# Từ được phép còn lại trong câu chọn theo thứ tự / sắp xếp, ngoài từ đệm. Từ nào khác ("của tổ chức ABC",
+# "của năm", "các tổ chức") nghĩa là câu hỏi nêu đối tượng mới, không nói về danh sách trước.
+_LIST_WORDS = (_FILLER_WORDS - {'cua'}) | {'gi', 'nao', 'cac', 'nhung', 'danh', 'sach', 'ket', 'qua', 'lai', 'theo',
+                                          'thong', 'tin', 've', 'hay', 'giup', 'di', 'nhe', 'ra'}
+
+
+def refers_to_previous(question: str) -> bool:
+    """
+    Câu hỏi có trỏ về hội thoại trước không (chỉ định, số thứ tự, "trong số đó", câu chỉ gồm thuộc tính
+    như "còn bao nhiêu chỗ?"). Câu hỏi tự đủ nghĩa không cần ngữ cảnh hội thoại, nên vẫn đi qua
+    IntentRouter và cache câu hỏi -> SQL.
+    """
+    folded = normalize_question(question)
+    if not folded:
+        return False
+    if _REFERENCE_RE.search(folded) or _ANAPHORA_RE.search(folded):
+        return True
+    if _ORDINAL_RE.search(folded) and not _WEEKDAY_RE.search(folded):
+        return True
+    padded = f" {folded} "
+    return any(_contains(padded, attribute.phrases) and FollowUpResolver._is_bare(folded, attribute)
+               for attribute in _ATTRIBUTES)
+
+
+def _remaining(row: Dict[str, Any]) -> Optional[int]:
+    if row.get('max_quantity') is None or row.get('quantity_now') is None:
+        return None
+    return int(row['max_quantity']) - int(row['quantity_now'])
+
+
+def _row_name(row: Dict[str, Any]) -> Optional[str]:
+    for key in ('name', 'event_name', 'fullname', 'username'):
+        if row.get(key):
+            return str(row[key])
+    return None
+
+
+def _as_datetime(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    return None
+
+
+class _Attribute(NamedTuple):
+    phrases: Tuple[str, ...]
+    columns: Tuple[str, ...]
+    render: Callable[[str, Dict[str, Any]], str]
+
+
+# Thứ tự có ý nghĩa: cụm dài/cụ thể hơn đứng trước ("còn bao nhiêu chỗ" trước "bao nhiêu người").
+_ATTRIBUTES: List[_Attribute] = [
+    _Attribute(('con bao nhieu cho', 'bao nhieu cho', 'con cho khong', 'con trong', 'het cho chua', 'day chua'),
+               ('max_quantity', 'quantity_now'),
+               lambda name, row: (f"{name} đã hết chỗ ({row['quantity_now']}/{row['max_quantity']})."
+                                  if _remaining(row) <= 0 else
+                                  f"{name} còn {_remaining(row)} chỗ ({row['quantity_now']}/{row['max_quantity']}).")),
+    _Attribute(('bao nhieu nguoi', 'may nguoi', 'da dang ky', 'da dang ki'), ('quantity_now',),
+               lambda name, row: f"{name} có {format_scalar(row['quantity_now'])} người đăng ký."),
+    _Attribute(('o dau', 'tai dau', 'dia diem', 'cho nao', 'noi nao'), ('location',),
+               lambda name, row: f"{name} diễn ra tại {row['location']}."),
+    _Attribute(('ket thuc',), ('end_date',),
+               lambda name, row: f"{name} kết thúc lúc {format_scalar(row['end_date'])}."),
+    _Attribute(('khi nao', 'luc nao', 'bao gio', 'ngay nao', 'bat dau', 'thoi gian', 'hom nao'), ('start_date',),
+               lambda name, row: f"{name} bắt đầu lúc {format_scalar(row['start_date'])}."),
+    _Attribute(('mo ta', 'noi dung', 'gioi thieu', 'chi tiet'), ('description',),
+               lambda name, row: f"{name}: {row['description']}"),
+]
+
+# (cụm từ, khóa sắp xếp, nhãn, mặc định giảm dần)
+_SORT_KEYS = [
+    (('con trong', 'so cho', 'cho trong', 'con cho'), _remaining, 'số chỗ còn trống', True),
+    (('ket thuc',), lambda row: _as_datetime(row.get('end_date')), 'ngày kết thúc', False),
+    (('ngay', 'thoi gian', 'bat dau', 'som nhat', 'gan nhat'), lambda row: _as_datetime(row.get('start_date')),
+     'ngày bắt đầu', False),
+    (('so nguoi', 'dang ky', 'dang ki'), lambda row: row.get('quantity_now'), 'số người đăng ký', True),
+    (('ten', 'alphabet', 'abc'), lambda row: normalize_question(_row_name(row) or ''), 'tên', False),
+]
+
+# (cụm từ, điều kiện, mô tả)
+_FILTERS = [
+    (('con cho', 'con trong', 'chua day', 'chua het cho'), lambda row: (_remaining(row) or 0) > 0, 'còn chỗ'),
+    (('da day', 'het cho'), lambda row: _remaining(row) is not None and _remaining(row) <= 0, 'đã hết chỗ'),
+    (('sap dien ra', 'chua dien ra', 'chua bat dau'),
+     lambda row: (_as_datetime(row.get('start_date')) or datetime.min) > datetime.now(), 'sắp diễn ra'),
+    (('da ket thuc', 'ket thuc roi'),
+     lambda row: (_as_datetime(row.get('end_date')) or datetime.max) < datetime.now(), 'đã kết thúc'),
+]
+
+
+def _contains(padded: str, phrases) -> bool:
+    return any(f" {phrase} " in padded for phrase in phrases)
+
+
+def _list_text(header: str, rows: List[Dict[str, Any]], max_items: int) -> str:
+    items = []
+    for row in rows[:max_items]:
+        name = _row_name(row) or '?'
+        location = row.get('location')
+        items.append(f"- {name} ({location})" if location else f"- {name}")
+    if len(rows) > max_items:
+        items.append(f"(... và {len(rows) - max_items} kết quả khác)")
+    return header + "\n" + "\n".join(items)
+
+
+class FollowUpResolver:
+    """
+    Trả lời cục bộ các câu hỏi nối tiếp dựa trên kết quả của lượt trước, không gọi LLM hay DB:
+    - chọn theo thứ tự ("sự kiện thứ hai ở đâu?", "cái cuối cùng bắt đầu khi nào?");
+    - hỏi thuộc tính khi chỉ có một kết quả, hoặc câu hỏi chỉ gồm thuộc tính ("còn bao nhiêu chỗ?");
+    - sắp xếp ("sắp xếp theo ngày bắt đầu"), lọc ("trong số đó cái nào còn chỗ / ở Hà Nội"),
+      đếm ("trong đó có bao nhiêu sự kiện") — chỉ khi lượt trước trả về đầy đủ các hàng.
+    Chọn theo thứ tự và sắp xếp chỉ được trả lời khi câu hỏi không nêu đối tượng mới ("của tổ chức ABC",
+    "các tổ chức"). Trả về None nếu không chắc câu hỏi nói về kết quả trước; khi đó pipeline xử lý như bình thường.
+    """
+
+    def __init__(self, max_list_items: int = 10):
+        self.max_list_items = max_list_items
+
+    def resolve(self, question: str, previous: SessionTurn) -> Optional[FollowUpAnswer]:
+        rows = previous.rows
+        folded = normalize_question(question)
+        if not rows or not folded:
+            return None
+        padded = f" {folded} "
+
+        if _SORT_RE.search(folded):
+            return self._sort(padded, previous)
+
+        ordinal = _ORDINAL_RE.search(folded) if not _WEEKDAY_RE.search(folded) else None
+        if ordinal:
+            return self._select(padded, ordinal, rows)
+
+        referenced = bool(_REFERENCE_RE.search(folded))
+        if referenced and previous.complete:
+            if _COUNT_RE.search(folded) and not any(_contains(padded, a.phrases) for a in _ATTRIBUTES):
+                return FollowUpAnswer('count', f"Danh sách trước có {len(rows)} kết quả.", rows)
+            filtered = self._filter(padded, folded, rows)
+            if filtered is not None:
+                return filtered
+
+        attribute = self._attribute(padded)
+        if attribute is None:
+            return None
+        if len(rows) == 1 and (referenced or self._is_bare(folded, attribute)):
+            return self._describe(attribute, rows[0], 'attribute')
+        if len(rows) <= self.max_list_items and self._is_bare(folded, attribute):
+            answers = [self._describe(attribute, row, 'attribute') for row in rows]
+            if any(answer is None for answer in answers):
+                return None
+            return FollowUpAnswer('attribute', "\n".join(f"- {a.response_text}" for a in answers), rows)
+        return None
+
+    @staticmethod
+    def _attribute(padded: str) -> Optional[_Attribute]:
+        return next((attribute for attribute in _ATTRIBUTES if _contains(padded, attribute.phrases)), None)
+
+    @staticmethod
+    def _is_bare(folded: str, attribute: _Attribute) -> bool:
+        """
+        Câu hỏi chỉ gồm cụm thuộc tính và từ đệm, không nêu đối tượng mới.
+        """
+        padded = f" {folded} "
+        for phrase in attribute.phrases:
+            padded = padded.replace(f" {phrase} ", " ")
+        return all(word in _FILLER_WORDS for word in padded.split())
+
+    @staticmethod
+    def _about_previous(text: str, phrases=()) -> bool:
+        """
+        Sau khi bỏ cụm chỉ danh sách trước ("trong số đó", ...) và các cụm `phrases`, chỉ còn từ trong
+        _LIST_WORDS: câu hỏi không nêu đối tượng mới.
+        """
+        padded = f" {_REFERENCE_RE.sub(' ', text)} "
+        for phrase in sorted(phrases, key=len, reverse=True):
+            padded = padded.replace(f" {phrase} ", " ")
+        return all(word in _LIST_WORDS for word in padded.split())
+
+    @staticmethod
+    def _describe(attribute: Optional[_Attribute], row: Dict[str, Any], kind: str,
+                  position: Optional[int] = None) -> Optional[FollowUpAnswer]:
+        name = _row_name(row)
+        if name is None:
+            return None
+        if attribute is None:
+            details = [f"{name}"]
+            if row.get('location'):
+                details.append(f"tại {row['location']}")
+            if row.get('start_date'):
+                details.append(f"bắt đầu {format_scalar(row['start_date'])}")
+            if _remaining(row) is not None:
+                details.append(f"còn {max(_remaining(row), 0)} chỗ")
+            prefix = f"Kết quả thứ {position}: " if position else ""
+            return FollowUpAnswer(kind, prefix + ", ".join(details) + ".", [row])
+        if any(row.get(column) is None for column in attribute.columns):
+            return None
+        return FollowUpAnswer(kind, attribute.render(name, row), [row])
+
+    def _select(self, padded: str, ordinal: re.Match, rows: List[Dict[str, Any]]) -> Optional[FollowUpAnswer]:
+        attribute = self._attribute(padded)
+        rest = f"{padded[:ordinal.start() + 1]} {padded[ordinal.end() + 1:]}"
+        if not self._about_previous(rest, attribute.phrases if attribute else ()):
+            return None
+        if ordinal.group(1) or ordinal.group(4):
+            word = ordinal.group(1) or ordinal.group(4)
+            position = int(word) if word.isdigit() else _ORDINALS[word]
+        elif ordinal.group(2):
+            position = 1
+        else:
+            position = len(rows)
+        if position < 1 or position > len(rows):
+            return FollowUpAnswer('select', f"Danh sách trước chỉ có {len(rows)} kết quả.", rows)
+        return self._describe(attribute, rows[position - 1], 'select', position)
+
+    def _sort(self, padded: str, previous: SessionTurn) -> Optional[FollowUpAnswer]:
+        if not previous.complete:
+            return None
+        for phrases, key, label, descending in _SORT_KEYS:
+            if not _contains(padded, phrases):
+                continue
+            if not self._about_previous(padded.strip(), ('sap xep',) + phrases + _SORT_DIRECTIONS):
+                return None
+            if _contains(padded, ('giam dan', 'nhieu nhat', 'muon nhat', 'moi nhat')):
+                descending = True
+            elif _contains(padded, ('tang dan', 'it nhat', 'som nhat', 'cu nhat')):
+                descending = False
+            keyed = [(key(row), row) for row in previous.rows]
+            if any(value is None for value, _ in keyed):
+                return None
+            ordered = [row for _, row in sorted(keyed, key=lambda item: item[0], reverse=descending)]
+            header = f"Danh sách trước sắp xếp theo {label} ({'giảm dần' if descending else 'tăng dần'}):"
+            return FollowUpAnswer('sort', _list_text(header, ordered, self.max_list_items), ordered)
+        return None
+
+    def _filter(self, padded: str, folded: str, rows: List[Dict[str, Any]]) -> Optional[FollowUpAnswer]:
+        for phrases, predicate, label in _FILTERS:
+            if _contains(padded, phrases):
+                return self._filtered(rows, [row for row in rows if predicate(row)], label)
+
+        location = _LOCATION_FILTER_RE.search(folded)
+        if location and all('location' in row for row in rows):
+            place = location.group(1).strip()
+            matched = [row for row in rows if place in normalize_question(str(row.get('location') or ''))]
+            locations = {row['location'] for row in matched}
+            return self._filtered(rows, matched, f"ở {locations.pop() if len(locations) == 1 else place}")
+        return None
+
+    def _filtered(self, rows: List[Dict[str, Any]], matched: List[Dict[str, Any]], label: str) -> FollowUpAnswer:
+        if not matched:
+            return FollowUpAnswer('filter', f"Không có kết quả nào trong danh sách trước {label}.", [])
+        header = f"Có {len(matched)}/{len(rows)} kết quả trong danh sách trước {label}:"
+        return FollowUpAnswer('filter', _list_text(header, matched, self.max_list_items), matched)
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from .metrics import metrics
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Gộp các lời gọi đồng thời có cùng khóa: lời gọi đầu tiên (leader) thực thi, các lời gọi đến
+    trong lúc leader đang chạy chờ và nhận chung kết quả (hoặc chung exception).
+    Không cache: khi leader xong, lời gọi kế tiếp với cùng khóa lại thực thi mới.
+
+    `do` dùng cho code đồng bộ (thread), `ado` cho coroutine (theo từng event loop).
+    Mỗi lời gọi được gộp tăng counter `metric_name`{mode=sync|async, **labels}.
+    """
+
+    def __init__(self, metric_name: str, labels: Optional[Dict[str, str]] = None):
+        self.metric_name = metric_name
+        self.labels = labels or {}
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._futures: Dict[Tuple[int, Hashable], asyncio.Future] = {}
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls) + len(self._futures)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+
+        if not leader:
+            metrics.inc(self.metric_name, labels=dict(self.labels, mode='sync'))
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    async def ado(self, key: Hashable, coro_fn: Callable[[], Awaitable[Any]]) -> Any:
+        loop = asyncio.get_running_loop()
+        loop_key = (id(loop), key)
+        with self._lock:
+            future = self._futures.get(loop_key)
+            leader = future is None
+            if leader:
+                future = self._futures[loop_key] = loop.create_future()
+
+        if not leader:
+            metrics.inc(self.metric_name, labels=dict(self.labels, mode='async'))
+            return await asyncio.shield(future)
+
+        try:
+            result = await coro_fn()
+        except BaseException as e:
+            error = e if not isinstance(e, asyncio.CancelledError) else RuntimeError("Coalesced LLM call was cancelled.")
+            future.set_exception(error)
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._futures.pop(loop_key, None)
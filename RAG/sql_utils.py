@@ -1,12 +1,9 @@
-import os
-import traceback
-from typing import List, Dict, Any, Tuple, Union
+from typing import Tuple
 
 import sqlparse
-from sqlparse.sql import Identifier, IdentifierList, Parenthesis, Function, TokenList
-from sqlparse.tokens import Keyword, DML, Punctuation
+from sqlparse.tokens import Keyword
 
-from .constants import ALLOWED_TABLES
+from .sql_validator import default_validator
 
 
 def clean_sql_query(sql: str) -> str:
@@ -28,182 +25,40 @@ def clean_sql_query(sql: str) -> str:
     return sql_cleaned
 
 
-def is_valid_sql(sql_cleaned: str) -> bool:
+def apply_row_limit(sql_cleaned: str, max_rows: int) -> Tuple[str, bool]:
     """
-    *** KIỂM TRA TÍNH AN TOÀN VÀ QUYỀN TRUY CẬP CỦA Câu lệnh SQL (Đơn giản hóa mới, CÓ DEBUG LOG) ***
-    Chỉ kiểm tra các BẢNG/VIEWS được phép truy vấn và các lệnh nguy hiểm.
-    Sử dụng sqlparse để kiểm tra bảng được tham chiếu bằng cách lấy tên thật từ Identifier, bỏ qua bí danh.
+    Thêm LIMIT vào câu SELECT đã xác thực nếu câu lệnh cấp ngoài cùng chưa có LIMIT,
+    hoặc hạ LIMIT hiện có xuống `max_rows` nếu nó lớn hơn.
+    Trả về (sql, limit_applied) với limit_applied=True khi số hàng bị giới hạn bởi `max_rows`.
     """
-    print(f"DEBUG VALIDATION: Starting validation for: {sql_cleaned}")
-
-    if not isinstance(sql_cleaned, str) or not sql_cleaned.strip():
-        print(f"Blocked SQL (empty or invalid input after cleaning): {sql_cleaned}")
-        return False
-
-    sql_lower = sql_cleaned.lower().strip()
-    forbidden_keywords_or_patterns = [
-        ' insert ', ' update ', ' delete ', ' alter ', ' create ', ' drop ',
-        ' truncate ', ' replace ', ' grant ', ' revoke ', '--', '/*', '*/',
-        ' union', ' into ', ' outfile ', ' dumpfile '
-    ]
-    if any(keyword in sql_lower for keyword in forbidden_keywords_or_patterns):
-        print(f"Blocked SQL (contains forbidden parts): {sql_cleaned}")
-        return False
-
-    if ';' in sql_cleaned.strip(' ;'):
-        print(f"Blocked SQL (multiple statements detected): {sql_cleaned}")
-        return False
-
-    try:
-        statements = sqlparse.parse(sql_cleaned)
-        if len(statements) != 1:
-            print(f"Blocked SQL (sqlparse check: expected 1 statement, got {len(statements)}): {sql_cleaned}")
-            return False
-
-        statement = statements[0]
-
-        if statement.get_type() != 'SELECT':
-            print(
-                f"Blocked SQL (sqlparse check: statement type is not SELECT): {sql_cleaned} - Type: {statement.get_type()}")
-            return False
-
-        referenced_table_names_lower = set()
-        iterator = iter(statement.tokens)
-        print("DEBUG VALIDATION: Iterating tokens to find FROM/JOIN...")
-        try:
-            while True:
-                token = next(iterator)
-
-                if token.is_whitespace: continue
-
-                if token.ttype is Keyword and token.value.upper() in ['FROM', 'JOIN']:
-                    print(
-                        f"DEBUG VALIDATION: Found keyword {token.value.upper()}. Looking for next token...")
-
-                    next_token = None
-                    try:
-
-                        while True:
-                            next_token = next(iterator)
-                            if not next_token.is_whitespace:
-                                print(
-                                    f"DEBUG VALIDATION: Found next token after {token.value.upper()}: Type={type(next_token)}, TType={next_token.ttype}, Value='{next_token.value}'")
-                                break
-                        if next_token is None:
-                            print(f"DEBUG VALIDATION: StopIteration before finding next token.")
-                            return False
-                    except StopIteration:
-                        print(
-                            f"DEBUG VALIDATION: StopIteration after {token.value.upper()}. No table name found.")
-                        print(f"Blocked SQL (sqlparse check: missing table/view name after FROM/JOIN): {sql_cleaned}")
-                        return False
-
-                    names_to_add = set()
-
-                    print(
-                        f"DEBUG VALIDATION: Processing token immediately after FROM/JOIN: Type={type(next_token)}, TType={next_token.ttype}, Value='{next_token.value}'")
-
-                    if isinstance(next_token, Identifier):
-
-                        real_name = next_token.get_name()
-                        print(f"DEBUG VALIDATION:   Is Identifier. get_name()='{real_name}'")
-                        if real_name:
-                            names_to_add.add(real_name.lower())
-                            print(f"DEBUG VALIDATION:   Added '{real_name.lower()}' to names_to_add.")
-
-                        continue
-
-                    elif isinstance(next_token, IdentifierList):
-
-                        print(f"DEBUG VALIDATION:   Is IdentifierList. Iterating its tokens...")
-
-                        for list_token in next_token.tokens:
-                            print(
-                                f"DEBUG VALIDATION:     Processing token in IdentifierList: Type={type(list_token)}, TType={list_token.ttype}, Value='{list_token.value}'")
-
-                            if list_token.is_whitespace or list_token.ttype in (
-                                    sqlparse.tokens.Punctuation, sqlparse.tokens.Keyword):
-                                continue
+    sql_stripped = sql_cleaned.strip().rstrip(';').rstrip()
+    if max_rows <= 0:
+        return sql_stripped, False
 
-                            if isinstance(list_token, Identifier):
-                                real_name = list_token.get_name()
-                                print(
-                                    f"DEBUG VALIDATION:       Found Identifier in list '{list_token.value}'. get_name()='{real_name}'")
+    statement = sqlparse.parse(sql_stripped)[0]
+    tokens = [token for token in statement.tokens if not token.is_whitespace]
 
-                                if real_name:
-                                    names_to_add.add(real_name.lower())
-                                    print(
-                                        f"DEBUG VALIDATION:       Added '{real_name.lower()}' to names_to_add.")
+    for index, token in enumerate(tokens):
+        if token.ttype is Keyword and token.normalized == 'LIMIT':
+            limit_value = tokens[index + 1].value if index + 1 < len(tokens) else ''
+            if limit_value.isdigit() and int(limit_value) > max_rows and index + 2 == len(tokens):
+                prefix = sql_stripped[:sql_stripped.rfind(limit_value)].rstrip()
+                return f"{prefix} {max_rows}", True
+            return sql_stripped, False
 
+    return f"{sql_stripped} LIMIT {max_rows}", True
 
-                    elif isinstance(next_token, Parenthesis):
 
-                        print(
-                            f"DEBUG VALIDATION:   Found Parenthesis after FROM/JOIN. Skipping table extraction from complex structure.")
-                        pass
-
-                    referenced_table_names_lower.update(names_to_add)
-                    print(
-                        f"DEBUG VALIDATION: Current referenced_table_names_lower after processing next_token: {referenced_table_names_lower}")
-
-
-
-
-
-
-
-
-        except StopIteration:
-
-            print("DEBUG VALIDATION: StopIteration reached.")
-            pass
-        except Exception as e:
-            print(f"DEBUG VALIDATION: Error during table/view extraction loop: {e}")
-            print(f"Blocked SQL (sqlparse check: error during table/view extraction): {sql_cleaned} - {e}")
-            traceback.print_exc()
-            return False
-
-        print(
-            f"DEBUG VALIDATION: Final referenced_table_names_lower before check: {referenced_table_names_lower}")
-        for table_name in referenced_table_names_lower:
-
-            if table_name not in ALLOWED_TABLES:
-                print(f"Blocked SQL (sqlparse check: accesses disallowed table/view '{table_name}'): {sql_cleaned}")
-                return False
-
-        print(f"SQL validation passed (sqlparse check on allowed tables/views): {sql_cleaned}")
-        return True
-
-    except Exception as e:
-        print(f"DEBUG VALIDATION: Error during initial sqlparse parsing/checking: {e}")
-        print(f"Blocked SQL (sqlparse check: error during parsing/checking): {sql_cleaned} - {e}")
-        traceback.print_exc()
-        return False
-
-
-def format_results(results: List[Dict[str, Any]]) -> str:
+def is_valid_sql(sql_cleaned: str) -> bool:
     """
-    Định dạng kết quả từ DB (List of Dict) thành chuỗi văn bản dạng bảng.
-    Hàm này nhận kết quả TRỰC TIẾP TỪ DB.
+    *** KIỂM TRA TÍNH AN TOÀN VÀ QUYỀN TRUY CẬP CỦA Câu lệnh SQL ***
+    Chỉ cho phép một câu SELECT trên các BẢNG/VIEWS trong ALLOWED_TABLES, không chạm cột trong BLACKLISTED_COLUMNS.
+    Việc kiểm tra do SqlValidator thực hiện (duyệt cây sqlparse một lần, gồm cả subquery/CTE/bí danh,
+    kết quả được ghi nhớ theo hash của câu SQL).
     """
-    if not results: return "Không có kết quả từ database."
-    max_rows_for_llm = 15
-    display_results = results[:max_rows_for_llm]
-    formatted_string = "Results:\n"
-    columns = list(display_results[0].keys())
-    formatted_string += "| " + " | ".join(columns) + " |\n"
-    col_widths = [max(len(col), 3) for col in columns]
-    formatted_string += "|-" + "-|-".join(['-' * width for width in col_widths]) + "-|\n"
-
-    for row_dict in display_results:
-        row_values = []
-        for col in columns:
-            value = str(row_dict.get(col, 'NULL')) if row_dict.get(col) is not None else 'NULL'
-            value = value.replace('|', '-')
-            row_values.append(value)
-        formatted_string += "| " + " | ".join(row_values) + " |\n"
-
-    if len(results) > max_rows_for_llm:
-        formatted_string += f"(... {len(results) - max_rows_for_llm} hàng khác bị ẩn ...)\n"
-
-    return formatted_string
+    valid, reason = default_validator.validate(sql_cleaned)
+    if valid:
+        print(f"SQL validation passed (allowed tables/views and columns): {sql_cleaned}")
+    else:
+        print(f"Blocked SQL ({reason}): {sql_cleaned}")
+    return valid
@@ -0,0 +1,265 @@
+import hashlib
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+import sqlparse
+from sqlparse.sql import Identifier, IdentifierList, Parenthesis, Function, TokenList
+from sqlparse.tokens import Comment, Keyword, DML, DDL, Name, Punctuation, Wildcard
+
+from .constants import ALLOWED_TABLES, BLACKLISTED_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+_FORBIDDEN_PATTERN_RE = re.compile(
+    r"--|/\*|\*/|\b(insert|update|delete|alter|create|drop|truncate|replace|grant|revoke|union|into|outfile|dumpfile)\b",
+    re.IGNORECASE,
+)
+# Chuỗi literal đóng đủ và không có backslash ('Youth union', '%update%'). Literal chứa backslash hoặc chưa đóng
+# khớp nhánh cuối, nuốt tới hết câu và được giữ nguyên: cách driver hiểu escape có thể khác sqlparse.
+_STRING_LITERAL_RE = re.compile(r"'(?:[^'\\]|'')*'|\"(?:[^\"\\]|\"\")*\"|['\"].*", re.DOTALL)
+_FORBIDDEN_KEYWORDS = {
+    'INSERT', 'UPDATE', 'DELETE', 'ALTER', 'CREATE', 'DROP', 'TRUNCATE', 'REPLACE',
+    'GRANT', 'REVOKE', 'UNION', 'UNION ALL', 'INTO', 'OUTFILE', 'DUMPFILE',
+}
+
+
+def _blank_literals(sql: str) -> str:
+    """
+    Thay nội dung chuỗi literal bằng chuỗi rỗng trước khi quét từ khóa cấm, để tên chứa 'union', 'update'...
+    không bị từ chối; từ khóa thật vẫn bị bắt ở đây và khi duyệt cây cú pháp.
+    """
+    def blank(match: re.Match) -> str:
+        literal = match.group(0)
+        closed = len(literal) >= 2 and literal[-1] == literal[0] and '\\' not in literal
+        return literal[0] * 2 if closed else literal
+
+    return _STRING_LITERAL_RE.sub(blank, sql)
+
+
+def _is_subquery(token) -> bool:
+    return isinstance(token, Parenthesis) and any(child.ttype in DML for child in token.tokens)
+
+
+class _References:
+    """
+    Các tham chiếu thu thập được trong một lần duyệt cây cú pháp.
+    """
+
+    def __init__(self):
+        self.tables: Set[str] = set()
+        self.cte_names: Set[str] = set()
+        self.aliases: Dict[str, Optional[str]] = {}
+        self.columns: Set[Tuple[Optional[str], str]] = set()
+        self.error: Optional[str] = None
+        self._prev_leaves = [None, None]
+
+    def push_leaf(self, token) -> None:
+        self._prev_leaves = [self._prev_leaves[1], token]
+
+    def qualifier_for_next_name(self) -> Optional[str]:
+        before_dot, dot = self._prev_leaves
+        if dot is not None and dot.ttype is Punctuation and dot.value == '.' \
+                and before_dot is not None and before_dot.ttype in Name:
+            return before_dot.value.strip('`"').lower()
+        return None
+
+
+class SqlValidator:
+    """
+    Bộ xác thực SQL duyệt cây sqlparse đúng một lần:
+    - chỉ cho phép một câu SELECT (kể cả CTE `WITH ... SELECT`), không comment, không từ khóa nguy hiểm;
+    - thu thập mọi bảng/view được tham chiếu (FROM/JOIN, subquery, CTE, bí danh) và so với `allowed_tables`;
+    - thu thập mọi cột (kèm bí danh bảng) và so với `blacklisted_columns` (dạng 'events.approved'
+      áp dụng cho view 'events_view').
+    Kết quả được ghi nhớ theo hash của câu SQL.
+    """
+
+    def __init__(self, allowed_tables: Iterable[str] = ALLOWED_TABLES,
+                 blacklisted_columns: Iterable[str] = BLACKLISTED_COLUMNS, cache_size: int = 2048):
+        self.allowed_tables = {name.lower() for name in allowed_tables}
+        self.blacklisted_columns = {name.lower() for name in blacklisted_columns}
+        self.cache_size = cache_size
+
+        self._lock = threading.Lock()
+        self._verdicts: "OrderedDict[str, Tuple[bool, str]]" = OrderedDict()
+
+    def is_valid(self, sql_cleaned: str) -> bool:
+        return self.validate(sql_cleaned)[0]
+
+    def validate(self, sql_cleaned: str) -> Tuple[bool, str]:
+        """
+        Trả về (hợp lệ, lý do). Kết quả được cache theo SHA-256 của câu SQL.
+        """
+        if not isinstance(sql_cleaned, str) or not sql_cleaned.strip():
+            return False, "empty or invalid input after cleaning"
+
+        key = hashlib.sha256(sql_cleaned.encode('utf-8')).hexdigest()
+        with self._lock:
+            verdict = self._verdicts.get(key)
+            if verdict is not None:
+                self._verdicts.move_to_end(key)
+                return verdict
+
+        verdict = self._validate_uncached(sql_cleaned)
+
+        if self.cache_size > 0:
+            with self._lock:
+                self._verdicts[key] = verdict
+                while len(self._verdicts) > self.cache_size:
+                    self._verdicts.popitem(last=False)
+        return verdict
+
+    def _validate_uncached(self, sql_cleaned: str) -> Tuple[bool, str]:
+        scanned = _blank_literals(sql_cleaned)
+        forbidden = _FORBIDDEN_PATTERN_RE.search(scanned)
+        if forbidden:
+            return False, f"contains forbidden part '{forbidden.group(0)}'"
+
+        if ';' in scanned.strip(' ;\n\t'):
+            return False, "multiple statements detected"
+
+        try:
+            statements = [stmt for stmt in sqlparse.parse(sql_cleaned) if stmt.value.strip(' ;\n\t')]
+            if len(statements) != 1:
+                return False, f"expected 1 statement, got {len(statements)}"
+
+            statement = statements[0]
+            if statement.get_type() != 'SELECT':
+                return False, f"statement type is not SELECT ({statement.get_type()})"
+
+            refs = _References()
+            self._walk(statement, refs)
+        except Exception as e:
+            logger.debug("Error while walking SQL parse tree", exc_info=True)
+            return False, f"error during parsing/checking: {e}"
+
+        if refs.error:
+            return False, refs.error
+
+        logger.debug("Referenced tables=%s ctes=%s aliases=%s columns=%s",
+                     refs.tables, refs.cte_names, refs.aliases, refs.columns)
+
+        for table_name in refs.tables:
+            if table_name not in self.allowed_tables and table_name not in refs.cte_names:
+                return False, f"accesses disallowed table/view '{table_name}'"
+
+        physical_tables = {table for table in refs.tables if table in self.allowed_tables}
+        for qualifier, column in refs.columns:
+            if qualifier is not None:
+                candidate_tables = {refs.aliases.get(qualifier, qualifier)}
+            else:
+                candidate_tables = physical_tables
+            for table_name in candidate_tables:
+                if table_name and self._is_blacklisted(table_name, column):
+                    return False, f"accesses blacklisted column '{table_name}.{column}'"
+
+        return True, "ok"
+
+    def _is_blacklisted(self, table_name: str, column: str) -> bool:
+        base_name = table_name[:-len('_view')] if table_name.endswith('_view') else table_name
+        return f"{base_name}.{column}" in self.blacklisted_columns or f"{table_name}.{column}" in self.blacklisted_columns
+
+    def _walk(self, token_list: TokenList, refs: _References, in_function: bool = False) -> None:
+        expect_table = False
+        expect_cte = False
+
+        for token in token_list.tokens:
+            if refs.error:
+                return
+            if token.is_whitespace:
+                continue
+
+            if token.is_group:
+                if expect_cte and isinstance(token, (Identifier, IdentifierList)):
+                    self._collect_ctes(token, refs)
+                    expect_cte = False
+                elif expect_table and isinstance(token, (Identifier, IdentifierList, Parenthesis, Function)):
+                    self._collect_tables(token, refs)
+                    expect_table = False
+                else:
+                    child_in_function = isinstance(token, Function) or (in_function and not _is_subquery(token))
+                    self._walk(token, refs, child_in_function)
+                continue
+
+            ttype = token.ttype
+            if ttype in Comment:
+                refs.error = "contains comment"
+                return
+
+            if ttype in Keyword:
+                keyword = token.normalized
+                if ttype in DDL or (ttype in DML and keyword != 'SELECT') or keyword in _FORBIDDEN_KEYWORDS:
+                    refs.error = f"contains forbidden keyword '{keyword}'"
+                    return
+                expect_cte = keyword == 'WITH'
+                expect_table = not in_function and (keyword == 'FROM' or keyword.endswith('JOIN'))
+                refs.push_leaf(token)
+                continue
+
+            if ttype in Name:
+                if expect_table:
+                    refs.tables.add(token.value.strip('`"').lower())
+                    expect_table = False
+                else:
+                    refs.columns.add((refs.qualifier_for_next_name(), token.value.strip('`"').lower()))
+            elif ttype is not Wildcard and ttype is not Punctuation:
+                expect_table = False
+
+            refs.push_leaf(token)
+
+    def _collect_ctes(self, token, refs: _References) -> None:
+        identifiers = token.get_identifiers() if isinstance(token, IdentifierList) else [token]
+        for identifier in identifiers:
+            if not isinstance(identifier, Identifier):
+                continue
+            name = identifier.get_name()
+            if name:
+                refs.cte_names.add(name.lower())
+            for child in identifier.tokens:
+                if isinstance(child, Parenthesis):
+                    self._walk(child, refs)
+
+    def _collect_tables(self, token, refs: _References) -> None:
+        if isinstance(token, IdentifierList):
+            for child in token.tokens:
+                if isinstance(child, (Identifier, Parenthesis, Function)):
+                    self._collect_tables(child, refs)
+            return
+
+        if isinstance(token, Parenthesis):
+            self._walk(token, refs)
+            return
+
+        if isinstance(token, Function):
+            name = token.get_name()
+            refs.tables.add((name or token.value).lower())
+            return
+
+        subqueries = [child for child in token.tokens if isinstance(child, Parenthesis)]
+        alias = token.get_alias()
+        if subqueries:
+            for subquery in subqueries:
+                self._walk(subquery, refs)
+            if alias:
+                refs.aliases[alias.lower()] = None
+            return
+
+        if token.get_parent_name():
+            refs.error = f"schema-qualified table reference '{token.value}' is not allowed"
+            return
+
+        real_name = token.get_real_name()
+        if not real_name:
+            return
+        real_name = real_name.strip('`"').lower()
+        refs.tables.add(real_name)
+        if alias:
+            refs.aliases[alias.lower()] = real_name
+        refs.aliases.setdefault(real_name, real_name)
+        logger.debug("Table reference '%s' (alias=%s)", real_name, alias)
+
+
+default_validator = SqlValidator()
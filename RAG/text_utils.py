@@ -0,0 +1,30 @@
+import re
+import unicodedata
+
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]", re.UNICODE)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def fold_diacritics(text: str) -> str:
+    """
+    Bỏ dấu tiếng Việt (và các dấu kết hợp Unicode khác): "Hà Nội" -> "Ha Noi".
+    Chữ 'đ'/'Đ' không tách được bằng NFD nên được thay thủ công.
+    """
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize('NFD', text)
+    stripped = "".join(ch for ch in decomposed if unicodedata.category(ch) != 'Mn')
+    return stripped.replace('đ', 'd').replace('Đ', 'D')
+
+
+def normalize_question(question: str) -> str:
+    """
+    Chuẩn hóa câu hỏi để so khớp: chữ thường, bỏ dấu, bỏ dấu câu, gộp khoảng trắng.
+    "Các sự kiện nào sắp diễn ra?" -> "cac su kien nao sap dien ra"
+    """
+    if not isinstance(question, str):
+        return ""
+    text = fold_diacritics(question.lower())
+    text = _PUNCTUATION_RE.sub(" ", text).replace("_", " ")
+    return _WHITESPACE_RE.sub(" ", text).strip()
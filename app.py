@@ -1,23 +1,34 @@
+import gc
 import os
-from flask import Flask, request, jsonify
+import signal
+import uuid
+from flask import Flask, Response, request, jsonify, stream_with_context
 from dotenv import load_dotenv
 import traceback
 
 from RAG.service import DatabaseChatbotService
 from RAG.llm_client import LlmClient
+from RAG.llm_cache import PersistentLlmCache
+from RAG.llm_resilience import LlmCallPolicy
+from RAG.chat_pipeline import ChatPipeline
+from RAG.metrics import metrics
+from RAG.result_set import dumps_json
 
 from flask_cors import CORS
 
-from datetime import datetime
-
 load_dotenv()
 
 service: DatabaseChatbotService = None
 llm_client: LlmClient = None
+pipeline: ChatPipeline = None
 
 
-def main():
-    global service, llm_client
+def init_components() -> bool:
+    """
+    Khởi tạo LlmClient, DatabaseChatbotService và ChatPipeline (dùng chung cho Flask và ASGI).
+    Trả về False nếu khởi tạo thất bại.
+    """
+    global service, llm_client, pipeline
     print("Initializing components...")
 
     llm_api_key = os.getenv("GEMINI_API_KEY")
@@ -27,17 +38,20 @@ def main():
     if not llm_api_key:
         print("Error: GEMINI_API_KEY environment variable not set. Cannot initialize LLM Client.")
 
-        return
+        return False
 
     try:
 
-        llm_client = LlmClient(api_key=llm_api_key, model=llm_model)
+        llm_client = LlmClient(api_key=llm_api_key, model=llm_model,
+                               coalesce=os.getenv("LLM_COALESCE", "true").lower() in ("1", "true", "yes"),
+                               response_cache=PersistentLlmCache.from_env(),
+                               call_policy=LlmCallPolicy.from_env())
         print("LLM Client initialized successfully.")
     except Exception as e:
 
         print(f"Error initializing LLM Client: {e}")
         traceback.print_exc()
-        return
+        return False
 
     db_context_path = os.getenv("DB_CONTEXT_PATH", "./chatbot_core/db_context.txt")
 
@@ -51,145 +65,220 @@ def main():
     except Exception as e:
         print(f"Error initializing Database Chatbot Service: {e}")
         traceback.print_exc()
+        return False
+
+    if os.getenv("DB_WARM_UP", "true").lower() in ("1", "true", "yes"):
+        service.db_connector.warm_up()
+
+    pipeline = ChatPipeline(service=service, llm_client=llm_client)
+    return True
+
+
+def ensure_components() -> bool:
+    """
+    Khởi tạo component nếu chưa có (idempotent) và nạp sẵn schema, để khi chạy nhiều worker với
+    preload (xem gunicorn.conf.py) mọi thứ nặng chỉ được dựng một lần trong master rồi chia sẻ qua fork.
+    """
+    if pipeline is not None:
+        return True
+    if not init_components():
+        return False
+
+    service.schema_cache.get()
+    if service.db_connector.replica is not None:
+        service.db_connector.replica.refresh()
+    if service.name_index is not None:
+        service.name_index.refresh()
+    return True
+
+
+def start_background_refresh() -> None:
+    """
+    Khởi động các thread nền: làm mới schema và (nếu bật) bản sao cục bộ của các view, chỉ mục tên.
+    """
+    service.schema_cache.start_background_refresh()
+    if service.db_connector.replica is not None:
+        service.db_connector.replica.start_background_refresh()
+    if service.name_index is not None:
+        service.name_index.start_background_refresh()
+
+
+def stop_background_refresh() -> None:
+    service.schema_cache.stop_background_refresh()
+    if service.db_connector.replica is not None:
+        service.db_connector.replica.stop_background_refresh()
+    if service.name_index is not None:
+        service.name_index.stop_background_refresh()
+
+
+def prepare_for_fork() -> None:
+    """
+    Gọi trong master ngay trước khi fork worker: dừng các thread làm mới nền (thread không sống sót qua fork),
+    trả các kết nối DB của master, và đóng băng các object đã dựng (gc.freeze) để GC của worker
+    không chạm vào chúng, giữ được chia sẻ copy-on-write.
+    """
+    if service is not None:
+        stop_background_refresh()
+        service.db_connector.dispose()
+    gc.freeze()
+
+
+def reinit_after_fork() -> None:
+    """
+    Gọi trong mỗi worker ngay sau fork: tạo lại những gì không an toàn khi dùng chung giữa các process
+    (pool kết nối DB, kết nối SQLite của bản sao cục bộ, client Gemini, executor của LlmCallPolicy)
+    và khởi động lại các thread làm mới nền.
+    """
+    if service is None:
         return
+    service.db_connector.dispose_after_fork()
+    if service.db_connector.replica is not None:
+        service.db_connector.replica.reset_after_fork()
+    llm_client.reset_after_fork()
+    start_background_refresh()
+    print(f"Worker {os.getpid()} re-initialized after fork.")
+
+
+def create_app(background_refresh: bool = True) -> Flask:
+    """
+    App factory cho WSGI server (vd. `gunicorn wsgi:application`, xem gunicorn.conf.py).
+    Ném RuntimeError nếu khởi tạo component thất bại.
+    """
+    if not ensure_components():
+        raise RuntimeError("Component initialization failed.")
 
+    if background_refresh:
+        start_background_refresh()
+
+    return create_flask_app()
+
+
+def create_flask_app() -> Flask:
+    """
+    Tạo Flask app với các route /chat, /chat/batch, /chat/stream, /metrics và /admin/*,
+    dùng các component đã được init_components() khởi tạo.
+    """
     app = Flask(__name__)
 
     allowed_origins_str = os.getenv("ALLOWED_ORIGINS", "http://localhost:8000")
     allowed_origins = [origin.strip() for origin in allowed_origins_str.split(',')]
-    CORS(app, origins=allowed_origins)
+    CORS(app, origins=allowed_origins, expose_headers=['X-Request-ID'])
 
     print(f"CORS configured for origins: {allowed_origins}")
 
+    admin_token = os.getenv("ADMIN_TOKEN")
+
+    @app.route('/admin/schema/invalidate', methods=['POST'])
+    def invalidate_schema():
+
+        if not admin_token or request.headers.get('X-Admin-Token') != admin_token:
+            return jsonify({'status': 'forbidden'}), 403
+
+        service.invalidate_schema_cache()
+        if request.args.get('refresh') == '1':
+            service.schema_cache.refresh()
+
+        return jsonify({'status': 'ok', 'schema_fingerprint': service.schema_cache.fingerprint})
+
+    @app.route('/admin/cache/stats', methods=['GET'])
+    def cache_stats():
+
+        if not admin_token or request.headers.get('X-Admin-Token') != admin_token:
+            return jsonify({'status': 'forbidden'}), 403
+
+        result_cache = service.db_connector.result_cache
+        llm_cache = getattr(llm_client, 'response_cache', None)
+        replica = service.db_connector.replica
+        return jsonify({
+            'sql_cache': service.sql_cache.stats(),
+            'result_cache': result_cache.stats() if result_cache is not None else None,
+            'llm_cache': llm_cache.stats() if llm_cache is not None else None,
+            'replica': replica.stats() if replica is not None else None,
+            'name_index': service.name_index.stats() if service.name_index is not None else None,
+            'sessions': pipeline.sessions.stats() if pipeline.sessions is not None else None,
+        })
+
+    @app.route('/admin/pool/stats', methods=['GET'])
+    def pool_stats():
+
+        if not admin_token or request.headers.get('X-Admin-Token') != admin_token:
+            return jsonify({'status': 'forbidden'}), 403
+
+        return jsonify(service.db_connector.get_pool_stats())
+
+    @app.route('/admin/cache/invalidate', methods=['POST'])
+    def invalidate_result_cache():
+
+        if not admin_token or request.headers.get('X-Admin-Token') != admin_token:
+            return jsonify({'status': 'forbidden'}), 403
+
+        view_name = request.args.get('view') or (request.get_json(silent=True) or {}).get('view')
+        if not view_name:
+            return jsonify({'status': 'error', 'message': 'No view provided'}), 400
+
+        removed = service.db_connector.invalidate_results_for_view(view_name)
+        return jsonify({'status': 'ok', 'removed': removed})
+
     @app.route('/chat', methods=['POST'])
     def chat():
 
         user_message = request.json.get('message')
+        request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        session_id = request.json.get('session_id') or request.headers.get('X-Session-ID')
+
+        payload, status = pipeline.handle(user_message, request_id=request_id, session_id=session_id)
+        response = Response(dumps_json(payload), mimetype='application/json')
+        response.headers['X-Request-ID'] = request_id
+        return response, status
+
+    @app.route('/chat/batch', methods=['POST'])
+    def chat_batch():
+
+        messages = (request.get_json(silent=True) or {}).get('messages')
+        request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+
+        payload, status = pipeline.handle_batch(messages, request_id=request_id)
+        response = Response(dumps_json(payload), mimetype='application/json')
+        response.headers['X-Request-ID'] = request_id
+        return response, status
+
+    @app.route('/chat/stream', methods=['POST'])
+    def chat_stream():
+
+        user_message = request.json.get('message')
+        request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        session_id = request.json.get('session_id') or request.headers.get('X-Session-ID')
+
+        return Response(stream_with_context(pipeline.stream(user_message, request_id=request_id,
+                                                            session_id=session_id)),
+                        mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no',
+                                 'X-Request-ID': request_id})
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics_endpoint():
+
+        return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+    return app
+
+
+def main():
+    """
+    Chạy bằng development server của Flask (một process). Khi triển khai dùng `gunicorn wsgi:application`.
+    """
+    try:
+        app = create_app()
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        return
+
+    if hasattr(signal, 'SIGHUP'):
+        def handle_sighup(signum, frame):
+            print("Received SIGHUP, invalidating schema cache...")
+            service.invalidate_schema_cache()
 
-        if not user_message:
-            return jsonify({'response_text': 'No message provided', 'query_results_data': []}), 400
-
-        print(f"Received message: '{user_message}'")
-
-        process_result = service.process_query(user_message)
-
-        if len(process_result) == 1:
-            error_message = process_result[0]
-            print(f"Processing failed in step 1: {error_message}")
-            return jsonify({'response_text': error_message, 'query_results_data': []})
-        else:
-            sql_cleaned = process_result[0]
-            raw_results_list = process_result[1]
-            formatted_results_table_string = process_result[2]
-            print(f"Processing step 1 successful. Calling LLM for friendly response...")
-
-            if llm_client is None:
-                print("Error: LLM Client not initialized for friendly response generation.")
-                return jsonify(
-                    {'response_text': "Xin lỗi, hệ thống xử lý phản hồi gặp sự cố nội bộ.", 'query_results_data': []})
-
-            prompt_friendly_response = f"""
-              You are a helpful assistant synthesizing information from a database query result for a user.
-              Based on the user's original question, the SQL query executed, and the results obtained from the database,
-              create a **concise**, friendly, and easy-to-understand natural language response in Vietnamese
-              that directly answers the user's original question.
-
-              --- Instructions for Friendly Response ---
-              - The response must be in Vietnamese.
-              - Be **concise** and to the point. Avoid unnecessary details.
-              - If the database results list multiple items (e.g., a list of events), **summarize them briefly**.
-              - **When listing multiple events**, focus on key identifying information like the **event name** and **location**. Avoid including full descriptions, exact start/end dates and times, or detailed quantity numbers for each item within the text response, as the user's frontend will handle displaying the detailed data separately.
-              - If the database results are empty, clearly state that no results were found for their query based on the available information.
-              - Do NOT include the SQL query or the raw table results in your final answer.
-
-              User's original question: {user_message}
-              Executed SQL query: ```sql
-              {sql_cleaned}
-              ```
-              Database Results:
-              ```
-              {formatted_results_table_string}
-              ```
-
-              Friendly natural language response:
-              """
-            try:
-
-                final_response_text = llm_client.generate_text(prompt_friendly_response)
-                print(f"Final friendly response from LLM: {final_response_text}")
-
-                query_results_data = []
-
-                if raw_results_list:
-
-                    for row in raw_results_list:
-
-                        item_data_standardized = {}
-
-                        key_mapping = {
-                            'id': ['event_id', 'result_id'],
-                            'name': ['name', 'event_name'],
-                            'description': ['description', 'event_description'],
-                            'location': ['location'],
-                            'start_date': ['start_date'],
-                            'end_date': ['end_date'],
-                            'quantity_now': ['quantity_now'],
-                            'max_quantity': ['max_quantity'],
-                            'image': ['image', 'event_image'],
-                            'organization_name': ['username', 'organization_name'],
-
-                            'result_id': ['result_id'],
-                            'result_description': ['content', 'result_description'],
-                            'result_image': ['images', 'result_image'],
-
-                            'related_event_id': ['event_id'],
-                            'related_event_name': ['name', 'event_name'],
-                            'related_event_description': ['description', 'event_description'],
-                            'related_event_image': ['image', 'event_image'],
-                        }
-
-                        for standardized_key, possible_raw_keys in key_mapping.items():
-                            for raw_key in possible_raw_keys:
-                                if raw_key in row:
-                                    value = row[raw_key]
-
-                                    if isinstance(value, datetime):
-                                        try:
-
-                                            item_data_standardized[standardized_key] = value.isoformat()
-                                        except Exception as date_e:
-                                            print(
-                                                f"Warning: Could not format date {standardized_key} ({raw_key}) {value}: {date_e}")
-                                            item_data_standardized[standardized_key] = str(value)
-                                    else:
-
-                                        item_data_standardized[standardized_key] = value
-                                    break
-
-                        if 'result_id' in row or item_data_standardized.get('result_id') is not None:
-                            item_data_standardized['type'] = 'result'
-                        elif 'event_id' in row or item_data_standardized.get('id') is not None:
-                            item_data_standardized['type'] = 'event'
-                        else:
-                            item_data_standardized['type'] = 'unknown'
-
-                        if item_data_standardized:
-                            query_results_data.append(item_data_standardized)
-
-                    print(f"Data for frontend (query_results_data): {query_results_data}")
-
-                return jsonify({
-                    'response_text': final_response_text,
-                    'query_results_data': query_results_data
-                })
-
-            except Exception as e:
-
-                print(f"Error calling LLM (Friendly Response Generation) or processing results for data: {e}")
-                traceback.print_exc()
-
-                return jsonify({'response_text': "Xin lỗi, tôi gặp sự cố khi tạo phản hồi hoặc xử lý kết quả.",
-                                'query_results_data': []})
+        signal.signal(signal.SIGHUP, handle_sighup)
 
     app.run(debug=False, host='127.0.0.1', port=5000)
 
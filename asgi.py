@@ -0,0 +1,200 @@
+"""
+Điểm vào ASGI cho /chat, chạy toàn bộ pipeline bằng async (agenerate_text / aprocess_query)
+để một process giữ được hàng trăm hội thoại đang chờ Gemini mà không cần hàng trăm thread.
+
+Routes: POST /chat (JSON), POST /chat/batch (JSON, nhiều câu hỏi), POST /chat/stream (Server-Sent Events), GET /metrics (Prometheus).
+
+Chạy:
+    uvicorn asgi:application --host 127.0.0.1 --port 5000
+
+Nhiều worker (component được dựng một lần trong master rồi fork, xem gunicorn.conf.py):
+    GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn asgi:application
+"""
+import json
+import os
+import traceback
+import uuid
+
+import app as flask_app
+from RAG.metrics import metrics
+from RAG.result_set import dumps_json
+
+
+allowed_origins_str = os.getenv("ALLOWED_ORIGINS", "http://localhost:8000")
+allowed_origins = {origin.strip() for origin in allowed_origins_str.split(',')}
+
+
+def _request_id(scope) -> str:
+    for name, value in scope.get('headers', []):
+        if name == b'x-request-id':
+            return value.decode('latin-1')
+    return uuid.uuid4().hex
+
+
+def _session_id(scope, request_json: dict):
+    if request_json.get('session_id'):
+        return request_json['session_id']
+    for name, value in scope.get('headers', []):
+        if name == b'x-session-id':
+            return value.decode('latin-1')
+    return None
+
+
+def _cors_headers(scope) -> list:
+    origin = None
+    for name, value in scope.get('headers', []):
+        if name == b'origin':
+            origin = value.decode('latin-1')
+            break
+    if origin and origin in allowed_origins:
+        return [
+            (b'access-control-allow-origin', origin.encode('latin-1')),
+            (b'access-control-expose-headers', b'X-Request-ID'),
+            (b'vary', b'Origin'),
+        ]
+    return []
+
+
+async def _read_body(receive) -> bytes:
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+    return body
+
+
+async def _send_json(send, scope, payload, status: int = 200, request_id: str = None) -> None:
+    body = dumps_json(payload).encode('utf-8')
+    headers = [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode('ascii')),
+    ] + _cors_headers(scope)
+    if request_id:
+        headers.append((b'x-request-id', request_id.encode('latin-1')))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _lifespan(receive, send) -> None:
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            if flask_app.ensure_components():
+                flask_app.start_background_refresh()
+                await send({'type': 'lifespan.startup.complete'})
+            else:
+                await send({'type': 'lifespan.startup.failed', 'message': 'Component initialization failed.'})
+        elif message['type'] == 'lifespan.shutdown':
+            if flask_app.service is not None:
+                flask_app.stop_background_refresh()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def _chat(scope, receive, send) -> None:
+    try:
+        request_json = json.loads(await _read_body(receive) or b'{}')
+    except ValueError:
+        await _send_json(send, scope, {'response_text': 'Invalid JSON body', 'query_results_data': []}, 400)
+        return
+
+    request_id = _request_id(scope)
+    try:
+        payload, status = await flask_app.pipeline.ahandle(request_json.get('message'), request_id=request_id,
+                                                            session_id=_session_id(scope, request_json))
+    except Exception as e:
+        print(f"Unhandled error in async /chat: {e}")
+        traceback.print_exc()
+        payload, status = {'response_text': "Xin lỗi, hệ thống xử lý phản hồi gặp sự cố nội bộ.",
+                           'query_results_data': []}, 500
+
+    await _send_json(send, scope, payload, status, request_id)
+
+
+async def _chat_batch(scope, receive, send) -> None:
+    try:
+        request_json = json.loads(await _read_body(receive) or b'{}')
+    except ValueError:
+        await _send_json(send, scope, {'response_text': 'Invalid JSON body', 'results': []}, 400)
+        return
+
+    request_id = _request_id(scope)
+    try:
+        payload, status = await flask_app.pipeline.ahandle_batch(request_json.get('messages'), request_id=request_id)
+    except Exception as e:
+        print(f"Unhandled error in async /chat/batch: {e}")
+        traceback.print_exc()
+        payload, status = {'response_text': "Xin lỗi, hệ thống xử lý phản hồi gặp sự cố nội bộ.", 'results': []}, 500
+
+    await _send_json(send, scope, payload, status, request_id)
+
+
+async def _chat_stream(scope, receive, send) -> None:
+    try:
+        request_json = json.loads(await _read_body(receive) or b'{}')
+    except ValueError:
+        await _send_json(send, scope, {'response_text': 'Invalid JSON body', 'query_results_data': []}, 400)
+        return
+
+    request_id = _request_id(scope)
+    headers = [
+        (b'content-type', b'text/event-stream; charset=utf-8'),
+        (b'cache-control', b'no-cache'),
+        (b'x-accel-buffering', b'no'),
+        (b'x-request-id', request_id.encode('latin-1')),
+    ] + _cors_headers(scope)
+    await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+
+    try:
+        async for event in flask_app.pipeline.astream(request_json.get('message'), request_id=request_id,
+                                                       session_id=_session_id(scope, request_json)):
+            await send({'type': 'http.response.body', 'body': event.encode('utf-8'), 'more_body': True})
+    except Exception as e:
+        print(f"Unhandled error in async /chat/stream: {e}")
+        traceback.print_exc()
+
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def application(scope, receive, send) -> None:
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+
+    if scope['type'] != 'http':
+        return
+
+    path = scope['path']
+    method = scope['method']
+
+    if method == 'OPTIONS':
+        headers = _cors_headers(scope) + [
+            (b'access-control-allow-methods', b'POST, OPTIONS'),
+            (b'access-control-allow-headers', b'Content-Type, X-Session-ID, X-Request-ID'),
+        ]
+        await send({'type': 'http.response.start', 'status': 204, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+
+    if path == '/chat' and method == 'POST':
+        await _chat(scope, receive, send)
+        return
+
+    if path == '/chat/batch' and method == 'POST':
+        await _chat_batch(scope, receive, send)
+        return
+
+    if path == '/chat/stream' and method == 'POST':
+        await _chat_stream(scope, receive, send)
+        return
+
+    if path == '/metrics' and method == 'GET':
+        body = metrics.render_prometheus().encode('utf-8')
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'text/plain; version=0.0.4; charset=utf-8')]})
+        await send({'type': 'http.response.body', 'body': body})
+        return
+
+    await _send_json(send, scope, {'status': 'not_found'}, 404)
@@ -0,0 +1,5 @@
+"""
+Benchmark offline cho chatbot (không cần mạng, không cần MySQL hay Gemini).
+
+Chạy từng benchmark bằng `python -m benchmarks.<tên_module>` từ thư mục gốc của repo.
+"""
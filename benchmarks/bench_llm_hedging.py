@@ -0,0 +1,107 @@
+"""
+Độ trễ đuôi của LlmClient với FakeChatModel (đuôi chậm + lỗi tạm thời tiêm vào) dưới các chính sách:
+không có chính sách, timeout + thử lại, và thêm hedging theo p95 quan sát được.
+
+    python -m benchmarks.bench_llm_hedging --calls 400 --concurrency 20 --slow-probability 0.05
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from RAG.llm_client import LlmClient
+from RAG.llm_resilience import LlmCallPolicy, RetryBudget
+from RAG.metrics import metrics
+from benchmarks.fake_chat_model import FakeChatModel
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def _run(client: LlmClient, calls: int, concurrency: int, mode: str):
+    latencies: List[float] = []
+    errors = 0
+
+    def one(i: int) -> Optional[float]:
+        started = time.perf_counter()
+        try:
+            client.generate_text(f"prompt {i}")
+        except Exception:
+            return None
+        return time.perf_counter() - started
+
+    async def aone(i: int, semaphore: asyncio.Semaphore) -> Optional[float]:
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await client.agenerate_text(f"prompt {i}")
+            except Exception:
+                return None
+            return time.perf_counter() - started
+
+    async def run_async():
+        semaphore = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*(aone(i, semaphore) for i in range(calls)))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == 'sync':
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                results = list(executor.map(one, range(calls)))
+        else:
+            results = asyncio.run(run_async())
+
+    for result in results:
+        if result is None:
+            errors += 1
+        else:
+            latencies.append(result)
+    return sorted(latencies), errors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--calls', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--mode', choices=('sync', 'async'), default='async')
+    parser.add_argument('--base-ms', type=float, default=100.0)
+    parser.add_argument('--slow-ms', type=float, default=1500.0)
+    parser.add_argument('--slow-probability', type=float, default=0.05)
+    parser.add_argument('--error-probability', type=float, default=0.02)
+    parser.add_argument('--timeout', type=float, default=5.0)
+    args = parser.parse_args()
+
+    policies = [
+        ("no policy", None),
+        ("timeout + retries", lambda: LlmCallPolicy(timeout_seconds=args.timeout, max_retries=2,
+                                                    backoff_base_seconds=0.05, retry_budget=RetryBudget())),
+        ("+ hedge at p95", lambda: LlmCallPolicy(timeout_seconds=args.timeout, max_retries=2,
+                                                 backoff_base_seconds=0.05, retry_budget=RetryBudget(),
+                                                 hedge_after='p95', hedge_min_seconds=0.0)),
+    ]
+
+    print(f"{args.calls} calls, concurrency {args.concurrency}, mode {args.mode}, base {args.base_ms}ms, "
+          f"slow +{args.slow_ms}ms @ {args.slow_probability:.0%}, errors @ {args.error_probability:.0%}")
+    print(f"  {'policy':<20}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}{'attempts':>10}"
+          f"{'hedges':>8}{'won':>6}")
+    for label, make_policy in policies:
+        metrics.reset()
+        model = FakeChatModel(base_ms=args.base_ms, jitter_ms=args.base_ms / 4, slow_ms=args.slow_ms,
+                              slow_probability=args.slow_probability, error_probability=args.error_probability)
+        client = LlmClient(api_key='', model='fake', coalesce=False,
+                           call_policy=make_policy() if make_policy else None, chat_model=model)
+        latencies, errors = _run(client, args.calls, args.concurrency, args.mode)
+
+        hedges_won = metrics.counter_value('llm_hedges_total', {'outcome': 'won'})
+        hedges = hedges_won + metrics.counter_value('llm_hedges_total', {'outcome': 'lost'})
+        print(f"  {label:<20}{_percentile(latencies, 0.5) * 1000:>9.1f}{_percentile(latencies, 0.95) * 1000:>9.1f}"
+              f"{_percentile(latencies, 0.99) * 1000:>9.1f}{errors:>8}{model.calls:>10}{hedges:>8.0f}{hedges_won:>6.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+So sánh kết quả truy vấn dạng list-of-dict (mỗi hàng một dict) với ResultSet (header + tuple):
+bộ nhớ giữ kết quả, thời gian dựng từ hàng DB, render bảng cho prompt LLM (tất cả các hàng),
+và đường payload frontend (chuẩn hóa + mã hóa JSON).
+
+    python -m benchmarks.bench_result_set --rows 100000 --repeat 3
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from RAG.result_set import ResultSet, dumps_json
+from RAG.row_normalizer import RowNormalizer
+from benchmarks.legacy_result_format import legacy_format_results
+
+
+COLUMNS = ('event_id', 'name', 'description', 'location', 'start_date', 'end_date', 'quantity_now',
+           'max_quantity', 'image', 'username')
+
+
+def _db_rows(count: int):
+    """
+    Các hàng như cursor trả về (list, để cả hai cách dựng đều phải cấp phát vùng chứa riêng).
+    """
+    start = datetime(2025, 1, 1, 8, 0, 0)
+    description = "Mô tả chi tiết sự kiện. " * 4
+    return [[f"evt-{i}", f"Sự kiện {i}", description, 'Hà Nội', start + timedelta(hours=i),
+             start + timedelta(hours=i + 5), i % 50, 50, f"https://img.example.org/{i}.png", 'clb-tinh-nguyen']
+            for i in range(count)]
+
+
+def _as_dicts(db_rows):
+    return [dict(zip(COLUMNS, row)) for row in db_rows]
+
+
+def _as_result_set(db_rows):
+    return ResultSet(COLUMNS, [tuple(row) for row in db_rows])
+
+
+def _retained_bytes(build, db_rows) -> int:
+    gc.collect()
+    tracemalloc.start()
+    result = build(db_rows)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return retained
+
+
+def _best_of(func, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _legacy_payload(normalizer, rows):
+    return json.dumps({'query_results_data': normalizer.normalize(rows)}, ensure_ascii=False, default=str)
+
+
+def _columnar_payload(normalizer, rows):
+    return dumps_json({'query_results_data': normalizer.normalize(rows)})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    db_rows = _db_rows(args.rows)
+    dicts = _as_dicts(db_rows)
+    result_set = _as_result_set(db_rows)
+    normalizer = RowNormalizer()
+
+    # Chỉ dòng phân cách header khác nhau (render_table bỏ phép tính độ rộng cột vô tác dụng).
+    legacy_lines = legacy_format_results(dicts, max_rows_for_llm=args.rows).splitlines()
+    table_lines = result_set.render_table(max_rows=args.rows).splitlines()
+    if legacy_lines[:2] + legacy_lines[3:] != table_lines[:2] + table_lines[3:]:
+        raise SystemExit("ResultSet.render_table output differs from legacy format_results")
+    if _legacy_payload(normalizer, dicts) != _columnar_payload(normalizer, result_set):
+        raise SystemExit("Columnar JSON payload differs from legacy json.dumps payload")
+
+    dict_bytes = _retained_bytes(_as_dicts, db_rows)
+    columnar_bytes = _retained_bytes(_as_result_set, db_rows)
+    print(f"{args.rows} rows x {len(COLUMNS)} columns (best of {args.repeat})")
+    print(f"  retained memory  list-of-dict {dict_bytes / 1e6:8.2f} MB   ResultSet {columnar_bytes / 1e6:8.2f} MB"
+          f"   x{dict_bytes / columnar_bytes:4.1f}")
+
+    stages = (
+        ("build from cursor rows", lambda: _as_dicts(db_rows), lambda: _as_result_set(db_rows)),
+        ("render table (all rows)", lambda: legacy_format_results(dicts, max_rows_for_llm=args.rows),
+         lambda: result_set.render_table(max_rows=args.rows)),
+        ("normalize + JSON payload", lambda: _legacy_payload(normalizer, dicts),
+         lambda: _columnar_payload(normalizer, result_set)),
+    )
+    for label, legacy, columnar in stages:
+        legacy_seconds = _best_of(legacy, args.repeat)
+        columnar_seconds = _best_of(columnar, args.repeat)
+        print(f"  {label:<26} list-of-dict {legacy_seconds * 1000:9.2f} ms   ResultSet {columnar_seconds * 1000:9.2f} ms"
+              f"   x{legacy_seconds / columnar_seconds:4.1f}")
+
+
+if __name__ == '__main__':
+    main()
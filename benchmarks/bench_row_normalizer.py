@@ -0,0 +1,63 @@
+"""
+So sánh chuẩn hóa kết quả cho frontend bằng RowNormalizer (kế hoạch chiếu biên dịch theo bộ cột)
+với vòng lặp standardize_results cũ (dựng lại key_mapping và dò từng khóa cho mỗi hàng).
+
+    python -m benchmarks.bench_row_normalizer --rows 10000 --repeat 5
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from RAG.row_normalizer import RowNormalizer
+from benchmarks.legacy_row_standardizer import legacy_standardize_results
+
+
+def _event_rows(count: int):
+    start = datetime(2025, 1, 1, 8, 0, 0)
+    return [{
+        'event_id': f"evt-{i}", 'name': f"Sự kiện {i}", 'description': "Mô tả chi tiết sự kiện. " * 4,
+        'location': 'Hà Nội', 'start_date': start + timedelta(hours=i), 'end_date': start + timedelta(hours=i + 5),
+        'quantity_now': i % 50, 'max_quantity': 50, 'image': f"https://img.example.org/{i}.png",
+    } for i in range(count)]
+
+
+def _result_rows(count: int):
+    return [{
+        'result_id': f"res-{i}", 'result_description': "Kết quả sự kiện. " * 4, 'result_image': 'result.png',
+        'event_id': f"evt-{i}", 'event_name': f"Sự kiện {i}", 'event_description': "Mô tả. " * 4,
+        'event_image': f"https://img.example.org/{i}.png",
+    } for i in range(count)]
+
+
+def _best_of(func, rows, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(rows)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    normalizer = RowNormalizer()
+    for label, rows in (("events", _event_rows(args.rows)), ("results+events", _result_rows(args.rows))):
+        expected = legacy_standardize_results(rows)
+        actual = normalizer.normalize(rows)
+        if actual != expected:
+            raise SystemExit(f"RowNormalizer output differs from legacy output for {label} rows")
+
+        legacy_seconds = _best_of(legacy_standardize_results, rows, args.repeat)
+        plan_seconds = _best_of(normalizer.normalize, rows, args.repeat)
+        print(f"{args.rows} {label} rows (best of {args.repeat})")
+        for name, seconds in (("legacy standardize_results", legacy_seconds), ("RowNormalizer", plan_seconds)):
+            print(f"  {name:<28} {seconds * 1000:9.2f} ms  {seconds / args.rows * 1e6:7.2f} us/row  "
+                  f"x{legacy_seconds / seconds:5.1f}")
+
+
+if __name__ == '__main__':
+    main()
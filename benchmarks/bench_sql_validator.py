@@ -0,0 +1,67 @@
+"""
+So sánh sql_utils.is_valid_sql (SqlValidator, duyệt cây một lần + ghi nhớ verdict)
+với bản is_valid_sql cũ (duyệt token thủ công, in DEBUG cho mỗi token).
+
+    python -m benchmarks.bench_sql_validator --iterations 200
+"""
+import argparse
+import contextlib
+import io
+import time
+
+from RAG.sql_validator import SqlValidator
+from benchmarks.legacy_sql_validator import legacy_is_valid_sql
+
+
+SAMPLE_QUERIES = [
+    "SELECT event_id, name, description, location, start_date, end_date, quantity_now, max_quantity, image "
+    "FROM events_view WHERE quantity_now < max_quantity;",
+    "SELECT e.name AS event_name, o.username AS organization_name, e.event_id, e.description AS event_description, "
+    "e.location, e.start_date, e.end_date, e.quantity_now, e.max_quantity, e.image AS event_image "
+    "FROM events_view AS e JOIN organizations_view AS o ON e.organization_id = o.organization_id "
+    "WHERE LOWER(e.name) LIKE '%hoi nghi cong nghe%';",
+    "SELECT r.result_id, r.content AS result_description, r.images AS result_image, e.event_id, e.name AS event_name, "
+    "e.description AS event_description, e.image AS event_image FROM results_view r "
+    "JOIN events_view e ON r.event_id = e.event_id WHERE LOWER(e.name) LIKE '%fuga quia beatae%';",
+    "SELECT event_id, name, description, location, start_date, end_date, quantity_now, max_quantity, image "
+    "FROM events_view WHERE end_date < NOW() AND end_date >= NOW() - INTERVAL '7' DAY ORDER BY end_date DESC LIMIT 10;",
+    "SELECT event_id, name FROM events_view WHERE organization_id IN "
+    "(SELECT organization_id FROM organizations_view WHERE LOWER(address) LIKE '%ha noi%') ORDER BY start_date",
+]
+
+
+def _time_calls(func, queries, iterations: int) -> float:
+    sink = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(sink):
+        for _ in range(iterations):
+            for query in queries:
+                func(query)
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    total_calls = args.iterations * len(SAMPLE_QUERIES)
+
+    legacy_seconds = _time_calls(legacy_is_valid_sql, SAMPLE_QUERIES, args.iterations)
+
+    uncached = SqlValidator(cache_size=0)
+    uncached_seconds = _time_calls(uncached.is_valid, SAMPLE_QUERIES, args.iterations)
+
+    cached = SqlValidator()
+    cached_seconds = _time_calls(cached.is_valid, SAMPLE_QUERIES, args.iterations)
+
+    print(f"{total_calls} validations per variant")
+    for label, seconds in (("legacy is_valid_sql", legacy_seconds),
+                           ("SqlValidator (no memo)", uncached_seconds),
+                           ("SqlValidator (memoized)", cached_seconds)):
+        print(f"  {label:<26} {seconds * 1000:9.1f} ms total  {seconds / total_calls * 1e6:9.1f} us/call  "
+              f"x{legacy_seconds / seconds:6.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Chat model giả lập thay ChatGoogleGenerativeAI (cùng invoke/ainvoke/stream/astream), với độ trễ
+và lỗi tạm thời được tiêm vào theo xác suất, để kiểm thử/benchmark LlmClient mà không gọi mạng.
+"""
+import asyncio
+import random
+import threading
+import time
+from typing import AsyncIterator, Iterator
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+
+class ServiceUnavailable(Exception):
+    """
+    Lỗi tạm thời giả lập (trùng tên với google.api_core.exceptions.ServiceUnavailable).
+    """
+
+
+class FakeChatModel:
+    """
+    Mỗi lời gọi trễ `base_ms` ± `jitter_ms`; với xác suất `slow_probability` trễ thêm `slow_ms`
+    (đuôi chậm), với xác suất `error_probability` ném ServiceUnavailable sau độ trễ đó.
+    """
+
+    def __init__(self, base_ms: float = 200.0, jitter_ms: float = 50.0, slow_ms: float = 2000.0,
+                 slow_probability: float = 0.05, error_probability: float = 0.0, response: str = "ok",
+                 seed: int = 7):
+        self.base_ms = base_ms
+        self.jitter_ms = jitter_ms
+        self.slow_ms = slow_ms
+        self.slow_probability = slow_probability
+        self.error_probability = error_probability
+        self.response = response
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _plan(self):
+        with self._lock:
+            self.calls += 1
+            delay_ms = self.base_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)
+            if self._rng.random() < self.slow_probability:
+                delay_ms += self.slow_ms
+            fail = self._rng.random() < self.error_probability
+        return max(delay_ms, 0.0) / 1000.0, fail
+
+    def invoke(self, messages) -> AIMessage:
+        delay, fail = self._plan()
+        time.sleep(delay)
+        if fail:
+            raise ServiceUnavailable("503 fake model unavailable")
+        return AIMessage(content=self.response)
+
+    async def ainvoke(self, messages) -> AIMessage:
+        delay, fail = self._plan()
+        await asyncio.sleep(delay)
+        if fail:
+            raise ServiceUnavailable("503 fake model unavailable")
+        return AIMessage(content=self.response)
+
+    def stream(self, messages) -> Iterator[AIMessageChunk]:
+        yield AIMessageChunk(content=self.invoke(messages).content)
+
+    async def astream(self, messages) -> AsyncIterator[AIMessageChunk]:
+        message = await self.ainvoke(messages)
+        yield AIMessageChunk(content=message.content)
@@ -0,0 +1,103 @@
+"""
+LLM giả lập có tính xác định, dùng thay LlmClient trong benchmark (không gọi mạng).
+Trả SQL dựng sẵn theo câu hỏi, và câu trả lời thân thiện cố định, với độ trễ cấu hình được.
+"""
+import asyncio
+import re
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from RAG.text_utils import normalize_question
+
+
+EVENT_COLUMNS = "event_id, name, description, location, start_date, end_date, quantity_now, max_quantity, image"
+
+CANNED_QUERIES: List[Tuple[str, str]] = [
+    ("Các sự kiện nào còn chỗ đăng kí?",
+     f"SELECT {EVENT_COLUMNS} FROM events_view WHERE quantity_now < max_quantity;"),
+    ("Sự kiện nào sắp hết lượt đăng kí?",
+     f"SELECT {EVENT_COLUMNS} FROM events_view WHERE quantity_now >= max_quantity * 0.75 "
+     f"AND quantity_now < max_quantity ORDER BY (max_quantity - quantity_now) ASC;"),
+    ("Sự kiện nào đã đầy lượt đăng kí?",
+     f"SELECT {EVENT_COLUMNS} FROM events_view WHERE quantity_now >= max_quantity;"),
+    ("Các sự kiện nào sắp diễn ra?",
+     f"SELECT {EVENT_COLUMNS} FROM events_view WHERE start_date > NOW() ORDER BY start_date ASC LIMIT 10;"),
+    ("Liệt kê các sự kiện diễn ra tại Hà Nội.",
+     f"SELECT {EVENT_COLUMNS} FROM events_view WHERE LOWER(location) LIKE '%hà nội%';"),
+    ("Có bao nhiêu sự kiện?",
+     "SELECT COUNT(*) AS total_events FROM events_view;"),
+    ("Sự kiện Hiến máu 3 của nhà tổ chức nào?",
+     "SELECT e.name AS event_name, o.username AS organization_name, e.event_id, e.description AS event_description, "
+     "e.location, e.start_date, e.end_date, e.quantity_now, e.max_quantity, e.image AS event_image "
+     "FROM events_view AS e JOIN organizations_view AS o ON e.organization_id = o.organization_id "
+     "WHERE LOWER(e.name) LIKE '%hiến máu 3%';"),
+    ("Có kết quả của sự kiện Trồng cây chưa?",
+     "SELECT r.result_id, r.content AS result_description, r.images AS result_image, e.event_id, "
+     "e.name AS event_name, e.description AS event_description, e.image AS event_image "
+     "FROM results_view r JOIN events_view e ON r.event_id = e.event_id WHERE LOWER(e.name) LIKE '%trồng cây%';"),
+    ("Top tình nguyện viên tích cực nhất?",
+     "SELECT v.username, v.fullname, t.participation_count FROM top_volunteers_view t "
+     "JOIN volunteers_view v ON v.volunteer_id = t.volunteer_id ORDER BY t.participation_count DESC LIMIT 5;"),
+]
+
+FRIENDLY_ANSWER = "Dưới đây là các sự kiện phù hợp với câu hỏi của bạn, chi tiết được hiển thị bên dưới."
+
+_USER_QUESTION_RE = re.compile(r"User question:\s*([^\n]+?)\s*\n\s*SQL query:\s*$")
+
+
+class FakeLlmClient:
+    """
+    Thay thế LlmClient: cùng giao diện generate_text/agenerate_text/stream_text/astream_text.
+    `latency_ms` là độ trễ giả lập cho mỗi lần gọi (stream chia đều độ trễ cho các đoạn).
+    """
+
+    def __init__(self, latency_ms: float = 0.0, stream_chunks: int = 8,
+                 canned_queries: Optional[List[Tuple[str, str]]] = None, default_sql: Optional[str] = None):
+        self.model = 'fake-llm'
+        self.latency_seconds = latency_ms / 1000.0
+        self.stream_chunks = max(stream_chunks, 1)
+        self.canned: Dict[str, str] = {normalize_question(q): sql for q, sql in (canned_queries or CANNED_QUERIES)}
+        self.default_sql = default_sql or CANNED_QUERIES[0][1]
+
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prompt_chars = 0
+
+    def _respond(self, prompt: str) -> str:
+        with self._lock:
+            self.calls += 1
+            self.prompt_chars += len(prompt)
+
+        match = _USER_QUESTION_RE.search(prompt)
+        if match:
+            return self.canned.get(normalize_question(match.group(1)), self.default_sql)
+        return FRIENDLY_ANSWER
+
+    def _chunks(self, text: str) -> List[str]:
+        size = max(len(text) // self.stream_chunks, 1)
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    def generate_text(self, prompt: str, schema_fingerprint: str = "") -> str:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return self._respond(prompt)
+
+    async def agenerate_text(self, prompt: str, schema_fingerprint: str = "") -> str:
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        return self._respond(prompt)
+
+    def stream_text(self, prompt: str) -> Iterator[str]:
+        chunks = self._chunks(self._respond(prompt))
+        for chunk in chunks:
+            if self.latency_seconds:
+                time.sleep(self.latency_seconds / len(chunks))
+            yield chunk
+
+    async def astream_text(self, prompt: str) -> AsyncIterator[str]:
+        chunks = self._chunks(self._respond(prompt))
+        for chunk in chunks:
+            if self.latency_seconds:
+                await asyncio.sleep(self.latency_seconds / len(chunks))
+            yield chunk
@@ -0,0 +1,34 @@
+"""
+Bản sao nguyên trạng của format_results (sql_utils) trước khi chuyển sang ResultSet,
+chỉ giữ lại để làm mốc so sánh trong benchmarks/bench_result_set.py.
+"""
+from typing import Any, Dict, List, Optional
+
+
+def legacy_format_results(results: List[Dict[str, Any]], total_count: Optional[int] = None,
+                          max_rows_for_llm: int = 15) -> str:
+    """
+    Định dạng kết quả từ DB (List of Dict) thành chuỗi văn bản dạng bảng.
+    """
+    if not results: return "Không có kết quả từ database."
+    if total_count is None:
+        total_count = len(results)
+    display_results = results[:max_rows_for_llm]
+    formatted_string = "Results:\n"
+    columns = list(display_results[0].keys())
+    formatted_string += "| " + " | ".join(columns) + " |\n"
+    col_widths = [max(len(col), 3) for col in columns]
+    formatted_string += "|-" + "-|-".join(['-' * width for width in col_widths]) + "-|\n"
+
+    for row_dict in display_results:
+        row_values = []
+        for col in columns:
+            value = str(row_dict.get(col, 'NULL')) if row_dict.get(col) is not None else 'NULL'
+            value = value.replace('|', '-')
+            row_values.append(value)
+        formatted_string += "| " + " | ".join(row_values) + " |\n"
+
+    if total_count > len(display_results):
+        formatted_string += f"(... {total_count - len(display_results)} hàng khác bị ẩn ...)\n"
+
+    return formatted_string
@@ -0,0 +1,72 @@
+"""
+Bản sao nguyên trạng của standardize_results (chat_pipeline) trước khi chuyển sang RowNormalizer,
+chỉ giữ lại để làm mốc so sánh trong benchmarks/bench_row_normalizer.py.
+"""
+from datetime import datetime
+from typing import Any, Dict, List
+
+
+def legacy_standardize_results(raw_results_list: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Chuẩn hóa các hàng kết quả từ DB thành cấu trúc cố định mà frontend hiển thị.
+    """
+    query_results_data = []
+
+    if not raw_results_list:
+        return query_results_data
+
+    for row in raw_results_list:
+
+        item_data_standardized = {}
+
+        key_mapping = {
+            'id': ['event_id', 'result_id'],
+            'name': ['name', 'event_name'],
+            'description': ['description', 'event_description'],
+            'location': ['location'],
+            'start_date': ['start_date'],
+            'end_date': ['end_date'],
+            'quantity_now': ['quantity_now'],
+            'max_quantity': ['max_quantity'],
+            'image': ['image', 'event_image'],
+            'organization_name': ['username', 'organization_name'],
+
+            'result_id': ['result_id'],
+            'result_description': ['content', 'result_description'],
+            'result_image': ['images', 'result_image'],
+
+            'related_event_id': ['event_id'],
+            'related_event_name': ['name', 'event_name'],
+            'related_event_description': ['description', 'event_description'],
+            'related_event_image': ['image', 'event_image'],
+        }
+
+        for standardized_key, possible_raw_keys in key_mapping.items():
+            for raw_key in possible_raw_keys:
+                if raw_key in row:
+                    value = row[raw_key]
+
+                    if isinstance(value, datetime):
+                        try:
+
+                            item_data_standardized[standardized_key] = value.isoformat()
+                        except Exception as date_e:
+                            print(
+                                f"Warning: Could not format date {standardized_key} ({raw_key}) {value}: {date_e}")
+                            item_data_standardized[standardized_key] = str(value)
+                    else:
+
+                        item_data_standardized[standardized_key] = value
+                    break
+
+        if 'result_id' in row or item_data_standardized.get('result_id') is not None:
+            item_data_standardized['type'] = 'result'
+        elif 'event_id' in row or item_data_standardized.get('id') is not None:
+            item_data_standardized['type'] = 'event'
+        else:
+            item_data_standardized['type'] = 'unknown'
+
+        if item_data_standardized:
+            query_results_data.append(item_data_standardized)
+
+    return query_results_data
@@ -0,0 +1,173 @@
+"""
+Benchmark end-to-end offline: SQLite thay MySQL, FakeLlmClient thay Gemini.
+
+Chạy DatabaseChatbotService.process_query, ChatPipeline (đồng bộ/async) hoặc route Flask /chat
+với mức song song tùy chọn, rồi in throughput và p50/p95/p99 của từng bước.
+
+    python -m benchmarks.run_e2e --mode pipeline --scale 2000 --requests 400 --concurrency 16 --llm-latency-ms 50
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List
+
+from benchmarks.fake_llm import CANNED_QUERIES, FakeLlmClient
+from benchmarks.sqlite_seed import register_mysql_functions, seed_database
+
+
+MODES = ('service', 'pipeline', 'async', 'flask')
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def build_components(db_path: str, scale: int, llm_latency_ms: float, sql_cache: bool, intent_router: bool = True):
+    """
+    Seed SQLite rồi tạo (llm_client, service, pipeline) dùng database đó.
+    """
+    from RAG.chat_pipeline import ChatPipeline
+    from RAG.database import DatabaseConnector
+    from RAG.service import DatabaseChatbotService
+
+    db_url = seed_database(db_path, scale)
+    db_connector = DatabaseConnector(db_url=db_url)
+    register_mysql_functions(db_connector.engine)
+
+    llm_client = FakeLlmClient(latency_ms=llm_latency_ms)
+    db_context_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'RAG', 'db_context.txt')
+    service = DatabaseChatbotService(llm_client=llm_client, db_context_path=db_context_path,
+                                     db_connector=db_connector)
+    if not sql_cache:
+        service.sql_cache.max_entries = 0
+    if not intent_router:
+        service.intent_router = None
+    pipeline = ChatPipeline(service=service, llm_client=llm_client)
+    return llm_client, service, pipeline
+
+
+def _run_threaded(call: Callable[[str], None], questions: List[str], concurrency: int) -> List[float]:
+    def timed_call(question: str) -> float:
+        started = time.perf_counter()
+        call(question)
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(timed_call, questions))
+
+
+def _run_async(pipeline, questions: List[str], concurrency: int) -> List[float]:
+    async def run_all() -> List[float]:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def timed_call(question: str) -> float:
+            async with semaphore:
+                started = time.perf_counter()
+                await pipeline.ahandle(question)
+                return time.perf_counter() - started
+
+        return await asyncio.gather(*(timed_call(question) for question in questions))
+
+    return asyncio.run(run_all())
+
+
+def run_benchmark(mode: str, scale: int, requests: int, concurrency: int, llm_latency_ms: float,
+                  sql_cache: bool = True, intent_router: bool = True, verbose: bool = False) -> dict:
+    from RAG.metrics import metrics
+
+    report_stream = sys.stdout
+    quiet = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+
+    with tempfile.TemporaryDirectory() as tmp_dir, quiet:
+        llm_client, service, pipeline = build_components(os.path.join(tmp_dir, 'bench.db'), scale,
+                                                         llm_latency_ms, sql_cache, intent_router)
+        service.get_schema_description()
+        questions = [CANNED_QUERIES[i % len(CANNED_QUERIES)][0] for i in range(requests)]
+        metrics.reset()
+
+        started = time.perf_counter()
+        if mode == 'service':
+            latencies = _run_threaded(service.process_query, questions, concurrency)
+        elif mode == 'pipeline':
+            latencies = _run_threaded(pipeline.handle, questions, concurrency)
+        elif mode == 'async':
+            latencies = _run_async(pipeline, questions, concurrency)
+        else:
+            import app as flask_app
+            flask_app.llm_client, flask_app.service, flask_app.pipeline = llm_client, service, pipeline
+            client_app = flask_app.create_flask_app()
+
+            def call(question: str) -> None:
+                response = client_app.test_client().post('/chat', json={'message': question})
+                assert response.status_code == 200, response.status_code
+
+            latencies = _run_threaded(call, questions, concurrency)
+        wall_seconds = time.perf_counter() - started
+
+        snapshot = metrics.snapshot()
+        service.db_connector.engine.dispose()
+
+    ordered = sorted(latencies)
+    report = {
+        'mode': mode, 'scale': scale, 'requests': requests, 'concurrency': concurrency,
+        'llm_latency_ms': llm_latency_ms, 'wall_seconds': wall_seconds,
+        'throughput_rps': requests / wall_seconds if wall_seconds else 0.0,
+        'latency': {'p50': _percentile(ordered, 0.5), 'p95': _percentile(ordered, 0.95),
+                    'p99': _percentile(ordered, 0.99)},
+        'llm_calls': llm_client.calls,
+        'stages': {labels: values for labels, values in snapshot.get('chat_stage_seconds', {}).items()},
+        'prompt_chars': {labels: values for labels, values in snapshot.get('sql_prompt_chars', {}).items()},
+        'answer_prompt_chars': snapshot.get('answer_prompt_chars', {}).get('{}'),
+    }
+    print_report(report, report_stream)
+    return report
+
+
+def print_report(report: dict, stream=None) -> None:
+    stream = stream or sys.stdout
+    print(f"mode={report['mode']} scale={report['scale']} requests={report['requests']} "
+          f"concurrency={report['concurrency']} llm_latency={report['llm_latency_ms']}ms", file=stream)
+    print(f"  throughput: {report['throughput_rps']:.1f} req/s  wall: {report['wall_seconds']:.2f}s  "
+          f"llm calls: {report['llm_calls']}", file=stream)
+    latency = report['latency']
+    print(f"  request latency ms: p50={latency['p50'] * 1000:.2f} p95={latency['p95'] * 1000:.2f} "
+          f"p99={latency['p99'] * 1000:.2f}", file=stream)
+    print(f"  {'stage':<32}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}", file=stream)
+    for labels, values in sorted(report['stages'].items()):
+        print(f"  {labels:<32}{values['count']:>8}{values['p50'] * 1000:>10.3f}"
+              f"{values['p95'] * 1000:>10.3f}{values['p99'] * 1000:>10.3f}", file=stream)
+    for labels, values in sorted(report.get('prompt_chars', {}).items()):
+        print(f"  sql prompt chars {labels:<15}{values['count']:>8}  avg={values['sum'] / max(values['count'], 1):.0f}",
+              file=stream)
+    answer_chars = report.get('answer_prompt_chars')
+    if answer_chars:
+        print(f"  answer prompt chars {'':<12}{answer_chars['count']:>8}  "
+              f"avg={answer_chars['sum'] / max(answer_chars['count'], 1):.0f}", file=stream)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=MODES + ('all',), default='pipeline')
+    parser.add_argument('--scale', type=int, default=1000, help='Number of synthetic events to seed.')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--llm-latency-ms', type=float, default=0.0)
+    parser.add_argument('--no-sql-cache', action='store_true', help='Disable the question-to-SQL cache.')
+    parser.add_argument('--no-intent-router', action='store_true', help='Send every question to the (fake) LLM.')
+    parser.add_argument('--verbose', action='store_true', help='Keep the pipeline print output.')
+    args = parser.parse_args()
+
+    for mode in (MODES if args.mode == 'all' else (args.mode,)):
+        run_benchmark(mode, args.scale, args.requests, args.concurrency, args.llm_latency_ms,
+                      sql_cache=not args.no_sql_cache, intent_router=not args.no_intent_router, verbose=args.verbose)
+
+
+if __name__ == '__main__':
+    main()
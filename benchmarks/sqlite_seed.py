@@ -0,0 +1,134 @@
+"""
+Tạo database SQLite thay thế cho các view MySQL trong ALLOWED_TABLES, với dữ liệu tổng hợp
+ở quy mô tùy chọn, để chạy benchmark mà không cần MySQL.
+
+    python -m benchmarks.sqlite_seed --path /tmp/charity_bench.db --scale 1000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+
+LOCATIONS = ['Hà Nội', 'Hồ Chí Minh', 'Đà Nẵng', 'Huế', 'Cần Thơ', 'Hải Phòng', 'Nha Trang', 'Đà Lạt']
+EVENT_WORDS = ['Hội nghị', 'Chạy bộ', 'Hiến máu', 'Trồng cây', 'Quyên góp', 'Mùa hè xanh', 'Tiếp sức',
+               'Dọn rác', 'Áo ấm', 'Trung thu', 'Công nghệ', 'Sách cũ']
+
+SCHEMA = """
+CREATE TABLE organizations_view (
+    organization_id CHAR(36) PRIMARY KEY, username VARCHAR(255), email VARCHAR(255), fullname VARCHAR(255),
+    address VARCHAR(255), phone VARCHAR(255), founded_at DATE, representative VARCHAR(255), description TEXT,
+    avatar VARCHAR(255), cover VARCHAR(255), website VARCHAR(255), created_at TIMESTAMP, updated_at TIMESTAMP
+);
+CREATE TABLE events_view (
+    event_id CHAR(36) PRIMARY KEY, organization_id CHAR(36), name VARCHAR(255), description TEXT,
+    start_date TIMESTAMP, end_date TIMESTAMP, location VARCHAR(255), min_quantity INT, max_quantity INT,
+    quantity_now INT, status VARCHAR(255), image VARCHAR(255), created_at TIMESTAMP, updated_at TIMESTAMP
+);
+CREATE TABLE results_view (
+    result_id CHAR(36) PRIMARY KEY, event_id CHAR(36), content TEXT, images VARCHAR(255),
+    created_at TIMESTAMP, updated_at TIMESTAMP
+);
+CREATE TABLE volunteers_view (
+    volunteer_id CHAR(36) PRIMARY KEY, username VARCHAR(255), email VARCHAR(255), fullname VARCHAR(255),
+    address VARCHAR(255), phone VARCHAR(255), avatar VARCHAR(255), point VARCHAR(255),
+    created_at TIMESTAMP, updated_at TIMESTAMP
+);
+CREATE TABLE top_volunteers_view (
+    id INTEGER PRIMARY KEY, volunteer_id CHAR(36), participation_count INT, quarter INT, year INT,
+    created_at TIMESTAMP, updated_at TIMESTAMP
+);
+"""
+
+
+def _ts(value: datetime) -> str:
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def seed_database(path: str, scale: int = 1000, seed: int = 42) -> str:
+    """
+    Tạo (ghi đè) file SQLite tại `path` với `scale` sự kiện và số tổ chức/kết quả/TNV tỉ lệ theo.
+    Trả về URL SQLAlchemy của database.
+    """
+    rng = random.Random(seed)
+    if os.path.exists(path):
+        os.remove(path)
+
+    now = datetime.now()
+    connection = sqlite3.connect(path)
+    try:
+        connection.executescript(SCHEMA)
+
+        organization_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(max(scale // 20, 3))]
+        connection.executemany(
+            "INSERT INTO organizations_view VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+            [(org_id, f"to chuc {i}", f"org{i}@example.org", f"Tổ chức thiện nguyện {i}",
+              rng.choice(LOCATIONS), f"09{i:08d}", "2015-01-01", f"Người đại diện {i}",
+              "Mô tả tổ chức " * 10, "avatar.png", "cover.png", f"https://org{i}.example.org",
+              _ts(now), _ts(now))
+             for i, org_id in enumerate(organization_ids)])
+
+        event_rows = []
+        for i in range(scale):
+            start = now + timedelta(days=rng.randint(-60, 60), hours=rng.randint(0, 23))
+            max_quantity = rng.randint(10, 200)
+            event_rows.append((
+                str(uuid.UUID(int=rng.getrandbits(128))), rng.choice(organization_ids),
+                f"{rng.choice(EVENT_WORDS)} {i}", "Mô tả chi tiết sự kiện thiện nguyện. " * 8,
+                _ts(start), _ts(start + timedelta(days=rng.randint(0, 5))), rng.choice(LOCATIONS),
+                5, max_quantity, rng.randint(0, max_quantity), 'approved', f"https://img.example.org/{i}.png",
+                _ts(now), _ts(now)))
+        connection.executemany("INSERT INTO events_view VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)", event_rows)
+
+        connection.executemany(
+            "INSERT INTO results_view VALUES (?,?,?,?,?,?)",
+            [(str(uuid.UUID(int=rng.getrandbits(128))), row[0], "Kết quả sự kiện: đã hoàn thành. " * 6,
+              "result.png", _ts(now), _ts(now))
+             for row in event_rows[: max(scale // 4, 1)]])
+
+        volunteer_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(max(scale // 2, 5))]
+        connection.executemany(
+            "INSERT INTO volunteers_view VALUES (?,?,?,?,?,?,?,?,?,?)",
+            [(vol_id, f"tnv{i}", f"tnv{i}@example.org", f"Tình nguyện viên {i}", rng.choice(LOCATIONS),
+              f"08{i:08d}", "avatar.png", str(rng.randint(0, 500)), _ts(now), _ts(now))
+             for i, vol_id in enumerate(volunteer_ids)])
+
+        connection.executemany(
+            "INSERT INTO top_volunteers_view VALUES (?,?,?,?,?,?,?)",
+            [(i + 1, vol_id, rng.randint(1, 50), rng.randint(1, 4), now.year, _ts(now), _ts(now))
+             for i, vol_id in enumerate(volunteer_ids[:50])])
+
+        connection.commit()
+    finally:
+        connection.close()
+
+    return f"sqlite:///{path}"
+
+
+def register_mysql_functions(engine) -> None:
+    """
+    Đăng ký các hàm MySQL mà SQL mẫu dùng (NOW) trên mọi kết nối SQLite của engine.
+    """
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        dbapi_connection.create_function('NOW', 0, lambda: _ts(datetime.now()))
+
+    engine.pool.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--path', default='/tmp/charity_bench.db')
+    parser.add_argument('--scale', type=int, default=1000)
+    args = parser.parse_args()
+
+    print(f"Seeded {seed_database(args.path, args.scale)} with {args.scale} events.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Cấu hình gunicorn cho chế độ nhiều worker (dùng hết các core của máy):
+    gunicorn wsgi:application                                                    # Flask, worker gthread
+    GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn asgi:application  # ASGI, worker uvicorn
+
+- preload_app: master dựng LlmClient, DatabaseConnector, schema cache, intent router, kho ví dụ SQL...
+  một lần rồi fork; worker chia sẻ chúng theo copy-on-write (gc.freeze trong app.prepare_for_fork).
+- post_fork: mỗi worker tạo lại pool kết nối DB, client Gemini và thread làm mới schema (app.reinit_after_fork).
+- Mỗi worker có pool DB riêng: tổng kết nối tối đa = workers × (DB_POOL_SIZE + DB_MAX_OVERFLOW).
+- Cache SQL/kết quả và /metrics là theo từng worker; cache LLM (LLM_CACHE_PATH) dùng chung qua file SQLite.
+  /admin/schema/invalidate chỉ tác động worker nhận request; SIGHUP được gunicorn dùng để reload worker.
+- SessionStore (hội thoại nhiều lượt, session_id / X-Session-ID) nằm trong bộ nhớ của từng worker: với
+  workers > 1, câu hỏi tiếp theo ("cái thứ hai", "ở đâu?") chỉ giữ được ngữ cảnh khi load balancer định tuyến
+  cùng session về cùng worker (sticky session). Không có sticky routing thì chạy WEB_CONCURRENCY=1
+  (tăng GUNICORN_THREADS hoặc dùng worker uvicorn) hoặc tắt SESSION_STORE_ENABLED.
+
+Biến môi trường: GUNICORN_BIND (mặc định 127.0.0.1:5000), WEB_CONCURRENCY (số worker, mặc định số core),
+GUNICORN_WORKER_CLASS (gthread), GUNICORN_THREADS (4, cho gthread), GUNICORN_TIMEOUT (120 giây).
+"""
+import multiprocessing
+import os
+
+
+bind = os.getenv("GUNICORN_BIND", "127.0.0.1:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+preload_app = True
+
+
+def on_starting(server):
+    # Với asgi:application, component chỉ được dựng ở lifespan; dựng trước ở đây để cũng được chia sẻ qua fork.
+    import app
+
+    if not app.ensure_components():
+        raise RuntimeError("Component initialization failed.")
+    if workers > 1 and app.pipeline is not None and app.pipeline.sessions is not None:
+        server.log.warning("SessionStore is per-worker (%d workers): follow-up questions need sticky "
+                           "session routing, or set WEB_CONCURRENCY=1 / SESSION_STORE_ENABLED=false.", workers)
+
+
+def pre_fork(server, worker):
+    import app
+
+    app.prepare_for_fork()
+
+
+def post_fork(server, worker):
+    import app
+
+    app.reinit_after_fork()
@@ -0,0 +1,10 @@
+"""
+Điểm vào WSGI cho triển khai nhiều process:
+    gunicorn wsgi:application
+
+Cấu hình (số worker, preload, hook fork) nằm trong gunicorn.conf.py, được gunicorn tự nạp từ thư mục hiện tại.
+"""
+from app import create_app
+
+
+application = create_app()